@@ -0,0 +1,324 @@
+import Class_RiderState as RS
+import Class_Rider as R
+import Classes_Courses as C
+import Class_RiderCourseSystem as RCS
+import Class_NeuralNetwork as NN
+import Class_NumpyPolicy as NP
+import Class_ExperienceReplay as ER
+import Class_ReplayBuffer as RB
+import Class_Trainer as T
+import Classes_Rewards_Penalties as RP
+import Helper_Functions as HF
+import argparse
+import contextlib
+import io
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+import torch
+import numpy as np
+
+"""
+Speed of the simulation and training hot paths, to gate performance changes on.
+
+The micro benchmarks time single calls of the hot functions, the macro benchmarks time whole builds and training epochs
+on QuadraticHill courses of several lengths. Every benchmark reports the median seconds per call of its repeats, and its noise:
+how far its repeats spread around that median. Everything is seeded, so every run does the same work.
+
+A benchmark is only flagged as a regression if it is slower than the baseline by more than the threshold plus the noise of both runs.
+Flagged benchmarks are then run again, and stay flagged only if they are still that much slower with the new repeats added,
+so that a burst of load on the machine during one benchmark does not fail the gate.
+
+Run with:
+python Benchmark_HotPaths.py                              prints the results
+python Benchmark_HotPaths.py --save baseline.json         also saves them as a baseline
+python Benchmark_HotPaths.py --compare baseline.json      flags every benchmark more than --threshold slower than the baseline
+                                                          and exits with 1 if there are any
+"""
+
+REPEATS = 15
+MACRO_REPEATS = 5
+MICRO_CALLS = 1000
+COURSE_LENGTHS = [100.0, 250.0, 500.0]  # the rider runs out of energy on much longer ones
+BUILDS = 3
+TRAINING_EPOCHS = 10
+DTYPE = torch.float32
+LAYER_WIDTHS = [17, 18, 19, 20, 21, 21]
+THRESHOLD = 0.10
+
+
+def make_system(course_length: float = 500.0) -> RCS.RiderCourseSystem:
+    """Returns a fresh system set up like the one in Main.py, on a QuadraticHill of course_length."""
+
+    initial_state = RS.RiderState(distance=0.0, velocity=7.0, force=100.0, an_energy=50000.0)
+
+    rider = R.Rider(
+        initial_state,
+        weight=87.0,
+        bike_weight=7.0,
+        cross_area=0.4,
+        drag_coef=0.7,
+        max_force=1000.0,
+        max_jerk=1.0,
+        avg_velocity=HF.m_per_s(25.0),
+        avg_velocity_on_flat=HF.m_per_s(27.0),
+    )
+
+    course = C.QuadraticHill(course_length=course_length, end_percentage=11.0)
+
+    return RCS.RiderCourseSystem(rider, course, dtype=DTYPE)
+
+
+def make_reward_bundle(system: RCS.RiderCourseSystem) -> RP.RewardBundle:
+    """Returns the reward bundle of Main.py for system."""
+
+    return RP.RewardBundle(
+        [
+            RP.EvenMilestones(system, base_reward=3.0, spacing=10.0),
+            RP.CompletionReward(system, completion_reward=0.0),
+            RP.UnderMinForceViolation(system, min_force=-100.0),
+            RP.TimeViolation(system, cutoff_time=500.0),
+            RP.ForceBoundsPenalty(system, scaling=50.0),
+            RP.UnderZeroEnergyPenalty(system, scaling=2.0),
+            RP.FinalTimeReward(system, expected_time=200.0),
+            RP.UnderMinEnergyViolation(system, min_energy=-2000.0),
+            RP.GoingBackwardsViolation(system),
+        ],
+        severe_mistake_penalty=-100.0,
+    )
+
+
+def make_experience_replay(course_length: float = 500.0, cruising: bool = False, **kwargs) -> ER.ExperienceReplay:
+    """
+    Returns an experience replay like the one of Main.py, which picks random actions.
+    If cruising is True it greedily picks action 0 instead, through the whole network, so that the rider holds its force to the
+    finish line and the work grows with the course length. Random actions make a severe mistake within a few hundred steps on any course.
+    """
+
+    system = make_system(course_length)
+    Q_network = NN.MLP(LAYER_WIDTHS, dtype=DTYPE)
+
+    if cruising:
+        last_layer = Q_network._layers[-1]
+        with torch.no_grad():
+            last_layer.weight.zero_()
+            last_layer.bias.zero_()
+            last_layer.bias[11] = 1.0
+
+    return ER.ExperienceReplay(system, Q_network, make_reward_bundle(system), epsilon=0.0 if cruising else 1.0, **kwargs)
+
+
+def seed(value: int = 0) -> None:
+    random.seed(value)
+    torch.manual_seed(value)
+
+
+def seconds_per_call(function, calls: int, repeats: int = REPEATS, setup=None) -> list[float]:
+    """Returns the seconds per call of function in each of repeats runs of calls calls. setup() is run untimed before each run."""
+
+    samples = []
+
+    for _ in range(repeats):
+        if setup is not None:
+            setup()
+
+        start_time = time.perf_counter()
+        for _ in range(calls):
+            function()
+        samples.append((time.perf_counter() - start_time) / calls)
+
+    return samples
+
+
+def median(samples: list[float]) -> float:
+    return statistics.median(samples)
+
+
+def noise(samples: list[float]) -> float:
+    """Returns the median absolute deviation of samples from their median, as a fraction of the median."""
+
+    center = statistics.median(samples)
+
+    return statistics.median(abs(sample - center) for sample in samples) / center
+
+
+def micro_benchmarks(names: set[str] | None = None) -> dict[str, list[float]]:
+    """Returns the seconds per call of each repeat of each micro benchmark, or only of those in names."""
+
+    results = {}
+
+    def run(name: str, function, calls: int, **kwargs) -> None:
+        if names is None or name in names:
+            results[name] = seconds_per_call(function, calls, **kwargs)
+
+    system = make_system()
+    run("euler_step_forward", system.euler_step_forward, MICRO_CALLS, setup=system.reset)
+    run("model_format_curr_state", system.model_format_curr_state, MICRO_CALLS, setup=system.reset)
+
+    reward_bundle = make_reward_bundle(system)
+
+    def reward_after_one_step() -> None:
+        try:
+            reward_bundle.reward()
+        except RP.SevereMistakeError:
+            pass
+
+    # the state is left one step in, so every call rewards that same step
+    system.reset()
+    system.step_forward()
+    run("RewardBundle.reward", reward_after_one_step, MICRO_CALLS)
+
+    seed()
+    experience_replay = make_experience_replay()
+    with contextlib.redirect_stdout(io.StringIO()):
+        experience_replay.build()
+
+    run("random_batch_plus_last", lambda: experience_replay.random_batch_plus_last(30), MICRO_CALLS)
+
+    Q_network = experience_replay.Q_network
+    T_network = NN.MLP(LAYER_WIDTHS, dtype=DTYPE)
+    batch = experience_replay.random_batch_plus_last(30)
+    loss_function = torch.nn.MSELoss()
+
+    run("Q_learning_loss", lambda: HF.Q_learning_loss(Q_network, T_network, batch, loss_function, gamma=0.1), MICRO_CALLS)
+
+    state = system.model_format_curr_state()
+    policy = NP.NumpyPolicy(Q_network)
+    observation = state.numpy()
+
+    run("epsilon_greedy_action[torch]", lambda: HF.epsilon_greedy_action(Q_network, state, epsilon=0.0), MICRO_CALLS)
+    run("epsilon_greedy_action[numpy]", lambda: HF.epsilon_greedy_action(policy, observation, epsilon=0.0), MICRO_CALLS)
+
+    return results
+
+
+def macro_benchmarks(names: set[str] | None = None) -> dict[str, list[float]]:
+    """Returns the seconds per build and per training epoch of each repeat at each of COURSE_LENGTHS, or only of those in names."""
+
+    results = {}
+
+    for course_length in COURSE_LENGTHS:
+        build_name = f"build[{course_length:g}m]"
+        train_name = f"train_epoch[{course_length:g}m]"
+
+        if names is None or build_name in names:
+            experience_replay = make_experience_replay(course_length, cruising=True, inference_backend="numpy")
+
+            with contextlib.redirect_stdout(io.StringIO()):
+                results[build_name] = seconds_per_call(experience_replay.build, BUILDS, repeats=MACRO_REPEATS, setup=seed)
+
+        if names is not None and train_name not in names:
+            continue
+
+        trainer = None
+
+        def setup_training() -> None:
+            nonlocal trainer
+
+            replay_buffer = RB.ReplayBuffer(100000, dtype=DTYPE)
+            experience_replay = make_experience_replay(course_length, cruising=True, inference_backend="numpy", replay_buffer=replay_buffer)
+            # a separate network is trained, so the episodes (and so the work of every epoch) stay the same as training goes on
+            Q_network = NN.MLP(LAYER_WIDTHS, dtype=DTYPE)
+            trainer = T.Trainer(
+                experience_replay,
+                Q_network,
+                torch.optim.SGD(Q_network.parameters(), lr=0.001),
+                torch.nn.MSELoss(),
+                learning_starts=100,
+            )
+
+            seed()
+
+        def train_epoch() -> None:
+            trainer.train_episode()
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            results[train_name] = seconds_per_call(train_epoch, TRAINING_EPOCHS, repeats=MACRO_REPEATS, setup=setup_training)
+
+    return results
+
+
+def compare(results: dict[str, list[float]], baseline: dict[str, float], baseline_noise: dict[str, float], threshold: float) -> list[str]:
+    """
+    Prints the median of each of results against baseline and returns the names of the benchmarks which are slower by more than
+    threshold plus the noise of both the baseline and the results. Baselines saved without their noise count it as zero.
+    """
+
+    regressions = []
+
+    print(f"{'benchmark':<32}{'baseline (us)':>15}{'now (us)':>12}{'change':>10}{'allowed':>10}")
+
+    for name, samples in results.items():
+        seconds = median(samples)
+
+        if name not in baseline:
+            print(f"{name:<32}{'-':>15}{seconds * 1e6:>12.1f}{'new':>10}")
+            continue
+
+        change = seconds / baseline[name] - 1.0
+        allowed = threshold + baseline_noise.get(name, 0.0) + noise(samples)
+        flag = ""
+        if change > allowed:
+            regressions.append(name)
+            flag = "  REGRESSION"
+
+        print(f"{name:<32}{baseline[name] * 1e6:>15.1f}{seconds * 1e6:>12.1f}{change:>+10.1%}{allowed:>+10.1%}{flag}")
+
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmarks of the simulation and training hot paths.")
+    parser.add_argument("--save", help="path to save the results to as a JSON baseline")
+    parser.add_argument("--compare", help="path of a JSON baseline to compare the results against")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="the slowdown flagged as a regression, 0.1 is 10%%")
+    parser.add_argument("--micro-only", action="store_true", help="skip the macro benchmarks")
+    args = parser.parse_args()
+
+    torch.set_num_threads(1)
+
+    results = micro_benchmarks()
+    if not args.micro_only:
+        results.update(macro_benchmarks())
+
+    if args.compare is not None:
+        with open(args.compare) as file:
+            saved = json.load(file)
+        baseline, baseline_noise = saved["results"], saved.get("noise", {})
+
+        regressions = compare(results, baseline, baseline_noise, args.threshold)
+
+        if regressions:
+            print(f"\nrunning {', '.join(regressions)} again\n")
+
+            flagged = set(regressions)
+            rerun = micro_benchmarks(flagged)
+            if not args.micro_only:
+                rerun.update(macro_benchmarks(flagged))
+
+            for name, samples in rerun.items():
+                results[name] = results[name] + samples
+
+            regressions = compare({name: results[name] for name in regressions}, baseline, baseline_noise, args.threshold)
+    else:
+        regressions = []
+        for name, samples in results.items():
+            print(f"{name:<32}{median(samples) * 1e6:>12.1f} us{noise(samples):>+8.1%}")
+
+    if args.save is not None:
+        environment = {"python": platform.python_version(), "torch": torch.__version__, "numpy": np.__version__, "machine": platform.platform()}
+        medians = {name: median(samples) for name, samples in results.items()}
+        noises = {name: noise(samples) for name, samples in results.items()}
+        with open(args.save, "w") as file:
+            json.dump({"environment": environment, "results": medians, "noise": noises}, file, indent=4)
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
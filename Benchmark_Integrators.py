@@ -0,0 +1,81 @@
+import Class_RiderState as RS
+import Class_Rider as R
+import Classes_Courses as C
+import Class_RiderCourseSystem as RCS
+import Helper_Functions as HF
+import time
+
+"""
+Accuracy vs cost of the integrators of RiderCourseSystem.
+
+A rider holds a constant force up a QuadraticHill and the trajectory is sampled every SAMPLE_EVERY seconds.
+Each integrator is run at several time steps and compared against forward Euler with a very small time step.
+Run with: python Benchmark_Integrators.py
+"""
+
+HORIZON = 60.0
+SAMPLE_EVERY = 2.0
+REFERENCE_DT = 0.0005
+TIME_STEPS = [0.1, 0.25, 0.5, 1.0, 2.0]
+FORCE = 250.0
+
+
+def make_system(dt: float, integrator: str) -> RCS.RiderCourseSystem:
+    """Returns a fresh system set up like the one in Main.py."""
+
+    initial_state = RS.RiderState(distance=0.0, velocity=7.0, force=FORCE, an_energy=50000.0)
+
+    rider = R.Rider(
+        initial_state,
+        weight=87.0,
+        bike_weight=7.0,
+        cross_area=0.4,
+        drag_coef=0.7,
+        max_force=1000.0,
+        max_jerk=1.0,
+        avg_velocity=HF.m_per_s(25.0),
+        avg_velocity_on_flat=HF.m_per_s(27.0),
+    )
+
+    course = C.QuadraticHill(course_length=500.0, end_percentage=11.0)
+
+    return RCS.RiderCourseSystem(rider, course, dt=dt, integrator=integrator)
+
+
+def trajectory(dt: float, integrator: str) -> tuple[list[tuple[float, float, float]], int, float]:
+    """Returns (the (distance, velocity, an_energy) at every sample time, number of steps, seconds taken)."""
+
+    system = make_system(dt, integrator)
+    steps_per_sample = round(SAMPLE_EVERY / dt)
+    samples = []
+    steps = 0
+
+    start_time = time.perf_counter()
+
+    for _ in range(round(HORIZON / SAMPLE_EVERY)):
+        for _ in range(steps_per_sample):
+            system.step_forward()
+            steps += 1
+        rs = system.rider.state
+        samples.append((rs.distance, rs.velocity, rs.an_energy))
+
+    return samples, steps, time.perf_counter() - start_time
+
+
+def main() -> None:
+    reference, reference_steps, reference_seconds = trajectory(REFERENCE_DT, "euler")
+    print(f"reference: euler dt={REFERENCE_DT} in {reference_steps} steps, {reference_seconds:.3f} s\n")
+
+    print(f"{'integrator':<20}{'dt':>6}{'steps':>8}{'seconds':>10}{'max dist err (m)':>18}{'max vel err (m/s)':>19}{'max energy err (J)':>20}")
+
+    for integrator in RCS.RiderCourseSystem.INTEGRATORS:
+        for dt in TIME_STEPS:
+            samples, steps, seconds = trajectory(dt, integrator)
+
+            errors = [max(abs(s[i] - ref[i]) for s, ref in zip(samples, reference)) for i in range(3)]
+
+            print(f"{integrator:<20}{dt:>6}{steps:>8}{seconds:>10.4f}{errors[0]:>18.2e}{errors[1]:>19.2e}{errors[2]:>20.2e}")
+
+
+if __name__ == "__main__":
+    main()
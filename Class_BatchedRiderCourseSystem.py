@@ -0,0 +1,250 @@
+import Class_Rider as R
+import Classes_Courses as C
+import Class_RiderCourseSystem as RCS
+import Classes_Rewards_Penalties as RP
+import Helper_Functions as HF
+import numpy as np
+
+
+class BatchedRiderCourseSystem:
+    """
+    NUM_ENVS independent rider/course systems which are all stepped forward at once.
+    Each environment has its own rider parameters and course but they all share DT and AIR_DENSITY.
+    The physics is the same as RiderCourseSystem.euler_step_forward, only written over NumPy arrays of shape (NUM_ENVS,).
+
+    Attributes:
+    - riders: The rider of each environment. Only the constants and INITIAL_STATE of each rider are read.
+    - courses: The course of each environment.
+    - time: Current time of each environment in seconds.
+    - distance, velocity, force, an_energy: Current state of each environment.
+    - last_distance, last_force: The distance and force of each environment before the last step.
+    - final_observations: Observations of the last step before any environments were reset. Only meaningful at the rows which were done.
+    - NUM_ENVS: The number of environments.
+    - DT: The time step for each update of the systems in seconds. Default is 0.1s
+    - AIR_DENSITY: Density of air in kilograms/(meters cubed). Default is 1.2 kg/m^3
+    - AUTO_RESET: If True, environments which finish their course are reset at the end of step.
+    - MIN_FORCE_CHANGE: The change in force of each environment for an action of 1.
+    """
+
+    riders: list[R.Rider]
+    courses: list[C.Course]
+    time: np.ndarray
+    distance: np.ndarray
+    velocity: np.ndarray
+    force: np.ndarray
+    an_energy: np.ndarray
+    last_distance: np.ndarray
+    last_force: np.ndarray
+    final_observations: np.ndarray
+
+    NUM_ENVS: int
+    DT: float
+    AIR_DENSITY: float
+    AUTO_RESET: bool
+    MIN_FORCE_CHANGE: np.ndarray
+
+    LOOKAHEAD_OFFSETS = RCS.RiderCourseSystem.LOOKAHEAD_OFFSETS
+    OBSERVATION_SIZE = 17
+
+    def __init__(
+        self,
+        riders: list[R.Rider],
+        courses: list[C.Course],
+        dt: float = 0.1,
+        air_density: float = 1.2,
+        auto_reset: bool = True,
+    ) -> None:
+        """
+        Initializing the batched system.
+
+        Preconditions:
+        - len(riders) == len(courses)
+        """
+
+        self.riders = riders
+        self.courses = courses
+        self.NUM_ENVS = len(riders)
+        self.DT = dt
+        self.AIR_DENSITY = air_density
+        self.AUTO_RESET = auto_reset
+
+        def constants(attribute: str) -> np.ndarray:
+            return np.array([getattr(r, attribute) for r in riders], dtype=np.float64)
+
+        self.TOTAL_WEIGHT = constants("BIKE_WEIGHT") + constants("WEIGHT")
+        self.INV_WEIGHT = 1.0 / self.TOTAL_WEIGHT
+        self.GRAVITY_COEF = self.TOTAL_WEIGHT * 9.8
+        self.AIR_COEF = 1.0 / 2.0 * constants("DRAG_COEF") * constants("CROSS_AREA") * air_density
+        self.MAX_FORCE = constants("MAX_FORCE")
+        self.MAX_JERK = constants("MAX_JERK")
+        self.AVG_FORCE = constants("AVG_FORCE")
+        self.AVG_VELOCITY = constants("AVG_VELOCITY")
+        self.ENERGY_BUDGET = constants("ENERGY_BUDGET")
+        self.MIN_FORCE_CHANGE = self.TOTAL_WEIGHT * self.MAX_JERK * dt * 1.0 / 10.0
+        self.COURSE_LENGTH = np.array([c.COURSE_LENGTH for c in courses], dtype=np.float64)
+
+        self.INITIAL_DISTANCE = np.array([r.INITIAL_STATE.distance for r in riders], dtype=np.float64)
+        self.INITIAL_VELOCITY = np.array([r.INITIAL_STATE.velocity for r in riders], dtype=np.float64)
+        self.INITIAL_FORCE = np.array([r.INITIAL_STATE.force for r in riders], dtype=np.float64)
+        self.INITIAL_AN_ENERGY = np.array([r.INITIAL_STATE.an_energy for r in riders], dtype=np.float64)
+
+        # environments sharing a course object are looked up together
+        groups = {}
+        for index, course in enumerate(courses):
+            groups.setdefault(id(course), (course, []))[1].append(index)
+        self._course_groups = [(course, np.array(indices)) for course, indices in groups.values()]
+
+        self.time = np.zeros(self.NUM_ENVS)
+        self.distance = np.zeros(self.NUM_ENVS)
+        self.velocity = np.zeros(self.NUM_ENVS)
+        self.force = np.zeros(self.NUM_ENVS)
+        self.an_energy = np.zeros(self.NUM_ENVS)
+        self.last_distance = np.zeros(self.NUM_ENVS)
+        self.last_force = np.zeros(self.NUM_ENVS)
+        self.final_observations = np.zeros((self.NUM_ENVS, self.OBSERVATION_SIZE))
+
+        self.reset()
+
+    @classmethod
+    def from_system(cls, system: RCS.RiderCourseSystem, num_envs: int, auto_reset: bool = True) -> "BatchedRiderCourseSystem":
+        """Returns a batched system of num_envs copies of system's rider and course."""
+        return cls(
+            [system.rider] * num_envs,
+            [system.course] * num_envs,
+            dt=system.DT,
+            air_density=system.AIR_DENSITY,
+            auto_reset=auto_reset,
+        )
+
+    def reset(self, mask: np.ndarray | None = None) -> None:
+        """Resets the environments where mask is True (all of them if mask is None) to their initial states."""
+
+        if mask is None:
+            mask = np.ones(self.NUM_ENVS, dtype=bool)
+
+        self.time[mask] = 0.0
+        self.distance[mask] = self.INITIAL_DISTANCE[mask]
+        self.velocity[mask] = self.INITIAL_VELOCITY[mask]
+        self.force[mask] = self.INITIAL_FORCE[mask]
+        self.an_energy[mask] = self.INITIAL_AN_ENERGY[mask]
+        # same as a fresh Rider: the last state is all zero except for the force
+        self.last_distance[mask] = 0.0
+        self.last_force[mask] = self.INITIAL_FORCE[mask]
+
+    def slopes(self, distances: np.ndarray) -> np.ndarray:
+        """
+        Returns the slope of each environment's course at distances.
+        distances has shape (NUM_ENVS,) or (NUM_ENVS, k), row i is looked up on course i.
+        """
+
+        output = np.empty_like(distances)
+
+        for course, indices in self._course_groups:
+            output[indices] = course.slope_many(distances[indices])
+
+        return output
+
+    def _integrate(self, actions: np.ndarray) -> None:
+        """Moves every environment forward by DT with one Euler step, the new force is its last force + MIN_FORCE_CHANGE * action."""
+
+        dt = self.DT
+
+        self.time = self.time + dt
+        self.force = self.force + self.MIN_FORCE_CHANGE * np.asarray(actions, dtype=np.float64)
+        self.last_force = self.force.copy()
+        self.last_distance = self.distance
+
+        velocity = self.velocity
+
+        self.distance = self.last_distance + velocity * dt
+        air_term = self.AIR_COEF * velocity**2
+        gravity_term = self.GRAVITY_COEF * self.slopes(self.last_distance)
+        self.velocity = velocity + self.INV_WEIGHT * (self.force - air_term - gravity_term) * dt
+
+        spending = (self.distance > self.last_distance) & (self.force > 0)
+        self.an_energy = np.where(spending, self.an_energy - self.force * (self.distance - self.last_distance), self.an_energy)
+
+    def _observe_and_reset(self, dones: np.ndarray) -> np.ndarray:
+        """Returns the observations after a step, resetting the environments which are done if AUTO_RESET is True."""
+
+        observations = self.observations()
+
+        if self.AUTO_RESET and dones.any():
+            self.final_observations = observations.copy()
+            self.reset(dones)
+            observations[dones] = self.observations(dones)
+
+        return observations
+
+    def step(self, actions: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Steps forward every environment by DT with one Euler step.
+        The new force of each environment is its last force + MIN_FORCE_CHANGE * action, as in ExperienceReplay.build.
+
+        Returns (observations, dones) where dones is True for the environments which passed the end of their course.
+        If AUTO_RESET is True, those environments are reset and their observations are of the reset state,
+        the observations they finished with are kept in final_observations.
+        """
+
+        self._integrate(actions)
+        dones = self.distance >= self.COURSE_LENGTH
+
+        return self._observe_and_reset(dones), dones
+
+    def step_with_rewards(
+        self,
+        actions: np.ndarray,
+        reward_bundle: RP.CompiledRewardBundle,
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Same as step, but also scores the new states with reward_bundle before any resets.
+        An environment is also done when it makes a severe mistake.
+
+        Returns (observations, rewards, dones, reason_codes), see CompiledRewardBundle for the reason codes.
+        """
+
+        self._integrate(actions)
+        rewards, terminated, reason_codes = reward_bundle(self.reward_states())
+        dones = (self.distance >= self.COURSE_LENGTH) | terminated
+
+        return self._observe_and_reset(dones), rewards, dones, reason_codes
+
+    def reward_states(self) -> RP.RewardStates:
+        """Returns the current states of every environment as RewardStates of shape (NUM_ENVS,)."""
+
+        return RP.RewardStates(
+            self.distance,
+            self.last_distance,
+            self.force,
+            self.an_energy,
+            self.time,
+            self.MAX_FORCE,
+            self.COURSE_LENGTH,
+        )
+
+    def observations(self, mask: np.ndarray | None = None) -> np.ndarray:
+        """
+        Returns the observations of the environments where mask is True (all of them if mask is None) as an array of shape (k, 17).
+        Each row is in the same format as RiderCourseSystem.model_format_curr_state.
+        """
+
+        if mask is None:
+            mask = slice(None)
+
+        distance = self.distance[mask]
+        half_length = 0.5 * self.COURSE_LENGTH[mask]
+        half_budget = 0.5 * self.ENERGY_BUDGET[mask]
+
+        observations = np.empty((distance.shape[0], self.OBSERVATION_SIZE))
+        observations[:, 0] = (distance - half_length) / half_length
+        observations[:, 1] = (self.velocity[mask] - self.AVG_VELOCITY[mask]) / HF.m_per_s(100.0)
+        observations[:, 2] = (self.last_force[mask] - self.AVG_FORCE[mask]) / self.MAX_FORCE[mask]
+        observations[:, 3] = (self.an_energy[mask] - half_budget) / half_budget
+        observations[:, 15] = self.MAX_JERK[mask]
+        observations[:, 16] = self.DT
+
+        lookahead = np.zeros((self.NUM_ENVS, self.LOOKAHEAD_OFFSETS.shape[0]))
+        lookahead[mask] = distance[:, None] + self.LOOKAHEAD_OFFSETS
+        observations[:, 4:15] = self.slopes(lookahead)[mask]
+
+        return observations
@@ -0,0 +1,78 @@
+import Class_ObservationEncoder as OE
+import Class_ReplayBuffer as RB
+import Class_RiderCourseSystem as RCS
+import torch
+
+
+class CompactReplayBuffer(RB.ReplayBuffer):
+    """
+    A ReplayBuffer which only keeps the physical part of each state, so that millions of transitions fit in memory.
+    Of the 17 values of an observation (see ObservationEncoder) only the first four, the normalized distance, velocity,
+    last force and anaerobic energy, depend on more than the distance. The 11 slopes are looked up again from the distance
+    and the last two are the constants MAX_JERK and DT, so the full observations are only rebuilt for the sampled batches,
+    with one vectorized course lookup per batch.
+
+    The physical values, rewards and discounts are stored in float32 and the actions in int8, about 50 bytes per transition
+    against about 300 for a float64 ReplayBuffer. The rebuilt observations have the dtype given to the buffer.
+
+    Attributes:
+    - system: The system whose course and constants the observations are rebuilt with. Must match the system they were encoded from.
+    - start_physical: The first four values of each start state, shape (CAPACITY, 4).
+    - result_physical: The first four values of each result state, shape (CAPACITY, 4).
+    - DTYPE: The dtype of the rebuilt observations.
+    """
+
+    system: RCS.RiderCourseSystem
+    start_physical: torch.tensor
+    result_physical: torch.tensor
+    DTYPE: torch.dtype
+
+    PHYSICAL_SIZE = 4
+
+    def __init__(
+        self,
+        capacity: int,
+        system: RCS.RiderCourseSystem,
+        dtype: torch.dtype = torch.float64,
+        device: str = RB.device,
+    ) -> None:
+        """Initializing the replay buffer. All the storage is allocated here."""
+
+        self.system = system
+        self.DTYPE = dtype
+
+        super(CompactReplayBuffer, self).__init__(capacity, state_size=OE.ObservationEncoder.OBSERVATION_SIZE, dtype=dtype, device=device)
+
+        self.actions = torch.zeros(capacity, dtype=torch.int8, device=device)
+        self.rewards = torch.zeros(capacity, dtype=torch.float32, device=device)
+        self.discounts = torch.ones(capacity, dtype=torch.float32, device=device)
+
+    def _allocate_states(self, dtype: torch.dtype) -> None:
+        self.start_physical = torch.zeros((self.CAPACITY, self.PHYSICAL_SIZE), dtype=torch.float32, device=self.device)
+        self.result_physical = torch.zeros((self.CAPACITY, self.PHYSICAL_SIZE), dtype=torch.float32, device=self.device)
+
+    def _write_states(self, slots: torch.tensor, start_states: torch.tensor, result_states: torch.tensor) -> None:
+        self.start_physical[slots] = start_states[:, : self.PHYSICAL_SIZE].to(self.device, torch.float32, non_blocking=True)
+        self.result_physical[slots] = result_states[:, : self.PHYSICAL_SIZE].to(self.device, torch.float32, non_blocking=True)
+
+    def _read_states(self, indices: torch.tensor, result: bool = False) -> torch.tensor:
+        return self.observations((self.result_physical if result else self.start_physical)[indices])
+
+    def observations(self, physical: torch.tensor) -> torch.tensor:
+        """Returns the full observations, shape (batch size, STATE_SIZE), of the states with the physical values physical."""
+
+        c = self.system.course
+        half_length = 0.5 * c.COURSE_LENGTH
+
+        physical = physical.cpu()
+        distances = physical[:, 0].to(torch.float64).numpy() * half_length + half_length
+
+        # pinned when it is going to a GPU, so the copy does not hold up the host
+        observations = torch.empty((physical.size(dim=0), self.STATE_SIZE), dtype=self.DTYPE, pin_memory=self._copies_done is not None)
+        observations[:, : self.PHYSICAL_SIZE] = physical
+        # the slopes of all the states of the batch at all the lookahead offsets, in one lookup
+        observations.numpy()[:, 4:15] = c.slope_many(distances[:, None] + self.system.LOOKAHEAD_OFFSETS)
+        observations[:, 15] = self.system.rider.MAX_JERK
+        observations[:, 16] = self.system.DT
+
+        return observations.to(self.device, non_blocking=True)
@@ -2,9 +2,14 @@ import Class_RiderCourseSystem as RCS
 import Class_NeuralNetwork as NN
 import Helper_Functions as HF
 import Classes_Rewards_Penalties as RP
-import matplotlib.pyplot as plt
+import Class_ReplayBuffer as RB
+import Class_ObservationEncoder as OE
+import Class_NumpyPolicy as NP
+import Class_PlotService as PS
+import Class_Metrics as M
 import numpy as np
 import torch
+import types
 
 device = "cuda" if torch.cuda.is_available() else "cpu"
 
@@ -18,12 +23,14 @@ class DataPoint:
               new force = last force + (rider weight) * (rider max jerk) * (system DT) * 1/10 * action
     - reward: The reward for achieving the result state.
     - result_state: The state resulting from being in state start_state and taking action action.
+    - done: True if the result state ended the episode (finished the course or made a severe mistake).
     """
 
     start_state: torch.tensor
     action: int
     reward: float
     result_state: torch.tensor
+    done: bool
 
     def __init__(
         self,
@@ -31,12 +38,14 @@ class DataPoint:
         action: int,
         reward: float,
         result_state: torch.tensor,
+        done: bool = False,
     ) -> None:
         """Initialize the data point."""
         self.start_state = start_state
         self.action = action
         self.reward = reward
         self.result_state = result_state
+        self.done = done
 
 
 class ExperienceReplay:
@@ -44,14 +53,36 @@ class ExperienceReplay:
     A collection of data points collected from the Q_network interacting with the physical system.
 
     Attributes:
-    - experience_library: The collection of data points.
+    - experience_library: The collection of data points from the last build.
+    - replay_buffer: Optional persistent store which every built episode is added to. Kept across builds.
+    - encoder: Encodes the states of the system. The states of the data points are views into its array, so they are only valid until the next build.
+    - flushed: The number of data points of the current experience_library which have been added to replay_buffer.
+    - policy: The NumpyPolicy which picks the greedy actions when the "numpy" inference backend is chosen, None for "torch".
+    - metrics: Times the phases of build and counts its steps and the transitions added to replay_buffer. Disabled by default.
+    - env_steps: The number of physics steps taken by every build so far, counted even when metrics is disabled.
+    - ACTION_REPEAT: The number of physics steps each action is applied for. Default is 1.
+    - N_STEP: The number of data points each return added to replay_buffer looks ahead before bootstrapping. Default is 1.
+    - GAMMA: The discount of the returns. Must be the same gamma the loss is computed with.
+    - LAMBDA: Mixes the 1 to N_STEP step returns like a lambda-return truncated at N_STEP. Default is 1.0, the plain N_STEP step return.
     """
 
     experience_library: list[DataPoint]
+    flushed: int
+    replay_buffer: RB.ReplayBuffer | None
+    encoder: OE.ObservationEncoder
     system: RCS.RiderCourseSystem
     Q_network: NN.NeuralNetwork
     reward_bundle: RP.RewardBundle
+    policy: NP.NumpyPolicy | None
+    metrics: M.Metrics
+    env_steps: int
     EPSILON: float
+    ACTION_REPEAT: int
+    N_STEP: int
+    GAMMA: float
+    LAMBDA: float
+
+    INFERENCE_BACKENDS = ("torch", "numpy")
 
     def __init__(
         self,
@@ -59,21 +90,59 @@ class ExperienceReplay:
         Q_network: NN.NeuralNetwork,
         reward_bundle: RP.RewardBundle,
         epsilon: float,
+        replay_buffer: RB.ReplayBuffer | None = None,
+        inference_backend: str = "torch",
+        action_repeat: int = 1,
+        n_step: int = 1,
+        gamma: float = 0.1,
+        lam: float = 1.0,
+        metrics: M.Metrics | None = None,
     ) -> None:
+        """
+        Initializing the experience replay.
+        inference_backend decides what runs the Q_network when picking actions during build.
+        "numpy" mirrors the weights into a NumpyPolicy, which is much faster for one state at a time and follows changes to the weights.
+        With action_repeat k each action is held for k physics steps, so there is one data point (and one policy query) per k steps.
+        n_step, gamma and lam decide the returns which are added to replay_buffer, see episode_tensors.
+
+        Preconditions:
+        - inference_backend in ExperienceReplay.INFERENCE_BACKENDS
+        - action_repeat >= 1
+        - n_step >= 1
+        - 0.0 <= lam <= 1.0
+        """
+
         self.experience_library = []
+        self.flushed = 0
+        self.replay_buffer = replay_buffer
+        # the encoder's rows are the host side of the copies into replay_buffer, pinned if they go to a GPU
+        self.encoder = OE.ObservationEncoder(system, pin_memory=torch.device(device).type == "cuda")
         self.system = system
         self.Q_network = Q_network
+        self.policy = NP.NumpyPolicy(Q_network) if inference_backend == "numpy" else None
         self.reward_bundle = reward_bundle
+        self.metrics = metrics if metrics is not None else M.Metrics(enabled=False)
+        self.env_steps = 0
         self.EPSILON = epsilon
+        self.ACTION_REPEAT = action_repeat
+        self.N_STEP = n_step
+        self.GAMMA = gamma
+        self.LAMBDA = lam
 
-    def build(self) -> None:
+    def build(self, on_step: types.FunctionType | None = None) -> None:
         """
         Builds the experience_library by having the Q_Network interact with the system.
         Important Note: need to be able to go a little past the finish line of the course because of the while loop structure.
         The build is stopped when the rider passes the finish line, or when the cutoff time is passed, or when the rider abilities are violated.
+        If on_step is given, on_step(self) is called after every data point is added, e.g. to flush and learn in the middle of the episode.
+
+        Each action is applied for ACTION_REPEAT physics steps. The force still changes by at most MIN_FORCE_CHANGE * action per step,
+        so holding an action ramps the force, the same as choosing it ACTION_REPEAT times in a row.
+        The reward of the data point is the sum of the rewards of its steps, which stop early if the episode ends.
         """
 
         self.experience_library = []
+        self.flushed = 0
 
         system = self.system
 
@@ -82,74 +151,195 @@ class ExperienceReplay:
 
         system.reset()
 
+        encoder = self.encoder
+        if self.replay_buffer is not None:
+            # the rows of the last episode may still be being copied
+            self.replay_buffer.synchronize()
+        encoder.reset()
+
+        metrics = self.metrics
+        policy_timer = metrics.time("policy")
+        physics_timer = metrics.time("physics")
+        reward_timer = metrics.time("reward")
+        encode_timer = metrics.time("encode")
+
         while system.rider.state.distance < system.course.COURSE_LENGTH:
-            start_state = system.model_format_curr_state()  # FIXME repeating this for each iteration as well as the result_state = system.model_format_curr_state() line is redundant.
+            # the result state of the last step is the start state of this one
+            start_state = encoder.states[encoder.length - 1]
 
-            if system.time == 0.0:  # FIXME This is just a quick fix that is needed because otherwise, the force applied going from the first state to the second state is not the initial force.
-                action = 0
-            else:
-                action = HF.epsilon_greedy_action(self.Q_network, start_state, epsilon=self.EPSILON)
+            with policy_timer:
+                if system.time == 0.0:  # FIXME This is just a quick fix that is needed because otherwise, the force applied going from the first state to the second state is not the initial force.
+                    action = 0
+                elif self.policy is not None:
+                    action = HF.epsilon_greedy_action(self.policy, encoder.observations[encoder.length - 1], epsilon=self.EPSILON)
+                else:
+                    action = HF.epsilon_greedy_action(self.Q_network, start_state.to(device), epsilon=self.EPSILON)
 
-            last_force = (start_state[2].item() * system.rider.MAX_FORCE) + system.rider.AVG_FORCE
+            reward = 0.0
 
-            force_from_action = last_force + MIN_FORCE_CHANGE * action
+            for substep in range(self.ACTION_REPEAT):
+                last_force = system.rider.last_state.force
 
-            system.rider.state.force = force_from_action
+                force_from_action = last_force + MIN_FORCE_CHANGE * action
 
-            system.euler_step_forward()
-            # the state of the system has changed!
+                system.rider.state.force = force_from_action
 
-            result_state = system.model_format_curr_state()
+                with physics_timer:
+                    system.step_forward()
+                # the state of the system has changed!
 
-            try:
-                reward = self.reward_bundle.reward()
-            except RP.SevereMistakeError:
-                reward = self.reward_bundle.SEVERE_MISTAKE_PENALTY
-                data_point = DataPoint(start_state, action, reward, result_state)
-                self.experience_library.append(data_point)
-                break
+                try:
+                    with reward_timer:
+                        reward += self.reward_bundle.reward()
+                    done = system.rider.state.distance >= system.course.COURSE_LENGTH
+                except RP.SevereMistakeError:
+                    reward += self.reward_bundle.SEVERE_MISTAKE_PENALTY
+                    done = True
+
+                if done:
+                    break
 
-            data_point = DataPoint(start_state, action, reward, result_state)
+            metrics.count("env_steps", substep + 1)
+            self.env_steps += substep + 1
+
+            with encode_timer:
+                result_state = encoder.states[encoder.encode()]
+
+            data_point = DataPoint(start_state, action, reward, result_state, done=done)
             self.experience_library.append(data_point)
 
-    def plot(self) -> None:
+            if on_step is not None:
+                on_step(self)
+
+            if done:
+                break
+
+        self.flush(final=True)
+
+    def flush(self, final: bool = False) -> None:
         """
-        Plots the force and energy as funcs of distance.
-        Specifically this prints the start states of the experience_library and the last_force from the resulting state.
+        Adds the data points of the current experience_library which have not been added yet to replay_buffer, if there is one.
+        Only the data points whose N_STEP step returns are complete are added, unless final is True because the episode is over.
         """
 
-        r = self.system.rider
-        rs = self.system.rider.state
-        c = self.system.course
+        ready = len(self.experience_library) if final else len(self.experience_library) - self.N_STEP + 1
 
-        distance_array = np.array([])
-        force_array = np.array([])
-        energy_array = np.array([])
+        if self.replay_buffer is not None and self.flushed < ready:
+            with self.metrics.time("insert"):
+                self.replay_buffer.add_batch(*self.episode_tensors(start=self.flushed, end=ready))
+            self.metrics.count("transitions", ready - self.flushed)
+            self.flushed = ready
 
-        for data_point in self.experience_library:
-            distance = data_point.start_state[0].item()
-            force = data_point.result_state[2].item()
-            an_energy = data_point.start_state[3].item()
+    def episode_tensors(self, start: int = 0, end: int | None = None) -> list[torch.tensor]:
+        """
+        Returns the data points start to end (all of the rest by default) of the experience_library as
+        [start_states, actions, returns, bootstrap_states, dones, discounts], where index i in each tensor corresponds to the (start + i)-th data point.
+        The target of data point t is then returns[t] + GAMMA * discounts[t] * max Q(bootstrap_states[t]), see HF.Q_learning_targets.
+
+        With N_STEP = n and LAMBDA = 1 the return is the discounted sum of the next n rewards and the bootstrap state is n data points ahead,
+        with LAMBDA < 1 the 1 to n step returns are mixed with weights like those of a lambda-return. The values of the states in between
+        come from Q_network now, only the last one is bootstrapped from when training:
+        returns[t] = sum over j < n of (GAMMA * LAMBDA) ** j * (r[t + j] + GAMMA * (1 - LAMBDA) * V[t + j + 1] if j < n - 1)
+        discounts[t] = (GAMMA * LAMBDA) ** (n - 1)
+        The windows are cut short at the end of the episode, where discounts is 0 and dones is True if the episode ended in a terminal state.
+        All of it is worked out with one NumPy pass per step of the window, and one batched forward pass of Q_network when LAMBDA < 1.
+
+        With N_STEP = 1 these are the rewards and result states, and the states are views into the encoder's array,
+        copy them if they need to outlive the next build.
+
+        Preconditions:
+        - 0 <= start < end <= len(self.experience_library)
+        - if end < len(self.experience_library) then end + N_STEP - 1 <= len(self.experience_library)
+        """
+
+        count = len(self.experience_library)
+        end = count if end is None else end
+        n = self.N_STEP
+
+        library = self.experience_library[start:end]
+        dtype = self.system.DTYPE
+
+        actions = torch.tensor([data_point.action for data_point in library])
+        terminal = self.experience_library[-1].done
+
+        if n == 1:
+            dones = torch.tensor([data_point.done for data_point in library])
+            return [
+                self.encoder.states[start:end],
+                actions,
+                torch.tensor([data_point.reward for data_point in library], dtype=dtype),
+                self.encoder.states[start + 1 : end + 1],
+                dones,
+                (~dones).to(dtype),
+            ]
+
+        size = end - start
+        window_end = min(end + n - 1, count)
+        decay = self.GAMMA * self.LAMBDA
+
+        # rewards[k] is the reward of data point start + k, zero past the end of the episode
+        rewards = np.zeros(size + n - 1)
+        rewards[: window_end - start] = [data_point.reward for data_point in self.experience_library[start:window_end]]
+
+        # the number of data points in each window, fewer than n at the end of the episode
+        steps = np.minimum(n, count - np.arange(start, end))
+
+        returns = np.zeros(size)
+        for j in range(n):
+            returns += decay**j * rewards[j : j + size]
+
+        if self.LAMBDA < 1.0:
+            # values[k] is V of the state after data point start + k, only needed inside the windows so never the final state
+            values = np.zeros(size + n - 1)
+            with torch.no_grad():
+                states = self.encoder.states[start + 1 : window_end].to(device, non_blocking=True)
+                values[: window_end - start - 1] = self.Q_network(states).max(dim=1).values.cpu().numpy()
+
+            for j in range(n - 1):
+                returns += (j < steps - 1) * decay**j * self.GAMMA * (1.0 - self.LAMBDA) * values[j : j + size]
+
+        # only the windows which reach the end of a terminated episode have nothing to bootstrap from
+        dones = (np.arange(start, end) + n >= count) & terminal
+        discounts = np.where(dones, 0.0, decay ** (steps - 1))
+
+        return [
+            self.encoder.states[start:end],
+            actions,
+            torch.from_numpy(returns).to(dtype),
+            self.encoder.states[torch.from_numpy(np.arange(start, end) + steps)],
+            torch.from_numpy(dones),
+            torch.from_numpy(discounts).to(dtype),
+        ]
+
+    def trajectory(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Returns (distances, forces, energies) of the current experience_library in physical units, for plotting.
+        The distance and anaerobic energy are those of the start state of each data point and the force is the last force of its result state.
+        These are new arrays, so they stay valid after the next build.
+        """
+
+        r = self.system.rider
+        c = self.system.course
 
-            # undoing the model state format as found in class ridercoursesystem
-            distance = distance * (0.5 * c.COURSE_LENGTH) + (0.5 * c.COURSE_LENGTH)
-            force = (force * r.MAX_FORCE) + r.AVG_FORCE
-            an_energy = an_energy * (0.5 * r.ENERGY_BUDGET) + (0.5 * r.ENERGY_BUDGET)
+        count = len(self.experience_library)
+        observations = self.encoder.observations[: count + 1].astype(np.float64)
 
-            distance_array = np.append(distance_array, distance)
-            force_array = np.append(force_array, force)
-            energy_array = np.append(energy_array, an_energy)
+        # undoing the model state format as found in class ridercoursesystem
+        distances = observations[:count, 0] * (0.5 * c.COURSE_LENGTH) + (0.5 * c.COURSE_LENGTH)
+        forces = observations[1:, 2] * r.MAX_FORCE + r.AVG_FORCE
+        energies = observations[:count, 3] * (0.5 * r.ENERGY_BUDGET) + (0.5 * r.ENERGY_BUDGET)
 
-        fig, axs = plt.subplots(2)
+        return distances, forces, energies
 
-        axs[0].plot(distance_array, force_array)
-        axs[0].set_title("force vs distance")
+    def plot(self) -> None:
+        """
+        Plots the force and energy as funcs of distance, see trajectory. Waits for matplotlib to draw the figure,
+        use a PlotService to plot without holding up training.
+        """
 
-        axs[1].plot(distance_array, energy_array)
-        axs[1].set_title("energy vs distance")
+        import matplotlib.pyplot as plt
 
-        fig.suptitle("Full Q_network Rollout:")
-        fig.tight_layout()
+        PS.draw_rollout(plt, None, *self.trajectory())
 
         plt.show(block=False)
         plt.pause(0.001)
@@ -159,6 +349,8 @@ class ExperienceReplay:
         Returns a random batch of size batch_size of datapoints from self.experience_library plus the last data point.
         But the return is not a list of data points but it a list of tensors such that at some given index in each tensor,
         each element at that index in each tensor corresponds to the same data point.
+        The tensors are [start_states, actions, rewards, result_states, dones].
+        A PrioritizedReplayBuffer is the better way of making sure the terminal data points are seen often.
         """
 
         sublst = HF.random_sublist_plus_last(self.experience_library, size=batch_size)
@@ -169,19 +361,36 @@ class ExperienceReplay:
         sublst_actions = []
         sublst_rewards = []
         sublst_results = []
+        sublst_dones = []
         for data_point in sublst:
             sublst_starts.append(data_point.start_state)
-            sublst_actions.append(torch.tensor(data_point.action))
-            sublst_rewards.append(torch.tensor(data_point.reward))
+            sublst_actions.append(data_point.action)
+            sublst_rewards.append(data_point.reward)
             sublst_results.append(data_point.result_state)
+            sublst_dones.append(data_point.done)
 
         output.extend(
             [
-                torch.stack(sublst_starts).to(device),
-                torch.stack(sublst_actions).to(device),
-                torch.stack(sublst_rewards).to(device),
-                torch.stack(sublst_results).to(device),
+                torch.stack(sublst_starts),
+                torch.tensor(sublst_actions),
+                torch.tensor(sublst_rewards, dtype=self.system.DTYPE),
+                torch.stack(sublst_results),
+                torch.tensor(sublst_dones),
             ]
         )
 
+        if torch.device(device).type == "cuda":
+            # staged in pinned memory so the five copies are queued without waiting on each other
+            output = [tensor.pin_memory().to(device, non_blocking=True) for tensor in output]
+
         return output
+
+    def random_batch(self, batch_size: int) -> list[torch.tensor]:
+        """
+        Returns a uniformly random batch of size batch_size from self.replay_buffer as
+        [start_states, actions, rewards, result_states, dones, discounts]. Unlike random_batch_plus_last this includes old episodes.
+
+        Preconditions:
+        - self.replay_buffer is not None
+        """
+        return self.replay_buffer.sample(batch_size)
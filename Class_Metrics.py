@@ -0,0 +1,163 @@
+import csv
+import json
+import time
+
+
+class _PhaseTimer:
+    """Adds the time spent inside each with block to seconds."""
+
+    __slots__ = ("seconds", "calls", "_start")
+
+    def __init__(self) -> None:
+        self.seconds = 0.0
+        self.calls = 0
+        self._start = 0.0
+
+    def __enter__(self) -> None:
+        self._start = time.perf_counter()
+
+    def __exit__(self, *exc_info) -> None:
+        self.seconds += time.perf_counter() - self._start
+        self.calls += 1
+
+
+class _NullTimer:
+    """The timer of disabled Metrics, which does nothing."""
+
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        pass
+
+    def __exit__(self, *exc_info) -> None:
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class Metrics:
+    """
+    Where the wall clock time of training goes. Each phase of training is timed with a with block around it,
+    e.g. with metrics.time("physics"): ..., and the counters count the work done, e.g. metrics.count("env_steps").
+    The timers are preallocated and only read time.perf_counter, so they cost well under a microsecond each.
+
+    row() closes the current interval: it returns the seconds spent in each phase, the counts and their rates per second
+    since the last row, and appends that to PATH (CSV or JSON lines, by its extension) if there is one.
+    Work queued on a GPU is timed when it is launched, not when it runs.
+
+    Attributes:
+    - timers: The timer of each phase in PHASES.
+    - counters: The count of each counter in COUNTERS in the current interval.
+    - PATH: The file the rows are written to, None to only return them. Ends in ".csv" for CSV, otherwise JSON lines.
+    - ENABLED: If False, nothing is timed or counted.
+    """
+
+    timers: dict[str, _PhaseTimer]
+    counters: dict[str, int]
+    PATH: str | None
+    ENABLED: bool
+
+    PHASES = (
+        "policy",  # picking actions
+        "physics",  # stepping the system forward
+        "reward",  # evaluating the reward bundle
+        "encode",  # writing the observations
+        "insert",  # working out the returns and adding them to the replay buffer
+        "batch",  # sampling and gathering a batch, including the target network outputs
+        "loss",  # the Q-learning targets and loss
+        "backward",
+        "optimizer",
+        "target_sync",  # updating the target network
+        "plotting",
+    )
+    COUNTERS = ("env_steps", "transitions", "gradient_steps")
+
+    def __init__(self, path: str | None = None, enabled: bool = True) -> None:
+        """Initializing the metrics. The first interval starts now."""
+
+        self.PATH = path
+        self.ENABLED = enabled
+        self.timers = {phase: _PhaseTimer() for phase in self.PHASES}
+        self.counters = dict.fromkeys(self.COUNTERS, 0)
+
+        self._interval_start = time.perf_counter()
+        self._file = None
+        self._writer = None
+
+    def time(self, phase: str) -> _PhaseTimer | _NullTimer:
+        """
+        Returns the timer of phase, to be used as with metrics.time(phase): ...
+
+        Preconditions:
+        - phase in Metrics.PHASES
+        """
+        return self.timers[phase] if self.ENABLED else _NULL_TIMER
+
+    def count(self, counter: str, amount: int = 1) -> None:
+        """
+        Adds amount to counter.
+
+        Preconditions:
+        - counter in Metrics.COUNTERS
+        """
+
+        if self.ENABLED:
+            self.counters[counter] += amount
+
+    def row(self, **extra) -> dict:
+        """
+        Returns the metrics of the interval since the last row (or since initializing) and starts the next one.
+        The keyword arguments are put at the front of the row, e.g. row(epoch=epoch). The same ones must be given every time for CSV.
+        """
+
+        now = time.perf_counter()
+        seconds = now - self._interval_start
+
+        row = dict(extra)
+        row["seconds"] = seconds
+
+        for counter in self.COUNTERS:
+            row[counter] = self.counters[counter]
+            row[f"{counter}_per_second"] = self.counters[counter] / seconds
+            self.counters[counter] = 0
+
+        for phase in self.PHASES:
+            row[f"{phase}_seconds"] = self.timers[phase].seconds
+            self.timers[phase].seconds = 0.0
+            self.timers[phase].calls = 0
+
+        row["other_seconds"] = seconds - sum([row[f"{phase}_seconds"] for phase in self.PHASES])
+
+        self._interval_start = now
+
+        if self.PATH is not None:
+            self._write(row)
+
+        return row
+
+    def _write(self, row: dict) -> None:
+        """Appends row to PATH, opening it on the first row."""
+
+        if self._file is None:
+            self._file = open(self.PATH, "w", newline="")
+
+            if self.PATH.endswith(".csv"):
+                self._writer = csv.DictWriter(self._file, fieldnames=list(row.keys()))
+                self._writer.writeheader()
+
+        if self._writer is not None:
+            self._writer.writerow(row)
+        else:
+            self._file.write(json.dumps(row) + "\n")
+
+        # flushed so that the file can be watched while training runs
+        self._file.flush()
+
+    def close(self) -> None:
+        """Closes PATH if it was opened."""
+
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self._writer = None
@@ -1,7 +1,101 @@
 import torch
 
 
-class NeuralNetwork(torch.nn.Module):
+ACTIVATIONS = {
+    "relu": torch.nn.ReLU,
+    "leaky_relu": torch.nn.LeakyReLU,
+    "tanh": torch.nn.Tanh,
+}
+
+
+class MLP(torch.nn.Module):
+    """
+    A fully connected network with the layer widths given by layer_widths, e.g. [17, 64, 64, 21] has two hidden layers of 64.
+    The layers are named layer_1, layer_2, ... like in NeuralNetwork, so their state dicts are interchangeable.
+
+    Attributes:
+    - LAYER_WIDTHS: The width of the input, every hidden layer and the output.
+    - ACTIVATION: The name of the activation between the layers, one of the keys of ACTIVATIONS.
+    """
+
+    LAYER_WIDTHS: list[int]
+    ACTIVATION: str
+
+    def __init__(self, layer_widths: list[int], activation: str = "relu", dtype: torch.dtype = torch.float64) -> None:
+        """
+        Initializing the network.
+
+        Preconditions:
+        - len(layer_widths) >= 2
+        - activation in ACTIVATIONS
+        """
+
+        super(MLP, self).__init__()
+
+        self.LAYER_WIDTHS = list(layer_widths)
+        self.ACTIVATION = activation
+
+        for i in range(len(layer_widths) - 1):
+            layer = torch.nn.Linear(in_features=layer_widths[i], out_features=layer_widths[i + 1], dtype=dtype)
+            setattr(self, f"layer_{i + 1}", layer)
+
+        self.activation = ACTIVATIONS[activation]()
+
+        # a plain list so that the layers are not registered (and saved) a second time under other names
+        self._layers = [getattr(self, f"layer_{i + 1}") for i in range(len(layer_widths) - 1)]
+
+    def forward(self, input: torch.tensor):
+        output = input
+
+        for layer in self._layers[:-1]:
+            output = self.activation(layer(output))
+
+        return self._layers[-1](output)
+
+    def _example_input(self, batch_size: int) -> torch.tensor:
+        """Returns a random input of shape (batch_size, input width) on the device and with the dtype of the network."""
+
+        weight = self._layers[0].weight
+        return torch.randn(batch_size, self.LAYER_WIDTHS[0], dtype=weight.dtype, device=weight.device)
+
+    def compiled(self, backend: str = "compile", batch_size: int = 30) -> torch.nn.Module:
+        """
+        Returns a faster forward pass of this network which shares its parameters, so it can be trained through in place of the network.
+        backend "compile" uses torch.compile (fused kernels, needs a working compiler toolchain),
+        "trace" uses a TorchScript trace with an example batch of batch_size states.
+
+        Preconditions:
+        - backend in ("compile", "trace")
+        """
+
+        if backend == "compile":
+            return torch.compile(self)
+
+        return torch.jit.trace(self, self._example_input(batch_size))
+
+    def export_frozen(self, path: str | None = None) -> torch.jit.ScriptModule:
+        """
+        Returns a frozen TorchScript copy of this network for deployment, with the weights baked in as constants,
+        and saves it to path if one is given. Load it back with torch.jit.load(path). The network itself is not changed.
+        """
+
+        was_training = self.training
+        self.eval()
+
+        with torch.no_grad():
+            frozen = torch.jit.freeze(torch.jit.trace(self, self._example_input(1)))
+
+        self.train(was_training)
+
+        if path is not None:
+            torch.jit.save(frozen, path)
+
+        return frozen
+
+
+class NeuralNetwork(MLP):
+    """The original network with four hidden layers and ReLU activations, kept for the code which constructs it this way."""
+
     def __init__(
         self,
         input_size: int,
@@ -11,33 +105,9 @@ class NeuralNetwork(torch.nn.Module):
         hidden4_size: int,
         output_size: int,
     ):
-        super(NeuralNetwork, self).__init__()
-        self.layer_1 = torch.nn.Linear(
-            in_features=input_size, out_features=hidden1_size
-        )
-        self.layer_2 = torch.nn.Linear(
-            in_features=hidden1_size, out_features=hidden2_size
-        )
-        self.layer_3 = torch.nn.Linear(
-            in_features=hidden2_size, out_features=hidden3_size
-        )
-        self.layer_4 = torch.nn.Linear(
-            in_features=hidden3_size, out_features=hidden4_size
-        )
-        self.layer_5 = torch.nn.Linear(
-            in_features=hidden4_size, out_features=output_size
-        )
-        self.relu = torch.nn.ReLU()
-
-    def forward(self, input: torch.tensor):
-        return self.layer_5(
-            self.relu(
-                self.layer_4(
-                    self.relu(
-                        self.layer_3(
-                            self.relu(self.layer_2(self.relu(self.layer_1(input))))
-                        )
-                    )
-                )
-            )
+        super(NeuralNetwork, self).__init__(
+            [input_size, hidden1_size, hidden2_size, hidden3_size, hidden4_size, output_size],
+            activation="relu",
+            dtype=torch.float32,
         )
+        self.relu = self.activation
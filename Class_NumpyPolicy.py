@@ -0,0 +1,79 @@
+import Class_NeuralNetwork as NN
+import numpy as np
+import torch
+
+
+# in place NumPy versions of NN.ACTIVATIONS
+NUMPY_ACTIVATIONS = {
+    "relu": lambda output: np.maximum(output, 0.0, out=output),
+    "leaky_relu": lambda output: np.maximum(output, 0.01 * output, out=output),
+    "tanh": lambda output: np.tanh(output, out=output),
+}
+
+
+class NumpyPolicy:
+    """
+    A NumPy copy of the weights of a Q_network for picking actions one state at a time during rollouts.
+    For a single 17 element state, torch's dispatch and autograd bookkeeping cost far more than the arithmetic of the network,
+    so this does the same MLP forward pass with a few NumPy calls into preallocated arrays.
+
+    The weights are copied again whenever the parameters of the Q_network have changed (e.g. after optimizer.step() or copy_),
+    which is detected through the version counters torch keeps on every tensor. Only for inference, no gradients flow through it.
+
+    Attributes:
+    - Q_network: The network being mirrored. Must be a stack of torch.nn.Linear layers with the same activation between each of them,
+                 named by its ACTIVATION (ReLU if it has none).
+    - weights: The transposed weight of each Linear layer, of shape (in_features, out_features).
+    - biases: The bias of each Linear layer.
+    """
+
+    Q_network: NN.NeuralNetwork
+    weights: list[np.ndarray]
+    biases: list[np.ndarray]
+
+    def __init__(self, Q_network: NN.NeuralNetwork) -> None:
+        """Initializing the policy and copying the current weights of Q_network."""
+
+        self.Q_network = Q_network
+        self._layers = [module for module in Q_network.modules() if isinstance(module, torch.nn.Linear)]
+        # looking the parameters up through the modules every call costs more than the forward pass itself
+        self._parameters = [parameter for layer in self._layers for parameter in (layer.weight, layer.bias)]
+        self._activation = NUMPY_ACTIVATIONS[getattr(Q_network, "ACTIVATION", "relu")]
+        self._version = None
+        self.sync()
+
+    def _parameter_version(self) -> int:
+        """A number which changes whenever any parameter of the Q_network is modified in place."""
+        return sum([parameter._version for parameter in self._parameters])
+
+    def sync(self) -> None:
+        """Copies the weights of the Q_network into the NumPy arrays."""
+
+        with torch.no_grad():
+            self.weights = [np.ascontiguousarray(layer.weight.detach().cpu().numpy().T) for layer in self._layers]
+            self.biases = [layer.bias.detach().cpu().numpy().copy() for layer in self._layers]
+
+        self._outputs = [np.empty(bias.shape, dtype=bias.dtype) for bias in self.biases]
+        self._version = self._parameter_version()
+
+    def __call__(self, model_state: np.ndarray) -> np.ndarray:
+        """
+        Returns the output of the Q_network for one state, which can be a NumPy array or a CPU torch tensor.
+        The returned array is reused by the next call.
+        """
+
+        if self._parameter_version() != self._version:
+            self.sync()
+
+        x = np.asarray(model_state, dtype=self.weights[0].dtype)
+        last = len(self.weights) - 1
+
+        for i in range(len(self.weights)):
+            output = self._outputs[i]
+            np.dot(x, self.weights[i], out=output)
+            output += self.biases[i]
+            if i < last:
+                self._activation(output)
+            x = output
+
+        return x
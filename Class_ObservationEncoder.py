@@ -0,0 +1,93 @@
+import Class_RiderCourseSystem as RCS
+import Helper_Functions as HF
+import numpy as np
+import torch
+
+
+class ObservationEncoder:
+    """
+    Writes the model format of the state of a system (the same values as RiderCourseSystem.model_format_curr_state)
+    into the rows of a preallocated array, one row per step of the current episode.
+    The row written after a step is the result state of that step and the start state of the next one, so each state is encoded once.
+
+    Attributes:
+    - system: The system being encoded.
+    - observations: NumPy array of shape (capacity, 17) in the dtype of system.DTYPE. Row t is the state after t steps of the current episode.
+    - states: A torch view of observations which shares its memory.
+    - length: The number of rows written in the current episode.
+    - PIN_MEMORY: True if observations is in pinned (page-locked) memory, so that it can be copied to a GPU asynchronously.
+    """
+
+    system: RCS.RiderCourseSystem
+    observations: np.ndarray
+    states: torch.tensor
+    length: int
+    PIN_MEMORY: bool
+
+    OBSERVATION_SIZE = 17
+
+    def __init__(self, system: RCS.RiderCourseSystem, capacity: int = 1024, pin_memory: bool = False) -> None:
+        """
+        Initializing the encoder and allocating room for capacity observations.
+        pin_memory needs CUDA, it is only worth it when the observations are copied to a GPU.
+        """
+
+        self.system = system
+        self.PIN_MEMORY = pin_memory
+        self.length = 0
+        self._allocate(capacity)
+
+    def _allocate(self, capacity: int) -> None:
+        """
+        Allocates a new array of capacity rows and copies the rows written so far into it.
+        Tensors handed out earlier keep pointing at the old array, which still holds their values.
+        """
+
+        states = torch.empty((capacity, self.OBSERVATION_SIZE), dtype=self.system.DTYPE, pin_memory=self.PIN_MEMORY)
+        observations = states.numpy()
+        observations[: self.length] = self.observations[: self.length] if self.length > 0 else 0.0
+
+        self.observations = observations
+        self.states = states
+
+    def reset(self) -> None:
+        """Starts a new episode and encodes the current (initial) state of the system into row 0."""
+
+        r = self.system.rider
+        c = self.system.course
+
+        # the normalizations only depend on the rider and course so they are worked out once per episode
+        self._half_length = 0.5 * c.COURSE_LENGTH
+        self._avg_velocity = r.AVG_VELOCITY
+        self._velocity_scale = HF.m_per_s(100.0)
+        self._avg_force = r.AVG_FORCE
+        self._max_force = r.MAX_FORCE
+        self._half_budget = 0.5 * r.ENERGY_BUDGET
+        self._offsets = self.system.LOOKAHEAD_OFFSETS
+
+        self.observations[:, 15] = r.MAX_JERK
+        self.observations[:, 16] = self.system.DT
+
+        self.length = 0
+        self.encode()
+
+    def encode(self) -> int:
+        """Encodes the current state of the system into the next row and returns the index of that row."""
+
+        if self.length == self.observations.shape[0]:
+            self._allocate(2 * self.length)
+            self.observations[self.length :, 15] = self.system.rider.MAX_JERK
+            self.observations[self.length :, 16] = self.system.DT
+
+        rs = self.system.rider.state
+        row = self.observations[self.length]
+
+        row[0] = (rs.distance - self._half_length) / self._half_length
+        row[1] = (rs.velocity - self._avg_velocity) / self._velocity_scale
+        row[2] = (self.system.rider.last_state.force - self._avg_force) / self._max_force
+        row[3] = (rs.an_energy - self._half_budget) / self._half_budget
+        row[4:15] = self.system.course.slope_many(rs.distance + self._offsets)
+
+        self.length += 1
+
+        return self.length - 1
@@ -0,0 +1,138 @@
+import multiprocessing as mp
+import numpy as np
+import os
+import queue
+
+
+def draw_rollout(plt, epoch: int | None, distances: np.ndarray, forces: np.ndarray, energies: np.ndarray):
+    """Draws the force and energy as funcs of distance of one rollout (see ExperienceReplay.trajectory) on a new figure and returns it."""
+
+    fig, axs = plt.subplots(2)
+
+    axs[0].plot(distances, forces)
+    axs[0].set_title("force vs distance")
+
+    axs[1].plot(distances, energies)
+    axs[1].set_title("energy vs distance")
+
+    fig.suptitle("Full Q_network Rollout:" if epoch is None else f"Full Q_network Rollout (epoch {epoch}):")
+    fig.tight_layout()
+
+    return fig
+
+
+def draw_losses(plt, losses: np.ndarray):
+    """Draws the losses on a new figure and returns it."""
+
+    fig, ax = plt.subplots()
+    ax.plot(losses)
+    ax.set_title("loss")
+
+    return fig
+
+
+class PlotService:
+    """
+    Plots the training progress in a separate process, so the training loop never waits on matplotlib.
+    The plots are sent as NumPy arrays through a queue, and the process draws them on its own schedule.
+    If the process falls behind, new rollouts are dropped rather than making the sender wait. Only this process imports matplotlib.
+
+    Modes:
+    - "png": Every plot is saved to DIRECTORY as rollout_<epoch>.png or losses.png.
+    - "live": One window with the latest rollout, which is redrawn as new ones arrive. Closing the service shows the losses
+              and waits until their window is closed, like plt.show().
+
+    Attributes:
+    - MODE: "png" or "live".
+    - DIRECTORY: Where the "png" mode saves its figures.
+    - dropped: The number of rollouts which were dropped because the queue was full.
+    """
+
+    MODE: str
+    DIRECTORY: str
+    dropped: int
+
+    MODES = ("png", "live")
+
+    def __init__(self, mode: str = "png", directory: str = "plots", max_pending: int = 4) -> None:
+        """
+        Initializing the service and starting its process.
+
+        Preconditions:
+        - mode in PlotService.MODES
+        """
+
+        self.MODE = mode
+        self.DIRECTORY = directory
+        self.dropped = 0
+
+        # fork so that the training script is not run again in the new process, it has not imported matplotlib yet either way
+        context = mp.get_context("fork")
+        self._pending = context.Queue(maxsize=max_pending)
+        self._process = context.Process(target=_plot_service, args=(mode, directory, self._pending), daemon=True)
+        self._process.start()
+
+    def plot_rollout(self, epoch: int, distances: np.ndarray, forces: np.ndarray, energies: np.ndarray) -> None:
+        """Sends one rollout to be plotted without waiting, or drops it if too many are already waiting."""
+
+        try:
+            self._pending.put_nowait(("rollout", epoch, (distances, forces, energies)))
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self, losses: np.ndarray | None = None) -> None:
+        """Plots the losses, if any are given, after everything sent before them and waits for the process to finish."""
+
+        if losses is not None:
+            self._pending.put(("losses", None, (np.asarray(losses),)))
+
+        self._pending.put(None)
+        self._process.join()
+
+
+def _plot_service(mode: str, directory: str, pending: mp.Queue) -> None:
+    """The loop run by the process of a PlotService."""
+
+    import matplotlib
+
+    if mode == "png":
+        matplotlib.use("Agg")
+        os.makedirs(directory, exist_ok=True)
+
+    import matplotlib.pyplot as plt
+
+    if mode == "live":
+        plt.ion()
+
+    while True:
+        try:
+            message = pending.get(timeout=0.1)
+        except queue.Empty:
+            if mode == "live":
+                # keeps the window responsive between plots
+                plt.pause(0.1)
+            continue
+
+        if message is None:
+            break
+
+        kind, epoch, arrays = message
+
+        if kind == "rollout":
+            if mode == "live":
+                plt.close("all")
+            fig = draw_rollout(plt, epoch, *arrays)
+            name = f"rollout_{epoch:06d}.png"
+        else:
+            fig = draw_losses(plt, *arrays)
+            name = "losses.png"
+
+        if mode == "png":
+            fig.savefig(os.path.join(directory, name))
+            plt.close(fig)
+        else:
+            plt.pause(0.001)
+
+    if mode == "live":
+        plt.ioff()
+        plt.show()
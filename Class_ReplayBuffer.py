@@ -0,0 +1,191 @@
+import Class_NeuralNetwork as NN
+import torch
+
+device = "cuda" if torch.cuda.is_available() else "cpu"
+
+
+class ReplayBuffer:
+    """
+    A fixed capacity store of transitions which lives across epochs. Once it is full the oldest transitions are overwritten first.
+    Every field is kept in one preallocated tensor so that a minibatch is a single gather.
+
+    Attributes:
+    - start_states: The states which the system started in, shape (CAPACITY, STATE_SIZE).
+    - actions: The actions taken from the start states, shape (CAPACITY,).
+    - rewards: The rewards for achieving the result states, shape (CAPACITY,).
+    - result_states: The states resulting from the actions, shape (CAPACITY, STATE_SIZE).
+    - dones: True if the result state ended the episode, shape (CAPACITY,).
+    - discounts: The extra discount of bootstrapping from the result state, on top of gamma (1 for one step transitions), shape (CAPACITY,).
+    - target_Q_values: Cached T_network outputs at the result states, shape (CAPACITY, number of actions). None until first needed.
+    - target_versions: The target network version each row of target_Q_values came from, -1 if it has not been computed, shape (CAPACITY,).
+    - size: The number of transitions currently stored.
+    - position: The index which the next transition will be written to.
+    - CAPACITY: The maximum number of transitions stored.
+    - STATE_SIZE: The size of a single state.
+    """
+
+    start_states: torch.tensor
+    actions: torch.tensor
+    rewards: torch.tensor
+    result_states: torch.tensor
+    dones: torch.tensor
+    discounts: torch.tensor
+    target_Q_values: torch.Tensor | None
+    target_versions: torch.tensor
+    size: int
+    position: int
+
+    CAPACITY: int
+    STATE_SIZE: int
+
+    def __init__(
+        self,
+        capacity: int,
+        state_size: int = 17,
+        dtype: torch.dtype = torch.float64,
+        device: str = device,
+    ) -> None:
+        """Initializing the replay buffer. All the storage is allocated here."""
+
+        self.CAPACITY = capacity
+        self.STATE_SIZE = state_size
+        self.device = device
+        self.size = 0
+        self.position = 0
+
+        self._allocate_states(dtype)
+        self.actions = torch.zeros(capacity, dtype=torch.int64, device=device)
+        self.rewards = torch.zeros(capacity, dtype=dtype, device=device)
+        self.dones = torch.zeros(capacity, dtype=torch.bool, device=device)
+        self.discounts = torch.ones(capacity, dtype=dtype, device=device)
+        self.target_Q_values = None
+        self.target_versions = torch.full((capacity,), -1, dtype=torch.int64, device=device)
+        self._copies_done = torch.cuda.Event() if torch.device(device).type == "cuda" else None
+
+    def __len__(self) -> int:
+        return self.size
+
+    def nbytes(self) -> int:
+        """Returns the number of bytes held by the storage tensors of the buffer, including the target cache once it exists."""
+        return sum([value.element_size() * value.numel() for value in vars(self).values() if isinstance(value, torch.Tensor)])
+
+    def _allocate_states(self, dtype: torch.dtype) -> None:
+        """Allocates the storage of the start and result states. Subclasses which store states differently override the three state methods."""
+
+        self.start_states = torch.zeros((self.CAPACITY, self.STATE_SIZE), dtype=dtype, device=self.device)
+        self.result_states = torch.zeros((self.CAPACITY, self.STATE_SIZE), dtype=dtype, device=self.device)
+
+    def _write_states(self, slots: torch.tensor, start_states: torch.tensor, result_states: torch.tensor) -> None:
+        """Stores the start and result states of the transitions going into slots."""
+
+        self.start_states[slots] = start_states.to(self.device, self.start_states.dtype, non_blocking=True)
+        self.result_states[slots] = result_states.to(self.device, self.result_states.dtype, non_blocking=True)
+
+    def _read_states(self, indices: torch.tensor, result: bool = False) -> torch.tensor:
+        """Returns the start states (or the result states if result is True) of the transitions at indices."""
+        return self.result_states[indices] if result else self.start_states[indices]
+
+    def add_batch(
+        self,
+        start_states: torch.tensor,
+        actions: torch.tensor,
+        rewards: torch.tensor,
+        result_states: torch.tensor,
+        dones: torch.tensor,
+        discounts: torch.Tensor | None = None,
+    ) -> None:
+        """
+        Adds a batch of transitions, overwriting the oldest ones if the buffer is full.
+        If more than CAPACITY transitions are given only the last CAPACITY of them are kept.
+        Without discounts the transitions are one step transitions with a discount of 1.
+
+        Copies to a GPU are asynchronous, so the given tensors must not be written to until synchronize is called,
+        e.g. the encoder's rows before the next episode. From pinned memory they overlap with the work queued after them.
+        On the CPU the tensors are written straight into the storage, without intermediate copies.
+        """
+
+        count = actions.size(dim=0)
+
+        if discounts is None:
+            discounts = torch.ones(count, dtype=self.discounts.dtype)
+
+        if count > self.CAPACITY:
+            start_states, actions, rewards, result_states, dones, discounts = (
+                t[-self.CAPACITY :] for t in (start_states, actions, rewards, result_states, dones, discounts)
+            )
+            count = self.CAPACITY
+
+        slots = torch.arange(self.position, self.position + count, device=self.device) % self.CAPACITY
+
+        self._write_states(slots, start_states, result_states)
+        self.actions[slots] = actions.to(self.device, self.actions.dtype, non_blocking=True)
+        self.rewards[slots] = rewards.to(self.device, self.rewards.dtype, non_blocking=True)
+        self.dones[slots] = dones.to(self.device, torch.bool, non_blocking=True)
+        self.discounts[slots] = discounts.to(self.device, self.discounts.dtype, non_blocking=True)
+        self.target_versions[slots] = -1
+
+        if self._copies_done is not None:
+            self._copies_done.record()
+
+        self.position = (self.position + count) % self.CAPACITY
+        self.size = min(self.size + count, self.CAPACITY)
+
+    def synchronize(self) -> None:
+        """Waits for the copies of the last add_batch to finish, after which the tensors given to it can be written to again."""
+
+        if self._copies_done is not None:
+            self._copies_done.synchronize()
+
+    def sample(self, batch_size: int) -> list[torch.tensor]:
+        """
+        Returns a uniformly random batch (with replacement) in the same format as ExperienceReplay.random_batch_plus_last,
+        followed by the dones and discounts: [start_states, actions, rewards, result_states, dones, discounts].
+
+        Preconditions:
+        - len(self) > 0
+        """
+
+        return self.gather(self.sample_indices(batch_size))
+
+    def sample_indices(self, batch_size: int) -> torch.tensor:
+        """Returns batch_size uniformly random indices (with replacement) of stored transitions."""
+        return torch.randint(0, self.size, (batch_size,), device=self.device)
+
+    def gather(self, indices: torch.tensor) -> list[torch.tensor]:
+        """Returns the transitions at indices as [start_states, actions, rewards, result_states, dones, discounts]."""
+
+        return [
+            self._read_states(indices),
+            self.actions[indices],
+            self.rewards[indices],
+            self._read_states(indices, result=True),
+            self.dones[indices],
+            self.discounts[indices],
+        ]
+
+    def cached_target_Q_values(self, indices: torch.tensor, T_network: NN.NeuralNetwork, version: int) -> torch.tensor:
+        """
+        Returns T_network(result_states[indices]) from the cache. The rows which were cached from an older version of the target
+        network (or never) are computed now, so version must change whenever the weights of T_network do.
+        """
+
+        if self.target_Q_values is None:
+            with torch.no_grad():
+                width = T_network(self._read_states(indices[:1], result=True)).size(dim=1)
+            self.target_Q_values = torch.zeros((self.CAPACITY, width), dtype=self.rewards.dtype, device=self.device)
+
+        stale = indices[self.target_versions[indices] != version]
+
+        if stale.numel() > 0:
+            with torch.no_grad():
+                self.target_Q_values[stale] = T_network(self._read_states(stale, result=True)).to(self.target_Q_values.dtype)
+            self.target_versions[stale] = version
+
+        return self.target_Q_values[indices]
+
+    def refresh_target_Q_values(self, T_network: NN.NeuralNetwork, version: int, chunk_size: int = 4096) -> None:
+        """Recomputes the cached target values of every stored transition with T_network in chunks of chunk_size, e.g. right after a target sync."""
+
+        for start in range(0, self.size, chunk_size):
+            indices = torch.arange(start, min(start + chunk_size, self.size), device=self.device)
+            self.cached_target_Q_values(indices, T_network, version)
@@ -2,6 +2,8 @@ import Class_RiderState as RS
 import Class_Rider as R
 import Classes_Courses as C
 import Helper_Functions as HF
+import numpy as np
+import math
 import torch
 import copy
 
@@ -19,6 +21,11 @@ class RiderCourseSystem:
     - time: Current time of the system in seconds. Initialized to zero.
     - DT: The time step for each update of the system in seconds. Default is 0.1s
     - AIR_DENSITY: Density of air in kilograms/(meters cubed). Default is 1.2 kg/m^3
+    - LOOKAHEAD_OFFSETS: The distances ahead of the rider which the slope is given at in the model format of the state.
+    - INTEGRATOR: The integrator used by step_forward, one of INTEGRATORS. Default is "euler".
+    - TOLERANCE: The relative error tolerance of the adaptive "rk45" integrator. Default is 1e-6.
+    - DTYPE: The dtype of the model format of the state. The physics itself is always integrated in float64. Default is torch.float64.
+    - derivative_evaluations: The number of times the equations of motion have been evaluated by the integrators other than "euler".
     """
 
     rider: R.Rider
@@ -27,6 +34,13 @@ class RiderCourseSystem:
 
     DT: float
     AIR_DENSITY: float
+    INTEGRATOR: str
+    TOLERANCE: float
+    DTYPE: torch.dtype
+    derivative_evaluations: int
+
+    LOOKAHEAD_OFFSETS = np.arange(0.0, 101.0, 10.0)
+    INTEGRATORS = ("euler", "semi_implicit_euler", "rk4", "rk45")
 
     def __init__(
         self,
@@ -34,13 +48,30 @@ class RiderCourseSystem:
         course: C.Course,
         dt: float = 0.1,
         air_density: float = 1.2,
+        integrator: str = "euler",
+        tolerance: float = 1e-6,
+        dtype: torch.dtype = torch.float64,
     ) -> None:
-        """Initializing the system."""
+        """
+        Initializing the system.
+
+        Preconditions:
+        - integrator in RiderCourseSystem.INTEGRATORS
+        """
         self.course = course
         self.rider = rider
         self.time = 0.0
         self.DT = dt
         self.AIR_DENSITY = air_density
+        self.INTEGRATOR = integrator
+        self.TOLERANCE = tolerance
+        self.DTYPE = dtype
+        self.derivative_evaluations = 0
+        self._rk45_step = dt
+
+    def step_forward(self) -> None:
+        """Steps forward the system by DT with the integrator chosen by INTEGRATOR."""
+        getattr(self, self.INTEGRATOR + "_step_forward")()
 
     def euler_step_forward(self) -> None:
         """Steps forward the system."""
@@ -67,6 +98,131 @@ class RiderCourseSystem:
             print("Over flow error in euler step forward. Last state:")
             print(rs)
 
+    def _derivatives(self, distance: float, velocity: float, force: float) -> tuple[float, float, float]:
+        """
+        Returns the time derivatives of (distance, velocity, an_energy) with the force held constant.
+        These are the equations of motion which euler_step_forward discretizes, energy is only spent going forwards with a positive force.
+        """
+
+        self.derivative_evaluations += 1
+
+        r = self.rider
+        weight = r.BIKE_WEIGHT + r.WEIGHT
+
+        air_term = 1.0 / 2.0 * r.DRAG_COEF * r.CROSS_AREA * self.AIR_DENSITY * velocity**2
+        gravity_term = weight * 9.8 * self.course.slope(distance)
+        acceleration = 1.0 / weight * (force - air_term - gravity_term)
+
+        if velocity > 0 and force > 0:
+            return velocity, acceleration, -force * velocity
+
+        return velocity, acceleration, 0.0
+
+    def semi_implicit_euler_step_forward(self) -> None:
+        """Steps forward the system by updating the velocity first and then moving the rider with the new velocity."""
+
+        self.time += self.DT
+
+        r = self.rider
+        rs = self.rider.state
+        r.last_state = copy.copy(rs)
+
+        try:
+            _, acceleration, _ = self._derivatives(rs.distance, rs.velocity, rs.force)
+            rs.velocity += acceleration * self.DT
+            rs.distance += rs.velocity * self.DT
+
+            if rs.distance > r.last_state.distance and rs.force > 0:
+                rs.an_energy -= rs.force * (rs.distance - r.last_state.distance)
+
+        except OverflowError:
+            print("Over flow error in semi implicit euler step forward. Last state:")
+            print(rs)
+
+    def rk4_step_forward(self) -> None:
+        """Steps forward the system with one classical 4th order Runge-Kutta step."""
+
+        self.time += self.DT
+
+        r = self.rider
+        rs = self.rider.state
+        r.last_state = copy.copy(rs)
+
+        try:
+            y = (rs.distance, rs.velocity, rs.an_energy)
+            rs.distance, rs.velocity, rs.an_energy = self._runge_kutta(y, rs.force, self.DT, _RK4_STAGES, _RK4_WEIGHTS)[0]
+
+        except OverflowError:
+            print("Over flow error in rk4 step forward. Last state:")
+            print(rs)
+
+    def rk45_step_forward(self) -> None:
+        """
+        Steps forward the system by DT with as many adaptive Dormand-Prince 5(4) substeps as are needed
+        to keep the estimated error of each substep under TOLERANCE (relative to the size of the state, plus the same absolute amount).
+        The substep size carries over between calls.
+        """
+
+        self.time += self.DT
+
+        r = self.rider
+        rs = self.rider.state
+        r.last_state = copy.copy(rs)
+
+        try:
+            y = (rs.distance, rs.velocity, rs.an_energy)
+            remaining = self.DT
+            h = min(self._rk45_step, remaining)
+
+            while remaining > 1e-12 * self.DT:
+                h = min(h, remaining)
+                y_new, error = self._runge_kutta(y, rs.force, h, _DOPRI_STAGES, _DOPRI_WEIGHTS, _DOPRI_ERROR_WEIGHTS)
+
+                error_ratio = max(abs(e) / (self.TOLERANCE * (1.0 + abs(v))) for e, v in zip(error, y_new))
+
+                # a non finite error can not be improved on by shrinking the substep
+                if error_ratio <= 1.0 or not math.isfinite(error_ratio):
+                    y = y_new
+                    remaining -= h
+                    self._rk45_step = h
+
+                h *= min(5.0, max(0.2, 0.9 * (error_ratio + 1e-12) ** -0.2))
+
+            self._rk45_step = max(self._rk45_step, h)
+            rs.distance, rs.velocity, rs.an_energy = y
+
+        except OverflowError:
+            print("Over flow error in rk45 step forward. Last state:")
+            print(rs)
+
+    def _runge_kutta(
+        self,
+        y: tuple[float, float, float],
+        force: float,
+        h: float,
+        stages: tuple[tuple[float, ...], ...],
+        weights: tuple[float, ...],
+        error_weights: tuple[float, ...] | None = None,
+    ) -> tuple[tuple[float, float, float], tuple[float, float, float] | None]:
+        """
+        Returns (y after one explicit Runge-Kutta step of size h, estimated error or None).
+        stages are the rows of the Butcher tableau below the first, weights the final combination
+        and error_weights the difference between the two embedded solutions if there are two.
+        """
+
+        ks = [self._derivatives(*y[:2], force)]
+
+        for row in stages:
+            y_stage = [y[i] + h * sum(a * k[i] for a, k in zip(row, ks)) for i in range(3)]
+            ks.append(self._derivatives(y_stage[0], y_stage[1], force))
+
+        y_new = tuple(y[i] + h * sum(b * k[i] for b, k in zip(weights, ks)) for i in range(3))
+
+        if error_weights is None:
+            return y_new, None
+
+        return y_new, tuple(h * sum(e * k[i] for e, k in zip(error_weights, ks)) for i in range(3))
+
     def model_format_curr_state(self) -> torch.tensor:
         """
         Returns a tensor representation of all the information needed by the machine learing model aobut the current state of the full system.
@@ -83,27 +239,17 @@ class RiderCourseSystem:
         last_force = (r.last_state.force - r.AVG_FORCE) / r.MAX_FORCE
         an_energy = (rs.an_energy - 0.5 * r.ENERGY_BUDGET) / (0.5 * r.ENERGY_BUDGET)
 
-        state = [
-            distance,
-            velocity,
-            last_force,
-            an_energy,
-            c.slope(rs.distance),
-            c.slope(rs.distance + 10.0),
-            c.slope(rs.distance + 20.0),
-            c.slope(rs.distance + 30.0),
-            c.slope(rs.distance + 40.0),
-            c.slope(rs.distance + 50.0),
-            c.slope(rs.distance + 60.0),
-            c.slope(rs.distance + 70.0),
-            c.slope(rs.distance + 80.0),
-            c.slope(rs.distance + 90.0),
-            c.slope(rs.distance + 100.0),
-            r.MAX_JERK,
-            self.DT,
-        ]
-
-        return torch.tensor(data=state, dtype=float, device=device, requires_grad=False)
+        state = np.empty(17)
+        state[0] = distance
+        state[1] = velocity
+        state[2] = last_force
+        state[3] = an_energy
+        # the slope now and every 10m up to 100m ahead, in one lookup
+        state[4:15] = c.slope_many(rs.distance + self.LOOKAHEAD_OFFSETS)
+        state[15] = r.MAX_JERK
+        state[16] = self.DT
+
+        return torch.tensor(data=state, dtype=self.DTYPE, device=device, requires_grad=False)
 
     def reset(self) -> None:
         """Resets the system to its initial state."""
@@ -112,3 +258,25 @@ class RiderCourseSystem:
         self.rider.state = copy.copy(self.rider.INITIAL_STATE)
         self.rider.last_state = RS.RiderState()
         self.rider.last_state.force = self.rider.INITIAL_STATE.force
+
+
+# Butcher tableaus of the Runge-Kutta integrators, without the first (all zero) row.
+_RK4_STAGES = ((0.5,), (0.0, 0.5), (0.0, 0.0, 1.0))
+_RK4_WEIGHTS = (1.0 / 6.0, 1.0 / 3.0, 1.0 / 3.0, 1.0 / 6.0)
+
+_DOPRI_STAGES = (
+    (1.0 / 5.0,),
+    (3.0 / 40.0, 9.0 / 40.0),
+    (44.0 / 45.0, -56.0 / 15.0, 32.0 / 9.0),
+    (19372.0 / 6561.0, -25360.0 / 2187.0, 64448.0 / 6561.0, -212.0 / 729.0),
+    (9017.0 / 3168.0, -355.0 / 33.0, 46732.0 / 5247.0, 49.0 / 176.0, -5103.0 / 18656.0),
+    (35.0 / 384.0, 0.0, 500.0 / 1113.0, 125.0 / 192.0, -2187.0 / 6784.0, 11.0 / 84.0),
+)
+_DOPRI_WEIGHTS = (35.0 / 384.0, 0.0, 500.0 / 1113.0, 125.0 / 192.0, -2187.0 / 6784.0, 11.0 / 84.0, 0.0)
+_DOPRI_ERROR_WEIGHTS = tuple(
+    b5 - b4
+    for b5, b4 in zip(
+        _DOPRI_WEIGHTS,
+        (5179.0 / 57600.0, 0.0, 7571.0 / 16695.0, 393.0 / 640.0, -92097.0 / 339200.0, 187.0 / 2100.0, 1.0 / 40.0),
+    )
+)
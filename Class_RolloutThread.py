@@ -0,0 +1,193 @@
+import Class_ExperienceReplay as ER
+import Class_NeuralNetwork as NN
+import Class_ReplayBuffer as RB
+import torch
+import copy
+import queue
+import threading
+import types
+
+
+class _Outbox:
+    """
+    Stands in for the replay buffer of the actor's ExperienceReplay and hands each flushed batch over to the learner through a queue,
+    along with the physics steps taken since the last batch.
+    """
+
+    def __init__(self, pending: queue.Queue, stop: threading.Event, experience_replay: ER.ExperienceReplay) -> None:
+        self._pending = pending
+        self._stop = stop
+        self._experience_replay = experience_replay
+        self._sent_env_steps = 0
+
+    def add_batch(self, *tensors: torch.tensor) -> None:
+        # the states are views into the encoder's rows, which the next episode overwrites
+        batch = [tensor.clone() for tensor in tensors]
+        env_steps = self._experience_replay.env_steps - self._sent_env_steps
+        self._sent_env_steps = self._experience_replay.env_steps
+
+        while not self._stop.is_set():
+            try:
+                self._pending.put((batch, env_steps), timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def synchronize(self) -> None:
+        pass
+
+
+class _Stopped(Exception):
+    """Raised inside the actor's build to stop it in the middle of an episode."""
+
+
+class RolloutThread:
+    """
+    Builds episodes in a background thread of this process while the learner trains in the calling thread (an actor and a learner).
+    Torch and NumPy release the GIL in their kernels, so the rollout's physics overlaps with the learner's forward and backward passes
+    without the memory and start up costs of RolloutWorkerPool. It has the same interface, so the two are interchangeable.
+
+    The actor acts with its own snapshot of the Q_network, which is refreshed from the weights given to publish, and with its own copy
+    of the reward bundle, whose cutoff time is set with set_cutoff_time like the epsilon is with set_epsilon.
+    The actor checks for new weights after every data point and refreshes once its snapshot is MAX_STALENESS publishes behind,
+    so it never acts with a policy older than that. Batches are flushed every FLUSH_EVERY data points into a queue of at most
+    MAX_PENDING batches. When the learner falls behind the queue fills up and the actor waits (back-pressure), and collect
+    with block=True makes the learner wait for the actor in turn.
+
+    Attributes:
+    - experience_replay: The actor's ExperienceReplay, which acts with its own copy of the Q_network.
+    - version: The number of times weights have been published.
+    - last_env_steps: The number of physics steps the actor took for the transitions added by the last collect.
+    - MAX_STALENESS: The most publishes the actor's snapshot can fall behind before it is refreshed.
+    - MAX_PENDING: The most batches waiting to be collected before the actor waits for the learner.
+    - FLUSH_EVERY: The number of data points between batches in the middle of an episode.
+    """
+
+    experience_replay: ER.ExperienceReplay
+    version: int
+    last_env_steps: int
+    MAX_STALENESS: int
+    MAX_PENDING: int
+    FLUSH_EVERY: int
+
+    def __init__(
+        self,
+        make_experience_replay: types.FunctionType,
+        Q_network: NN.NeuralNetwork,
+        max_staleness: int = 1,
+        max_pending: int = 8,
+        flush_every: int = 64,
+        epsilon: float = 1.0,
+        cutoff_time: float | None = None,
+    ) -> None:
+        """
+        Initializing the actor. The thread is not started until start is called.
+        make_experience_replay(network) is called once and must return an ExperienceReplay which acts with network
+        and has its own system and reward bundle, like for RolloutWorkerPool.
+        If cutoff_time is None, the actor keeps the cutoff times of its reward bundle until set_cutoff_time is called.
+
+        Preconditions:
+        - max_staleness >= 1
+        """
+
+        self.MAX_STALENESS = max_staleness
+        self.MAX_PENDING = max_pending
+        self.FLUSH_EVERY = flush_every
+        self.version = 0
+        self.last_env_steps = 0
+
+        self._shared_network = copy.deepcopy(Q_network)
+        self._local_network = copy.deepcopy(Q_network)
+        self._local_version = 0
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._pending = queue.Queue(maxsize=max_pending)
+        self._thread = None
+
+        self.experience_replay = make_experience_replay(self._local_network)
+        self.experience_replay.replay_buffer = _Outbox(self._pending, self._stop, self.experience_replay)
+        self._epsilon = epsilon
+        self._cutoff_time = cutoff_time
+
+    def set_epsilon(self, epsilon: float) -> None:
+        """Sets the epsilon which the actor uses for its next episodes."""
+        self._epsilon = epsilon
+
+    def set_cutoff_time(self, cutoff_time: float) -> None:
+        """Sets the CUTOFF_TIME of the TimeViolations which the actor uses for its next episodes, see RewardBundle.set_cutoff_time."""
+        self._cutoff_time = cutoff_time
+
+    def start(self) -> None:
+        """Starts the actor thread."""
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def publish(self, Q_network: NN.NeuralNetwork) -> None:
+        """Copies the weights of Q_network into the shared snapshot, where the actor will pick them up."""
+
+        with self._lock, torch.no_grad():
+            torch._foreach_copy_(list(self._shared_network.parameters()), list(Q_network.parameters()))
+            self.version += 1
+
+    def collect(self, replay_buffer: RB.ReplayBuffer, block: bool = False) -> int:
+        """
+        Adds every batch the actor has flushed so far to replay_buffer and returns the number of transitions added.
+        The number of physics steps behind them is kept in last_env_steps. If block is True, waits until at least one batch has arrived.
+        """
+
+        added = 0
+        self.last_env_steps = 0
+
+        while True:
+            try:
+                batch, env_steps = self._pending.get(block=block and added == 0)
+            except queue.Empty:
+                return added
+
+            replay_buffer.add_batch(*batch)
+            added += batch[1].size(dim=0)
+            self.last_env_steps += env_steps
+
+    def close(self) -> None:
+        """Stops the actor and waits for it to exit. The episode it was building is dropped."""
+
+        self._stop.set()
+
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _refresh(self) -> None:
+        """Copies the shared snapshot into the actor's network."""
+
+        with self._lock, torch.no_grad():
+            torch._foreach_copy_(list(self._local_network.parameters()), list(self._shared_network.parameters()))
+            self._local_version = self.version
+
+    def _on_step(self, experience_replay: ER.ExperienceReplay) -> None:
+        """Called after every data point the actor adds."""
+
+        if self._stop.is_set():
+            # ends the episode early, build only stops when the episode does
+            raise _Stopped
+
+        if self.version - self._local_version >= self.MAX_STALENESS:
+            self._refresh()
+
+        if len(experience_replay.experience_library) - experience_replay.flushed >= self.FLUSH_EVERY:
+            experience_replay.flush()
+
+    def _run(self) -> None:
+        """The loop run by the actor thread."""
+
+        while not self._stop.is_set():
+            self.experience_replay.EPSILON = self._epsilon
+            if self._cutoff_time is not None:
+                self.experience_replay.reward_bundle.set_cutoff_time(self._cutoff_time)
+
+            try:
+                self.experience_replay.build(on_step=self._on_step)
+            except _Stopped:
+                return
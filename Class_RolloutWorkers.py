@@ -0,0 +1,261 @@
+import Class_ExperienceReplay as ER
+import Class_NeuralNetwork as NN
+import Class_ReplayBuffer as RB
+import torch
+import torch.multiprocessing as mp
+import copy
+import math
+import queue
+import random
+import types
+
+
+class RolloutWorkerPool:
+    """
+    A pool of worker processes which each own an ExperienceReplay (with its own system and reward bundle) and keep building episodes with it,
+    while the learner process trains. Finished episodes are written, in chunks of at most CHUNK_SIZE transitions, into slots of
+    preallocated shared memory. Only the slot numbers go through a queue, and the learner copies the slots into its replay buffer with collect.
+    Each worker owns SLOTS_PER_WORKER slots, once all of them are waiting to be collected the worker waits for the learner.
+
+    The learner publishes new Q_network weights with publish, and sets the epsilon and cutoff time of the workers' next episodes with
+    set_epsilon and set_cutoff_time, since each worker acts with its own copy of the reward bundle. Each worker checks for new weights every SYNC_EVERY episodes
+    and copies them into its own network, so workers act with a policy that is at most a few publishes old.
+    Uses the "fork" start method and acts on the CPU, so it is meant for CPU-only Linux boxes. Every worker runs torch with a single thread.
+
+    Attributes:
+    - shared_network: A copy of the Q_network in shared memory which the workers copy their weights from.
+    - last_env_steps: The number of physics steps the workers took for the transitions added by the last collect.
+    - version: The number of times weights have been published.
+    - NUM_WORKERS: The number of worker processes.
+    - SYNC_EVERY: The number of episodes each worker builds between checks for new weights.
+    - CHUNK_SIZE: The most transitions held by one slot.
+    - SLOTS_PER_WORKER: The number of slots owned by each worker.
+    """
+
+    shared_network: NN.NeuralNetwork
+    last_env_steps: int
+    NUM_WORKERS: int
+    SYNC_EVERY: int
+    CHUNK_SIZE: int
+    SLOTS_PER_WORKER: int
+
+    def __init__(
+        self,
+        make_experience_replay: types.FunctionType,
+        Q_network: NN.NeuralNetwork,
+        num_workers: int,
+        sync_every: int = 1,
+        chunk_size: int = 4096,
+        slots_per_worker: int = 8,
+        epsilon: float = 1.0,
+        cutoff_time: float | None = None,
+        state_size: int = 17,
+        dtype: torch.dtype = torch.float64,
+    ) -> None:
+        """
+        Initializing the pool and allocating the shared slots. No processes are started until start is called.
+        make_experience_replay(network) is called once in each worker and must return an ExperienceReplay which acts with network
+        and has its own system and reward bundle, e.g. built from copy.deepcopy((system, reward_bundle)).
+        If cutoff_time is None, the workers keep the cutoff times of their reward bundles until set_cutoff_time is called.
+        """
+
+        self._context = mp.get_context("fork")
+
+        self.NUM_WORKERS = num_workers
+        self.SYNC_EVERY = sync_every
+        self.CHUNK_SIZE = chunk_size
+        self.SLOTS_PER_WORKER = slots_per_worker
+        self.shared_network = copy.deepcopy(Q_network).cpu().share_memory()
+
+        # row i of a slot's states is the start state of transition i and, for one step transitions, the result state of transition i - 1.
+        # n-step transitions bootstrap from states further ahead, which go in the last tensor instead
+        slots = (num_workers, slots_per_worker)
+        self._slots = [
+            torch.zeros((*slots, chunk_size + 1, state_size), dtype=dtype).share_memory_(),
+            torch.zeros((*slots, chunk_size), dtype=torch.int64).share_memory_(),
+            torch.zeros((*slots, chunk_size), dtype=dtype).share_memory_(),
+            torch.zeros((*slots, chunk_size), dtype=torch.bool).share_memory_(),
+            torch.zeros((*slots, chunk_size), dtype=dtype).share_memory_(),
+            torch.zeros((*slots, chunk_size, state_size), dtype=dtype).share_memory_(),
+        ]
+
+        self._make_experience_replay = make_experience_replay
+        self._version = self._context.Value("q", 0)
+        self._epsilon = self._context.Value("d", epsilon)
+        # NaN means the cutoff time has not been set
+        self._cutoff_time = self._context.Value("d", math.nan if cutoff_time is None else cutoff_time)
+        self._lock = self._context.Lock()
+        self._stop = self._context.Event()
+        self._filled = self._context.Queue()
+        self._free = [self._context.Queue() for _ in range(num_workers)]
+        self._workers = []
+        self.last_env_steps = 0
+
+        for free in self._free:
+            for slot in range(slots_per_worker):
+                free.put(slot)
+
+    @property
+    def version(self) -> int:
+        return self._version.value
+
+    def set_epsilon(self, epsilon: float) -> None:
+        """Sets the epsilon which the workers use for their next episodes."""
+        self._epsilon.value = epsilon
+
+    def set_cutoff_time(self, cutoff_time: float) -> None:
+        """Sets the CUTOFF_TIME of the TimeViolations which the workers use for their next episodes, see RewardBundle.set_cutoff_time."""
+        self._cutoff_time.value = cutoff_time
+
+    def start(self) -> None:
+        """Starts the worker processes."""
+
+        for worker_id in range(self.NUM_WORKERS):
+            worker = self._context.Process(
+                target=_rollout_worker,
+                args=(
+                    worker_id,
+                    self._make_experience_replay,
+                    self.shared_network,
+                    self._version,
+                    self._epsilon,
+                    self._cutoff_time,
+                    self._lock,
+                    self._stop,
+                    self._slots,
+                    self._filled,
+                    self._free[worker_id],
+                    self.SYNC_EVERY,
+                    random.randrange(2**31) + worker_id,
+                ),
+                daemon=True,
+            )
+            worker.start()
+            self._workers.append(worker)
+
+    def publish(self, Q_network: NN.NeuralNetwork) -> None:
+        """Copies the weights of Q_network into shared_network, where the workers will pick them up."""
+
+        with self._lock, torch.no_grad():
+            torch._foreach_copy_(list(self.shared_network.parameters()), [parameter.cpu() for parameter in Q_network.parameters()])
+            self._version.value += 1
+
+    def collect(self, replay_buffer: RB.ReplayBuffer, block: bool = False) -> int:
+        """
+        Adds every chunk the workers have finished so far to replay_buffer and returns the number of transitions added.
+        The number of physics steps behind them is kept in last_env_steps. If block is True, waits until at least one chunk has arrived.
+        """
+
+        states, actions, rewards, dones, discounts, bootstraps = self._slots
+        added = 0
+        self.last_env_steps = 0
+
+        while True:
+            try:
+                worker_id, slot, count, one_step, env_steps = self._filled.get(block=block and added == 0)
+            except queue.Empty:
+                return added
+
+            if one_step:
+                result_states = states[worker_id, slot, 1 : count + 1]
+            else:
+                result_states = bootstraps[worker_id, slot, :count]
+
+            replay_buffer.add_batch(
+                states[worker_id, slot, :count],
+                actions[worker_id, slot, :count],
+                rewards[worker_id, slot, :count],
+                result_states,
+                dones[worker_id, slot, :count],
+                discounts[worker_id, slot, :count],
+            )
+            self._free[worker_id].put(slot)
+            added += count
+            self.last_env_steps += env_steps
+
+    def close(self) -> None:
+        """Stops the workers and waits for them to exit."""
+
+        self._stop.set()
+
+        for worker in self._workers:
+            worker.join()
+
+        self._workers = []
+
+
+def _rollout_worker(
+    worker_id: int,
+    make_experience_replay: types.FunctionType,
+    shared_network: NN.NeuralNetwork,
+    version: mp.Value,
+    epsilon: mp.Value,
+    cutoff_time: mp.Value,
+    lock: mp.Lock,
+    stop: mp.Event,
+    slots: list[torch.tensor],
+    filled: mp.Queue,
+    free: mp.Queue,
+    sync_every: int,
+    seed: int,
+) -> None:
+    """The loop run by each worker process of a RolloutWorkerPool."""
+
+    torch.set_num_threads(1)
+    random.seed(seed)
+    torch.manual_seed(seed)
+
+    states, actions, rewards, dones, discounts, bootstraps = slots
+    chunk_size = actions.size(dim=2)
+
+    local_network = copy.deepcopy(shared_network)
+    experience_replay = make_experience_replay(local_network)
+    local_version = -1
+    built = 0
+    sent_env_steps = 0
+
+    while not stop.is_set():
+        if built % sync_every == 0 and version.value != local_version:
+            with lock, torch.no_grad():
+                torch._foreach_copy_(list(local_network.parameters()), list(shared_network.parameters()))
+                local_version = version.value
+
+        experience_replay.EPSILON = epsilon.value
+        if not math.isnan(cutoff_time.value):
+            experience_replay.reward_bundle.set_cutoff_time(cutoff_time.value)
+        experience_replay.build()
+        built += 1
+
+        episode_starts, episode_actions, episode_rewards, episode_results, episode_dones, episode_discounts = (
+            experience_replay.episode_tensors()
+        )
+        one_step = experience_replay.N_STEP == 1
+        episode_length = episode_actions.size(dim=0)
+        # the physics steps of the episode are sent with its first chunk
+        env_steps = experience_replay.env_steps - sent_env_steps
+        sent_env_steps = experience_replay.env_steps
+
+        for start in range(0, episode_length, chunk_size):
+            end = min(start + chunk_size, episode_length)
+            count = end - start
+
+            slot = None
+            while slot is None:
+                if stop.is_set():
+                    return
+                try:
+                    slot = free.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+
+            states[worker_id, slot, :count] = episode_starts[start:end]
+            if one_step:
+                states[worker_id, slot, count] = episode_results[end - 1]
+            else:
+                bootstraps[worker_id, slot, :count] = episode_results[start:end]
+            actions[worker_id, slot, :count] = episode_actions[start:end]
+            rewards[worker_id, slot, :count] = episode_rewards[start:end]
+            dones[worker_id, slot, :count] = episode_dones[start:end]
+            discounts[worker_id, slot, :count] = episode_discounts[start:end]
+
+            filled.put((worker_id, slot, count, one_step, env_steps if start == 0 else 0))
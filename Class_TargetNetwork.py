@@ -0,0 +1,51 @@
+import Class_NeuralNetwork as NN
+import copy
+import torch
+
+
+class TargetNetwork:
+    """
+    The target network of a Q_network. Its parameters are only ever written in place, with one bulk (foreach) operation over all of them,
+    so syncing allocates nothing and anything holding a reference to network keeps seeing the current weights.
+
+    Attributes:
+    - network: The target copy of the Q_network. Call the TargetNetwork itself to run it.
+    - version: The number of times the weights have been changed by sync or soft_update. Consumers can compare it to detect changes.
+    - TAU: The fraction of the way to move towards the Q_network in each soft_update.
+    """
+
+    network: NN.NeuralNetwork
+    version: int
+    TAU: float
+
+    def __init__(self, Q_network: NN.NeuralNetwork, tau: float = 0.005) -> None:
+        """Initializing the target network as a copy of Q_network."""
+
+        self.network = copy.deepcopy(Q_network)
+        self.version = 0
+        self.TAU = tau
+
+        self._sources = list(Q_network.parameters())
+        self._targets = list(self.network.parameters())
+
+        for parameter in self._targets:
+            parameter.requires_grad_(False)
+
+    def __call__(self, states: torch.tensor) -> torch.tensor:
+        return self.network(states)
+
+    def sync(self) -> None:
+        """Copies the weights of the Q_network into the target network."""
+
+        with torch.no_grad():
+            torch._foreach_copy_(self._targets, self._sources)
+
+        self.version += 1
+
+    def soft_update(self, tau: float | None = None) -> None:
+        """Moves the target weights a fraction tau (TAU by default) of the way towards the Q_network: target = target + tau * (Q - target)."""
+
+        with torch.no_grad():
+            torch._foreach_lerp_(self._targets, self._sources, self.TAU if tau is None else tau)
+
+        self.version += 1
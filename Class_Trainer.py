@@ -0,0 +1,238 @@
+import Class_ExperienceReplay as ER
+import Class_NeuralNetwork as NN
+import Class_ReplayBuffer as RB
+import Class_TargetNetwork as TN
+import Classes_PrioritizedReplay as PR
+import Helper_Functions as HF
+import Class_Metrics as M
+import torch
+
+
+class Trainer:
+    """
+    Drives the Q-learning updates of Q_network from the transitions in replay_buffer.
+    Learning is paced by environment steps instead of episodes: every environment step earns UPDATES_PER_STEP gradient steps,
+    which are taken once the replay buffer holds at least LEARNING_STARTS transitions.
+    When INTERLEAVE is True the updates happen inside the rollout, every UPDATE_EVERY environment steps,
+    instead of all at once after build has finished.
+    If the replay buffer is a PrioritizedReplayBuffer, the loss is weighted by its importance sampling weights
+    and the priorities of the batch are set to their new TD errors after every gradient step.
+
+    Attributes:
+    - experience_replay: Builds the episodes. Its replay_buffer is the one which is trained on.
+    - Q_network: The network being trained.
+    - Q_forward: What computes the Q_network outputs in the loss, e.g. Q_network.compiled(). Q_network itself by default.
+    - T_network: The target network. With SOFT_UPDATES it moves a fraction TAU towards Q_network after every gradient step,
+                 otherwise its weights are copied from Q_network every T_NET_UPDATE_EVERY gradient steps. Always updated in place.
+    - target_version: The version of T_network. The replay buffer's target cache is keyed by it,
+                      so with SOFT_UPDATES the cache is stale after every step and only saves work within a batch.
+    - optimizer: The optimizer of Q_network.
+    - loss_function: E.g. torch.nn.MSELoss() or torch.nn.HuberLoss().
+    - env_steps: The number of environment steps recorded so far.
+    - gradient_steps: The number of gradient steps taken so far.
+    - last_loss: The loss of the last gradient step, None before the first one. Kept as a tensor so that no step waits on .item().
+    - metrics: Times the phases of each gradient step and counts them. The one of experience_replay by default.
+    - CACHE_TARGETS: If True, the T_network outputs at the result states come from the replay buffer's cache,
+                     so T_network only runs on transitions it has not seen since its last update.
+    - REFRESH_TARGETS_ON_SYNC: If True (and CACHE_TARGETS), the whole cache is recomputed in one pass whenever T_network is synced,
+                               instead of lazily as stale transitions are sampled.
+    """
+
+    experience_replay: ER.ExperienceReplay
+    Q_network: NN.NeuralNetwork
+    Q_forward: torch.nn.Module
+    T_network: TN.TargetNetwork
+    optimizer: torch.optim.Optimizer
+    loss_function: torch.nn.Module
+    env_steps: int
+    gradient_steps: int
+    last_loss: torch.Tensor | None
+    metrics: M.Metrics
+    GAMMA: float
+    BATCH_SIZE: int
+    LEARNING_STARTS: int
+    UPDATES_PER_STEP: float
+    UPDATE_EVERY: int
+    INTERLEAVE: bool
+    T_NET_UPDATE_EVERY: int
+    SOFT_UPDATES: bool
+    DOUBLE_DQN: bool
+    CACHE_TARGETS: bool
+    REFRESH_TARGETS_ON_SYNC: bool
+
+    def __init__(
+        self,
+        experience_replay: ER.ExperienceReplay,
+        Q_network: NN.NeuralNetwork,
+        optimizer: torch.optim.Optimizer,
+        loss_function: torch.nn.Module,
+        gamma: float = 0.1,
+        batch_size: int = 30,
+        learning_starts: int = 1000,
+        updates_per_step: float = 0.25,
+        update_every: int = 4,
+        interleave: bool = True,
+        t_net_update_every: int = 100,
+        double_dqn: bool = False,
+        Q_forward: torch.nn.Module | None = None,
+        cache_targets: bool = True,
+        refresh_targets_on_sync: bool = False,
+        soft_updates: bool = False,
+        tau: float = 0.005,
+        metrics: M.Metrics | None = None,
+    ) -> None:
+        """
+        Initializing the trainer.
+
+        Preconditions:
+        - experience_replay.replay_buffer is not None
+        - experience_replay.replay_buffer is not swapped between a PrioritizedReplayBuffer and another kind after this
+        """
+
+        self.experience_replay = experience_replay
+        self.Q_network = Q_network
+        self.Q_forward = Q_forward if Q_forward is not None else Q_network
+        self.T_network = TN.TargetNetwork(Q_network, tau=tau)
+        self.optimizer = optimizer
+        self.loss_function = loss_function
+        self.env_steps = 0
+        self.gradient_steps = 0
+        self.last_loss = None
+        self.metrics = metrics if metrics is not None else experience_replay.metrics
+
+        self.GAMMA = gamma
+        self.BATCH_SIZE = batch_size
+        self.LEARNING_STARTS = learning_starts
+        self.UPDATES_PER_STEP = updates_per_step
+        self.UPDATE_EVERY = update_every
+        self.INTERLEAVE = interleave
+        self.T_NET_UPDATE_EVERY = t_net_update_every
+        self.SOFT_UPDATES = soft_updates
+        self.DOUBLE_DQN = double_dqn
+        self.CACHE_TARGETS = cache_targets
+        self.REFRESH_TARGETS_ON_SYNC = refresh_targets_on_sync
+
+        # the importance sampling weights of prioritized replay need the loss of each transition, not their mean
+        self._elementwise_loss_function = None
+        if isinstance(self.replay_buffer, PR.PrioritizedReplayBuffer):
+            self._elementwise_loss_function = HF.elementwise(loss_function)
+
+        # fractional gradient steps earned but not taken yet
+        self._update_credit = 0.0
+        self._unrecorded_steps = 0
+
+    @property
+    def replay_buffer(self) -> RB.ReplayBuffer:
+        return self.experience_replay.replay_buffer
+
+    @property
+    def target_version(self) -> int:
+        return self.T_network.version
+
+    def update(self) -> torch.tensor:
+        """Takes one gradient step on a random batch from the replay buffer and returns its loss."""
+
+        metrics = self.metrics
+
+        with metrics.time("batch"):
+            indices = self.replay_buffer.sample_indices(self.BATCH_SIZE)
+            batch = self.replay_buffer.gather(indices)
+
+            next_Q_values = None
+            if self.CACHE_TARGETS:
+                next_Q_values = self.replay_buffer.cached_target_Q_values(indices, self.T_network, self.target_version)
+
+        prioritized = isinstance(self.replay_buffer, PR.PrioritizedReplayBuffer)
+
+        with metrics.time("loss"):
+            chosen_Q_values, target_Q_values = HF.Q_learning_targets(
+                self.Q_forward,
+                self.T_network,
+                batch,
+                gamma=self.GAMMA,
+                double_dqn=self.DOUBLE_DQN,
+                next_Q_values=next_Q_values,
+            )
+
+            if prioritized:
+                weights = self.replay_buffer.importance_weights(indices)
+                loss = HF.weighted_loss(self._elementwise_loss_function, chosen_Q_values, target_Q_values, weights)
+            else:
+                loss = self.loss_function(chosen_Q_values, target_Q_values)
+
+        with metrics.time("backward"):
+            self.optimizer.zero_grad()
+
+            loss.backward()
+
+        with metrics.time("optimizer"):
+            self.optimizer.step()
+
+            if prioritized:
+                self.replay_buffer.update_priorities(indices, target_Q_values - chosen_Q_values.detach())
+
+        self.gradient_steps += 1
+        metrics.count("gradient_steps")
+        self.last_loss = loss.detach()
+
+        with metrics.time("target_sync"):
+            if self.SOFT_UPDATES:
+                self.T_network.soft_update()
+            elif self.gradient_steps % self.T_NET_UPDATE_EVERY == 0:
+                self.sync_target()
+
+        return self.last_loss
+
+    def sync_target(self) -> None:
+        """Copies the weights of Q_network into T_network, which moves it on to the next target_version."""
+
+        self.T_network.sync()
+
+        if self.CACHE_TARGETS and self.REFRESH_TARGETS_ON_SYNC:
+            self.replay_buffer.refresh_target_Q_values(self.T_network, self.target_version)
+
+    def record_steps(self, count: int) -> int:
+        """
+        Records count new environment steps, whose transitions must already be in the replay buffer,
+        and takes the gradient steps they earned. Returns the number of gradient steps taken.
+        """
+
+        self.env_steps += count
+
+        if len(self.replay_buffer) < self.LEARNING_STARTS:
+            return 0
+
+        self._update_credit += count * self.UPDATES_PER_STEP
+
+        taken = 0
+        while self._update_credit >= 1.0:
+            self.update()
+            self._update_credit -= 1.0
+            taken += 1
+
+        return taken
+
+    def _on_step(self, experience_replay: ER.ExperienceReplay) -> None:
+        """Called by build after every environment step when INTERLEAVE is True."""
+
+        self._unrecorded_steps += 1
+
+        if self._unrecorded_steps >= self.UPDATE_EVERY:
+            experience_replay.flush()
+            self.record_steps(self._unrecorded_steps)
+            self._unrecorded_steps = 0
+
+    def train_episode(self) -> int:
+        """Builds one episode with experience_replay, learning from it as configured, and returns the number of environment steps it took."""
+
+        self._unrecorded_steps = 0
+
+        self.experience_replay.build(on_step=self._on_step if self.INTERLEAVE else None)
+
+        if self.INTERLEAVE:
+            self.record_steps(self._unrecorded_steps)
+            self._unrecorded_steps = 0
+        else:
+            self.record_steps(len(self.experience_replay.experience_library))
+
+        return len(self.experience_replay.experience_library)
@@ -1,4 +1,7 @@
 import types
+import bisect
+import xml.etree.ElementTree as ET
+import numpy as np
 
 
 class Course:
@@ -25,15 +28,43 @@ class Course:
         self.dist_vs_ele = dist_vs_ele
         self.dist_vs_slope = dist_vs_slope
 
-    def elevtion(self, distance: float) -> float:
-        return NotImplementedError
+    def elevation(self, distance: float) -> float:
+        raise NotImplementedError
 
     def slope(self, distance: float) -> float:
         raise NotImplementedError
 
+    def elevation_many(self, distances: np.ndarray) -> np.ndarray:
+        """Returns the elevation at each of distances. Subclasses should override this with a vectorized lookup."""
+
+        distances = np.asarray(distances, dtype=np.float64)
+        return np.array([self.elevation(d) for d in distances.ravel()], dtype=np.float64).reshape(distances.shape)
+
+    def slope_many(self, distances: np.ndarray) -> np.ndarray:
+        """Returns the slope at each of distances. Subclasses should override this with a vectorized lookup."""
+
+        distances = np.asarray(distances, dtype=np.float64)
+        return np.array([self.slope(d) for d in distances.ravel()], dtype=np.float64).reshape(distances.shape)
+
 
 class IdealCourse(Course):
-    """An idealized course which is based on the graph of a mathematical function R -> R. self.dist_vs_ele is of type callable."""
+    """
+    An idealized course which is based on the graph of a mathematical function R -> R. self.dist_vs_ele is of type callable.
+
+    The course can optionally be compiled, which samples it onto a fine uniform grid so that elevation_many and slope_many
+    are a single interpolated array lookup instead of a Python call per distance. elevation and slope always stay exact.
+
+    Attributes:
+    - VECTORIZED: True if dist_vs_ele and dist_vs_slope can be called on NumPy arrays directly.
+    - compile_error: The largest interpolation error measured when compiling, or None if the course is not compiled.
+    """
+
+    VECTORIZED: bool = False
+    compile_error: float | None = None
+
+    _grid_spacing: float
+    _elevation_grid: np.ndarray
+    _slope_grid: np.ndarray
 
     def elevation(self, distance: float) -> float:
         """Returns elevation at distance based on the self.dist_vs_ele function."""
@@ -49,17 +80,241 @@ class IdealCourse(Course):
         else:
             raise NotImplementedError
 
+    def _evaluate(self, function: types.FunctionType, distances: np.ndarray) -> np.ndarray:
+        """Returns function evaluated at each of distances."""
+
+        if self.VECTORIZED:
+            return np.broadcast_to(np.asarray(function(distances), dtype=np.float64), distances.shape)
+
+        return np.array([function(d) for d in distances.ravel()], dtype=np.float64).reshape(distances.shape)
+
+    def elevation_many(self, distances: np.ndarray) -> np.ndarray:
+        """Returns the elevation at each of distances, interpolated from the grid if the course is compiled."""
+
+        distances = np.asarray(distances, dtype=np.float64)
+
+        if self.compile_error is not None:
+            return _interpolate_uniform(self._elevation_grid, self._grid_spacing, distances)
+
+        return self._evaluate(self.dist_vs_ele, distances)
+
+    def slope_many(self, distances: np.ndarray) -> np.ndarray:
+        """Returns the slope at each of distances, interpolated from the grid if the course is compiled."""
+
+        distances = np.asarray(distances, dtype=np.float64)
+
+        if self.compile_error is not None:
+            return _interpolate_uniform(self._slope_grid, self._grid_spacing, distances)
+
+        if self.dist_vs_slope is None:
+            raise NotImplementedError
+
+        return self._evaluate(self.dist_vs_slope, distances)
+
+    def compile(
+        self,
+        max_error: float = 1e-6,
+        spacing: float = 1.0,
+        min_spacing: float = 1e-3,
+        margin: float = 200.0,
+    ) -> float:
+        """
+        Samples the elevation and slope onto a uniform grid covering [0, COURSE_LENGTH + margin] which elevation_many and slope_many
+        then linearly interpolate. The margin covers the 100m lookahead from the last state of an episode, which is past the finish line.
+        Past the grid the end values are used.
+        The spacing is halved until the interpolation error at the midpoints of the grid is at most max_error, or until it reaches min_spacing.
+        If there is no slope function the slope grid is the numerical derivative of the elevation grid.
+
+        Returns the largest interpolation error measured, which is also kept in compile_error.
+        """
+
+        self.compile_error = None
+        end = self.COURSE_LENGTH + margin
+
+        while True:
+            count = int(np.ceil(end / spacing)) + 1
+            grid = np.arange(count) * spacing
+            midpoints = grid[:-1] + 0.5 * spacing
+
+            elevation_grid = self._evaluate(self.dist_vs_ele, grid)
+            error = np.max(np.abs(0.5 * (elevation_grid[:-1] + elevation_grid[1:]) - self._evaluate(self.dist_vs_ele, midpoints)))
+
+            if self.dist_vs_slope is not None:
+                slope_grid = self._evaluate(self.dist_vs_slope, grid)
+                slope_error = np.max(np.abs(0.5 * (slope_grid[:-1] + slope_grid[1:]) - self._evaluate(self.dist_vs_slope, midpoints)))
+                error = max(error, slope_error)
+            else:
+                slope_grid = np.gradient(elevation_grid, spacing)
+
+            if error <= max_error or spacing / 2.0 < min_spacing:
+                break
+
+            spacing /= 2.0
+
+        self._grid_spacing = spacing
+        self._elevation_grid = elevation_grid
+        self._slope_grid = slope_grid
+        self.compile_error = float(error)
+
+        return self.compile_error
+
 
 class PointwiseCourse(Course):
-    """A course which is defined by many different points individual points instead of continuously. self.dist_vs_ele is of type list[list]."""
+    """
+    A course which is defined by many different points individual points instead of continuously. self.dist_vs_ele is of type list[list].
+    Each point is [distance, elevation], the elevation is linearly interpolated between points so the slope is constant on each segment.
+    Before the first point and after the last point the first and last segments are extended.
+
+    Attributes:
+    - distances: Distance of each point. Shifted so that the first point is at distance zero.
+    - elevations: Elevation of each point after smoothing.
+    - slopes: Slope of each segment, slopes[i] is the slope between point i and point i + 1.
+    - SPACING: The distance between consecutive points if they are evenly spaced, otherwise None.
+               Lookups are O(1) grid indexing when evenly spaced and O(log n) binary search otherwise.
+    """
+
+    distances: np.ndarray
+    elevations: np.ndarray
+    slopes: np.ndarray
+    SPACING: float | None
 
-    pass
+    def __init__(self, dist_vs_ele: list[list] | np.ndarray, smoothing_window: int = 1) -> None:
+        """
+        Initializing the pointwise course. The elevations are smoothed with a centered moving average over smoothing_window points.
+
+        Preconditions:
+        - dist_vs_ele has at least two points and its distances are increasing
+        - smoothing_window is odd
+        """
+
+        points = np.asarray(dist_vs_ele, dtype=np.float64)
+        distances = points[:, 0] - points[0, 0]
+        elevations = points[:, 1]
+
+        if smoothing_window > 1:
+            padding = smoothing_window // 2
+            padded = np.pad(elevations, padding, mode="edge")
+            elevations = np.convolve(padded, np.ones(smoothing_window) / smoothing_window, mode="valid")
+
+        Course.__init__(self, distances[-1], dist_vs_ele)
+
+        self.distances = distances
+        self.elevations = elevations
+        self.slopes = np.diff(elevations) / np.diff(distances)
+
+        gaps = np.diff(distances)
+        if np.allclose(gaps, gaps[0], rtol=1e-9, atol=0.0):
+            self.SPACING = gaps[0]
+        else:
+            self.SPACING = None
+
+        # plain lists are much faster than NumPy for the scalar lookups done every step
+        self._distance_list = distances.tolist()
+        self._elevation_list = elevations.tolist()
+        self._slope_list = self.slopes.tolist()
+
+    @classmethod
+    def from_csv(
+        cls,
+        path: str,
+        distance_column: int = 0,
+        elevation_column: int = 1,
+        delimiter: str = ",",
+        header_rows: int = 1,
+        smoothing_window: int = 1,
+    ) -> "PointwiseCourse":
+        """Returns the course defined by the distance and elevation columns of a CSV file, both in meters."""
+
+        points = np.loadtxt(
+            path,
+            delimiter=delimiter,
+            skiprows=header_rows,
+            usecols=(distance_column, elevation_column),
+            ndmin=2,
+        )
+
+        return cls(points, smoothing_window)
+
+    @classmethod
+    def from_gpx(cls, path: str, smoothing_window: int = 1) -> "PointwiseCourse":
+        """
+        Returns the course defined by the track points of a GPX file.
+        The distance of each point is the cumulative great circle distance from the first point.
+        Points which do not move the rider forward are dropped.
+        """
+
+        latitudes = []
+        longitudes = []
+        elevations = []
+
+        for element in ET.parse(path).getroot().iter():
+            if element.tag.endswith("trkpt") or element.tag.endswith("rtept"):
+                ele = next((child for child in element if child.tag.endswith("ele")), None)
+                if ele is None:
+                    continue
+                latitudes.append(float(element.get("lat")))
+                longitudes.append(float(element.get("lon")))
+                elevations.append(float(ele.text))
+
+        latitudes = np.radians(latitudes)
+        longitudes = np.radians(longitudes)
+
+        # haversine distance between consecutive points, with the earth's mean radius in meters
+        a = np.sin(np.diff(latitudes) / 2.0) ** 2 + np.cos(latitudes[:-1]) * np.cos(latitudes[1:]) * np.sin(np.diff(longitudes) / 2.0) ** 2
+        gaps = 2.0 * 6371000.0 * np.arcsin(np.sqrt(a))
+
+        distances = np.concatenate(([0.0], np.cumsum(gaps)))
+        moving = np.concatenate(([True], gaps > 0.0))
+
+        return cls(np.column_stack((distances[moving], np.asarray(elevations)[moving])), smoothing_window)
+
+    def _segment(self, distance: float) -> int:
+        """Returns the index of the segment which distance lies on."""
+
+        if self.SPACING is not None:
+            index = int(distance / self.SPACING)
+        else:
+            index = bisect.bisect_right(self._distance_list, distance) - 1
+
+        return min(max(index, 0), len(self._slope_list) - 1)
+
+    def _segments(self, distances: np.ndarray) -> np.ndarray:
+        """Returns the index of the segment which each of distances lies on."""
+
+        if self.SPACING is not None:
+            indices = np.floor(distances / self.SPACING).astype(np.int64)
+        else:
+            indices = np.searchsorted(self.distances, distances, side="right") - 1
+
+        return np.clip(indices, 0, self.slopes.shape[0] - 1)
+
+    def elevation(self, distance: float) -> float:
+        """Returns the interpolated elevation at distance."""
+
+        i = self._segment(distance)
+        return self._elevation_list[i] + self._slope_list[i] * (distance - self._distance_list[i])
+
+    def slope(self, distance: float) -> float:
+        """Returns the slope of the segment at distance."""
+        return self._slope_list[self._segment(distance)]
+
+    def elevation_many(self, distances: np.ndarray) -> np.ndarray:
+        """Returns the interpolated elevation at each of distances."""
+
+        distances = np.asarray(distances, dtype=np.float64)
+        indices = self._segments(distances)
+        return self.elevations[indices] + self.slopes[indices] * (distances - self.distances[indices])
+
+    def slope_many(self, distances: np.ndarray) -> np.ndarray:
+        """Returns the slope of the segment at each of distances."""
+        return self.slopes[self._segments(np.asarray(distances, dtype=np.float64))]
 
 
 class QuadraticHill(IdealCourse):
     """An idealized hill which starts flat, ends with a percentage of END_PERCENTAGE and transitions quadratically"""
 
     END_PERCENTAGE: float
+    VECTORIZED = True
 
     def __init__(self, course_length: float, end_percentage: float) -> None:
         """
@@ -78,3 +333,16 @@ class QuadraticHill(IdealCourse):
             return self.END_PERCENTAGE * distance / (100 * self.COURSE_LENGTH)
 
         self.dist_vs_slope = slope
+
+
+def _interpolate_uniform(values: np.ndarray, spacing: float, distances: np.ndarray) -> np.ndarray:
+    """
+    Returns the linear interpolation at distances of values sampled every spacing meters starting from zero.
+    Distances outside of the grid get the value at the nearest end.
+    """
+
+    position = np.clip(distances / spacing, 0.0, values.shape[0] - 1)
+    indices = np.minimum(position.astype(np.int64), values.shape[0] - 2)
+    fraction = position - indices
+
+    return values[indices] + (values[indices + 1] - values[indices]) * fraction
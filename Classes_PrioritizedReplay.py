@@ -0,0 +1,205 @@
+import Class_ReplayBuffer as RB
+import numpy as np
+import torch
+
+
+class SumTree:
+    """
+    A binary tree in a flat array where every node holds the sum of its two children, so the leaves can be sampled in proportion
+    to their values in O(log n). Node 1 is the root, the children of node i are 2i and 2i + 1, and leaf j is node LEAVES + j.
+    Both sample and update work on whole batches at once, one tree level at a time.
+
+    Attributes:
+    - tree: The node values. tree[1] is the total of all leaves.
+    - LEAVES: The number of leaves, the capacity rounded up to a power of two.
+    """
+
+    tree: np.ndarray
+    LEAVES: int
+
+    def __init__(self, capacity: int) -> None:
+        """Initializing a tree with at least capacity leaves, all zero."""
+
+        self.LEAVES = 1 << max(capacity - 1, 1).bit_length()
+        self._depth = self.LEAVES.bit_length() - 1
+        self.tree = np.zeros(2 * self.LEAVES)
+
+    @property
+    def total(self) -> float:
+        return self.tree[1]
+
+    def leaves(self) -> np.ndarray:
+        """Returns a view of the leaf values."""
+        return self.tree[self.LEAVES :]
+
+    def update(self, leaf_indices: np.ndarray, values: np.ndarray) -> None:
+        """Sets the leaves at leaf_indices to values and updates the sums above them. If an index repeats, its last value is kept."""
+
+        nodes = np.asarray(leaf_indices) + self.LEAVES
+        self.tree[nodes] = values
+
+        for level in range(self._depth):
+            nodes = np.unique(nodes // 2)
+            self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+
+    def find(self, prefix_sums: np.ndarray) -> np.ndarray:
+        """
+        Returns, for each value in prefix_sums, the index of the leaf whose range of the cumulative sum of the leaves contains it.
+
+        Preconditions:
+        - 0.0 <= prefix_sums < self.total
+        """
+
+        nodes = np.ones(prefix_sums.shape[0], dtype=np.int64)
+        remaining = prefix_sums.copy()
+
+        for level in range(self._depth):
+            left = 2 * nodes
+            left_sums = self.tree[left]
+            go_right = remaining >= left_sums
+            remaining -= left_sums * go_right
+            nodes = left + go_right
+
+        return nodes - self.LEAVES
+
+
+class MinTree:
+    """
+    A binary tree in the same flat layout as SumTree where every node holds the minimum of its two children instead, so the
+    smallest leaf is read off the root in O(1) and kept up to date in O(log n). Leaves which were never set are infinite,
+    so they never count as the minimum.
+
+    Attributes:
+    - tree: The node values. tree[1] is the smallest of all leaves.
+    - LEAVES: The number of leaves, the capacity rounded up to a power of two.
+    """
+
+    tree: np.ndarray
+    LEAVES: int
+
+    def __init__(self, capacity: int) -> None:
+        """Initializing a tree with at least capacity leaves, all infinite."""
+
+        self.LEAVES = 1 << max(capacity - 1, 1).bit_length()
+        self._depth = self.LEAVES.bit_length() - 1
+        self.tree = np.full(2 * self.LEAVES, np.inf)
+
+    @property
+    def minimum(self) -> float:
+        return self.tree[1]
+
+    def update(self, leaf_indices: np.ndarray, values: np.ndarray) -> None:
+        """Sets the leaves at leaf_indices to values and updates the minima above them. If an index repeats, its last value is kept."""
+
+        nodes = np.asarray(leaf_indices) + self.LEAVES
+        self.tree[nodes] = values
+
+        for level in range(self._depth):
+            nodes = np.unique(nodes // 2)
+            self.tree[nodes] = np.minimum(self.tree[2 * nodes], self.tree[2 * nodes + 1])
+
+
+class PrioritizedReplayBuffer(RB.ReplayBuffer):
+    """
+    A ReplayBuffer which samples transitions in proportion to priority ** ALPHA instead of uniformly (prioritized experience replay),
+    where the priority of a transition is the size of its last TD error. New transitions get the largest priority seen so far,
+    so that every transition is sampled soon after it is added, e.g. the terminal and severe penalty transitions.
+    The bias this causes is corrected with the importance sampling weights of importance_weights.
+
+    Attributes:
+    - priorities: A SumTree of priority ** ALPHA for each slot of the buffer.
+    - min_priorities: A MinTree of the same values, for the largest importance sampling weight.
+    - max_priority: The largest priority given so far.
+    - ALPHA: How strongly the priorities shape sampling. 0 is uniform.
+    - BETA: How strongly the importance sampling weights correct for it. 1 corrects fully, usually annealed towards 1 over training.
+    - PRIORITY_EPSILON: Added to every priority so that no transition has zero chance of being sampled.
+    """
+
+    priorities: SumTree
+    min_priorities: MinTree
+    max_priority: float
+    ALPHA: float
+    BETA: float
+    PRIORITY_EPSILON: float
+
+    def __init__(
+        self,
+        capacity: int,
+        state_size: int = 17,
+        dtype: torch.dtype = torch.float64,
+        device: str = RB.device,
+        alpha: float = 0.6,
+        beta: float = 0.4,
+        priority_epsilon: float = 1e-6,
+    ) -> None:
+        """Initializing the replay buffer and its sum and min trees."""
+
+        super(PrioritizedReplayBuffer, self).__init__(capacity, state_size=state_size, dtype=dtype, device=device)
+
+        self.priorities = SumTree(capacity)
+        self.min_priorities = MinTree(capacity)
+        self.max_priority = 1.0
+        self.ALPHA = alpha
+        self.BETA = beta
+        self.PRIORITY_EPSILON = priority_epsilon
+
+    def add_batch(
+        self,
+        start_states: torch.tensor,
+        actions: torch.tensor,
+        rewards: torch.tensor,
+        result_states: torch.tensor,
+        dones: torch.tensor,
+        discounts: torch.Tensor | None = None,
+    ) -> None:
+        """Adds a batch of transitions like ReplayBuffer.add_batch, each with the largest priority seen so far."""
+
+        super(PrioritizedReplayBuffer, self).add_batch(start_states, actions, rewards, result_states, dones, discounts)
+
+        count = min(actions.size(dim=0), self.CAPACITY)
+        slots = (self.position - count + np.arange(count)) % self.CAPACITY
+
+        values = np.full(count, self.max_priority**self.ALPHA)
+        self.priorities.update(slots, values)
+        self.min_priorities.update(slots, values)
+
+    def sample_indices(self, batch_size: int) -> torch.tensor:
+        """
+        Returns batch_size indices sampled in proportion to their priorities. The total is split into batch_size equal segments
+        and one index is drawn from each, which spreads a batch over the buffer better than independent draws.
+        """
+
+        total = self.priorities.total
+        segment = total / batch_size
+        prefix_sums = (np.arange(batch_size) + torch.rand(batch_size, dtype=torch.float64).numpy()) * segment
+
+        # rounding can put the last draw exactly on the total, or on the empty leaves past size
+        leaf_indices = self.priorities.find(np.minimum(prefix_sums, np.nextafter(total, 0.0)))
+        leaf_indices = np.minimum(leaf_indices, self.size - 1)
+
+        return torch.from_numpy(leaf_indices).to(self.device)
+
+    def importance_weights(self, indices: torch.tensor) -> torch.tensor:
+        """
+        Returns the importance sampling weight (size * P(i)) ** -BETA of each index, divided by the largest possible weight
+        (that of the lowest priority transition) so that the weights only ever scale the loss down. The lowest priority
+        is read off the root of min_priorities, so that this costs O(batch size) rather than a scan of the buffer.
+        """
+
+        probabilities = self.priorities.leaves()[indices.cpu().numpy()]
+
+        weights = (probabilities / self.min_priorities.minimum) ** -self.BETA
+
+        return torch.from_numpy(weights).to(self.device, self.rewards.dtype)
+
+    def update_priorities(self, indices: torch.tensor, td_errors: torch.tensor) -> None:
+        """Sets the priorities of the transitions at indices to the sizes of their new TD errors."""
+
+        priorities = np.abs(td_errors.detach().cpu().numpy().astype(np.float64)) + self.PRIORITY_EPSILON
+
+        indices = indices.cpu().numpy()
+        values = priorities**self.ALPHA
+
+        self.max_priority = max(self.max_priority, priorities.max())
+        self.priorities.update(indices, values)
+        self.min_priorities.update(indices, values)
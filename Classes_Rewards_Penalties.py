@@ -1,8 +1,89 @@
 import Class_RiderCourseSystem as RCS
 import Helper_Functions as HF
+import numpy as np
 import math
 
 
+class RewardStates:
+    """
+    The parts of one or many system states which the reward policies look at, as NumPy arrays which all have the same shape.
+    A single state, a batch of riders (see BatchedRiderCourseSystem.reward_states) and a whole recorded trajectory
+    are all just arrays of different shapes.
+
+    Attributes:
+    - distance: Distance of the rider after the step.
+    - last_distance: Distance of the rider before the step.
+    - force: Force of the rider during the step.
+    - an_energy: Anarobic energy of the rider after the step.
+    - time: Time of the system after the step.
+    - max_force: Max force of the rider.
+    - course_length: Length of the course.
+    """
+
+    distance: np.ndarray
+    last_distance: np.ndarray
+    force: np.ndarray
+    an_energy: np.ndarray
+    time: np.ndarray
+    max_force: np.ndarray
+    course_length: np.ndarray
+
+    def __init__(
+        self,
+        distance: np.ndarray,
+        last_distance: np.ndarray,
+        force: np.ndarray,
+        an_energy: np.ndarray,
+        time: np.ndarray,
+        max_force: np.ndarray,
+        course_length: np.ndarray,
+    ) -> None:
+        self.distance = np.asarray(distance, dtype=np.float64)
+        self.last_distance = np.asarray(last_distance, dtype=np.float64)
+        self.force = np.asarray(force, dtype=np.float64)
+        self.an_energy = np.asarray(an_energy, dtype=np.float64)
+        self.time = np.asarray(time, dtype=np.float64)
+        self.max_force = np.asarray(max_force, dtype=np.float64)
+        self.course_length = np.asarray(course_length, dtype=np.float64)
+
+    @classmethod
+    def from_system(cls, system: RCS.RiderCourseSystem) -> "RewardStates":
+        """Returns the current state of system as arrays of shape ()."""
+
+        rs = system.rider.state
+
+        return cls(
+            rs.distance,
+            system.rider.last_state.distance,
+            rs.force,
+            rs.an_energy,
+            system.time,
+            system.rider.MAX_FORCE,
+            system.course.COURSE_LENGTH,
+        )
+
+    @classmethod
+    def from_trajectory(
+        cls,
+        start_distance: float,
+        distances: np.ndarray,
+        forces: np.ndarray,
+        an_energies: np.ndarray,
+        times: np.ndarray,
+        max_force: float,
+        course_length: float,
+    ) -> "RewardStates":
+        """
+        Returns the states of a recorded trajectory of one rider, where entry i of each array is the state after step i.
+        start_distance is the distance before the first step.
+        """
+
+        distances = np.asarray(distances, dtype=np.float64)
+        last_distances = np.concatenate(([start_distance], distances[:-1]))
+
+        return cls(distances, last_distances, forces, an_energies, times, max_force, course_length)
+
+
 class RewardPolicy:
     """
     A geral policy of assigning a reward to how an agent (not necessarily a Q_network) interacts with a system.
@@ -21,6 +102,10 @@ class RewardPolicy:
         """The reward assignment function."""
         raise NotImplementedError
 
+    def reward_many(self, states: RewardStates) -> np.ndarray:
+        """The reward assignment function applied to every state in states at once. Must agree with reward."""
+        raise NotImplementedError
+
 
 class EvenMilestones(RewardPolicy):
     """
@@ -61,6 +146,10 @@ class EvenMilestones(RewardPolicy):
 
         return 0.0
 
+    def reward_many(self, states: RewardStates) -> np.ndarray:
+        milestones_passed = np.trunc(states.distance / self.SPACING) - np.trunc(states.last_distance / self.SPACING)
+        return np.where(milestones_passed > 0, self.BASE_REWARD * milestones_passed, 0.0)
+
 
 class SeverePenalty(RewardPolicy):
     """
@@ -72,12 +161,20 @@ class SeverePenalty(RewardPolicy):
     def penalty_conditions(self) -> bool:
         raise NotImplementedError
 
+    def penalty_conditions_many(self, states: RewardStates) -> np.ndarray:
+        """penalty_conditions applied to every state in states at once, as a boolean array."""
+        raise NotImplementedError
+
     def reward(self) -> float:
         if self.penalty_conditions():
             raise SevereMistakeError
         else:
             return 0.0
 
+    def reward_many(self, states: RewardStates) -> np.ndarray:
+        """The reward when no severe mistake is made. Use penalty_conditions_many to find the severe mistakes."""
+        return np.zeros_like(states.distance)
+
 
 class RiderAbilitiesViolation(SeverePenalty):
     """
@@ -95,6 +192,9 @@ class RiderAbilitiesViolation(SeverePenalty):
         else:
             return False
 
+    def penalty_conditions_many(self, states: RewardStates) -> np.ndarray:
+        return (states.an_energy < 0.0) | (states.force > states.max_force)
+
 
 class TimeViolation(SeverePenalty):
     """
@@ -116,6 +216,9 @@ class TimeViolation(SeverePenalty):
         else:
             return False
 
+    def penalty_conditions_many(self, states: RewardStates) -> np.ndarray:
+        return states.time > self.CUTOFF_TIME
+
 
 class UnderMinForceViolation(SeverePenalty):
     """A severe penalty that is triggered by the rider's force going less that MIN_FORCE."""
@@ -135,6 +238,9 @@ class UnderMinForceViolation(SeverePenalty):
         else:
             return False
 
+    def penalty_conditions_many(self, states: RewardStates) -> np.ndarray:
+        return states.force < self.MIN_FORCE
+
 
 class UnderMinEnergyViolation(SeverePenalty):
     """A severe penalty that is triggered by the rider's energy going less that MIN_ENERGY."""
@@ -154,6 +260,9 @@ class UnderMinEnergyViolation(SeverePenalty):
         else:
             return False
 
+    def penalty_conditions_many(self, states: RewardStates) -> np.ndarray:
+        return states.an_energy < self.MIN_ENERGY
+
 
 class GoingBackwardsViolation(SeverePenalty):
     """A severe penalty that is triggered by the rider moving backwards."""
@@ -167,6 +276,9 @@ class GoingBackwardsViolation(SeverePenalty):
         else:
             return False
 
+    def penalty_conditions_many(self, states: RewardStates) -> np.ndarray:
+        return states.distance < states.last_distance
+
 
 class ForceBoundsPenalty(RewardPolicy):
     """
@@ -195,6 +307,14 @@ class ForceBoundsPenalty(RewardPolicy):
         else:
             return 0.0
 
+    def reward_many(self, states: RewardStates) -> np.ndarray:
+        force = states.force
+        return np.where(
+            force > states.max_force,
+            -self.scaling * (force - states.max_force) ** 2,
+            np.where(force < 0, -self.scaling * force**2, 0.0),
+        )
+
 
 class UnderZeroEnergyPenalty(RewardPolicy):
     """
@@ -216,6 +336,9 @@ class UnderZeroEnergyPenalty(RewardPolicy):
         else:
             return 0.0
 
+    def reward_many(self, states: RewardStates) -> np.ndarray:
+        return np.where(states.an_energy < 0, -self.scaling * states.an_energy**2, 0.0)
+
 
 class CompletionReward(RewardPolicy):
     """
@@ -234,6 +357,9 @@ class CompletionReward(RewardPolicy):
         else:
             return 0.0
 
+    def reward_many(self, states: RewardStates) -> np.ndarray:
+        return np.where(states.distance > states.course_length, self.completion_reward, 0.0)
+
 
 class FinalTimeReward(RewardPolicy):
     """
@@ -255,6 +381,9 @@ class FinalTimeReward(RewardPolicy):
         else:
             return 0.0
 
+    def reward_many(self, states: RewardStates) -> np.ndarray:
+        return np.where(states.distance > states.course_length, self.expected_time - states.time, 0.0)
+
 
 class RewardBundle:
     """A collection of reward and penalty policies which all together decide
@@ -280,6 +409,65 @@ class RewardBundle:
 
         return reward
 
+    def set_cutoff_time(self, cutoff_time: float) -> None:
+        """Sets the CUTOFF_TIME of every TimeViolation in the bundle, e.g. to relax it as training goes on."""
+
+        for policy in self.bundle:
+            if isinstance(policy, TimeViolation):
+                policy.CUTOFF_TIME = cutoff_time
+
+
+class CompiledRewardBundle:
+    """
+    A RewardBundle turned into one function over RewardStates which never raises or prints.
+    Calling it returns (reward, terminated, reason_code) arrays of the same shape as the states, so one call scores
+    a single state, a batch of riders or a whole recorded trajectory.
+    It agrees with RewardBundle.reward and build: a state with a severe mistake gets SEVERE_MISTAKE_PENALTY instead of the other rewards.
+    The policies' attributes are read on each call, so changes like raising a CUTOFF_TIME are picked up.
+
+    Attributes:
+    - reward_bundle: The bundle which was compiled.
+    - REASONS: REASONS[reason_code] is the name of the severe penalty that ended the episode. reason_code 0 ("none") means no severe mistake,
+               otherwise reason_code - 1 is the index of the penalty in the bundle. When several are triggered the first in the bundle is reported,
+               like the SevereMistakeError raised by RewardBundle.reward.
+    """
+
+    reward_bundle: "RewardBundle"
+    REASONS: list[str]
+
+    def __init__(self, reward_bundle: "RewardBundle") -> None:
+        """
+        Compiling the bundle.
+
+        Preconditions:
+        - every policy in the bundle implements reward_many, or penalty_conditions_many if it is a SeverePenalty
+        """
+
+        self.reward_bundle = reward_bundle
+        self.REASONS = ["none"] + [type(policy).__name__ for policy in reward_bundle.bundle]
+
+        self._reward_functions = [policy.reward_many for policy in reward_bundle.bundle if not isinstance(policy, SeverePenalty)]
+        # checked last to first so that the first triggered penalty in the bundle ends up as the reason
+        self._penalty_functions = [
+            (code, policy.penalty_conditions_many)
+            for code, policy in reversed(list(enumerate(reward_bundle.bundle, start=1)))
+            if isinstance(policy, SeverePenalty)
+        ]
+
+    def __call__(self, states: RewardStates) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        reward = np.zeros_like(states.distance)
+        for reward_function in self._reward_functions:
+            reward = reward + reward_function(states)
+
+        reason_code = np.zeros(states.distance.shape, dtype=np.int64)
+        for code, penalty_conditions in self._penalty_functions:
+            reason_code = np.where(penalty_conditions(states), code, reason_code)
+
+        terminated = reason_code > 0
+        reward = np.where(terminated, self.reward_bundle.SEVERE_MISTAKE_PENALTY, reward)
+
+        return reward, terminated, reason_code
+
 
 class SevereMistakeError(Exception):
     pass
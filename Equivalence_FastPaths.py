@@ -0,0 +1,585 @@
+import Class_BatchedRiderCourseSystem as BRCS
+import Class_ObservationEncoder as OE
+import Class_RiderState as RS
+import Class_Rider as R
+import Classes_Courses as C
+import Class_RiderCourseSystem as RCS
+import Classes_Rewards_Penalties as RP
+import argparse
+import collections
+import contextlib
+import copy
+import io
+import sys
+import types
+import numpy as np
+
+"""
+Checks that the fast paths of the simulation agree with the reference scalar path, RiderCourseSystem.euler_step_forward,
+model_format_curr_state and RewardBundle.reward, on randomized riders, courses, reward bundles and action sequences.
+
+Every fast path is a function which takes a list of Scenarios and returns a Trajectory for each, and is registered in FAST_PATHS
+with register_fast_path. The trajectories are compared step by step with the reference: every state, observation and reward
+must be within RTOL and ATOL of it, and the episode must end at the same step for the same reason.
+A new engine only has to be registered here to be checked.
+
+With --compile-courses the fast paths run on compiled copies of the IdealCourses while the reference keeps the exact courses,
+so the compiled grids are checked as well. ATOL is then widened by each course's compile_error, the bound compile measured.
+
+Run with:
+python Equivalence_FastPaths.py                                  checks every registered fast path on 200 scenarios
+python Equivalence_FastPaths.py --fast-path ObservationEncoder   checks only that one
+python Equivalence_FastPaths.py --compile-courses                compiles the fast paths' courses, see IdealCourse.compile
+Exits with 1 if any fast path disagrees with the reference.
+"""
+
+DT = 0.1
+STEPS = 300
+SCENARIOS = 200
+RTOL = 1e-9
+ATOL = 1e-9
+STATE_FIELDS = ("distance", "velocity", "force", "an_energy", "time")
+
+
+class Scenario:
+    """
+    One episode to run: a rider on a course with a reward bundle, driven by a fixed sequence of actions.
+    The force of each step is the last force + MIN_FORCE_CHANGE * action, as in ExperienceReplay.build.
+
+    Attributes:
+    - rider: The rider, which is never stepped itself. Each run works on a copy.
+    - course: The course of the fast paths. Scenarios may share courses.
+    - reference_course: The course of the reference path, the exact version of course if course is compiled, otherwise course itself.
+    - actions: The action of each step. The episode ends early if the rider finishes or makes a severe mistake.
+    - reward_spec: The reward bundle as a list of (policy class, keyword arguments). Scenarios may share reward specs.
+    """
+
+    rider: R.Rider
+    course: C.Course
+    reference_course: C.Course
+    actions: np.ndarray
+    reward_spec: list[tuple[type, dict]]
+
+    def __init__(
+        self,
+        rider: R.Rider,
+        course: C.Course,
+        actions: np.ndarray,
+        reward_spec: list[tuple[type, dict]],
+        reference_course: C.Course | None = None,
+    ) -> None:
+        self.rider = rider
+        self.course = course
+        self.reference_course = reference_course if reference_course is not None else course
+        self.actions = np.asarray(actions, dtype=np.int64)
+        self.reward_spec = reward_spec
+
+    @property
+    def course_error(self) -> float:
+        """The largest error of course against reference_course, its compile_error if it is a compiled copy and 0.0 otherwise."""
+
+        if self.course is self.reference_course:
+            return 0.0
+
+        return self.course.compile_error
+
+    def make_system(self, reference: bool = False) -> RCS.RiderCourseSystem:
+        """Returns a new system of a copy of the rider on the course, or on reference_course if reference is True, in its initial state."""
+
+        system = RCS.RiderCourseSystem(copy.deepcopy(self.rider), self.reference_course if reference else self.course, dt=DT)
+        system.reset()
+
+        return system
+
+    def make_reward_bundle(self, system: RCS.RiderCourseSystem, severe_mistake_penalty: float = -100.0) -> RP.RewardBundle:
+        """Returns a new reward bundle of reward_spec which rewards system."""
+        return RP.RewardBundle([policy(system, **kwargs) for policy, kwargs in self.reward_spec], severe_mistake_penalty)
+
+
+class Trajectory:
+    """
+    What happened in one episode.
+
+    Attributes:
+    - states: Shape (steps, len(STATE_FIELDS)), row i is the state after step i.
+    - observations: Shape (steps + 1, 17), row 0 is the initial state and row i the state after step i.
+    - rewards: Shape (steps,), the reward of each step.
+    - reason: Why the episode ended, the name of the severe penalty, "finished" or "none" if the actions ran out first.
+    """
+
+    states: np.ndarray
+    observations: np.ndarray
+    rewards: np.ndarray
+    reason: str
+
+    def __init__(self, states: list, observations: list, rewards: list, reason: str) -> None:
+        self.states = np.array(states, dtype=np.float64).reshape(-1, len(STATE_FIELDS))
+        self.observations = np.array(observations, dtype=np.float64)
+        self.rewards = np.array(rewards, dtype=np.float64)
+        self.reason = reason
+
+
+FAST_PATHS = {}
+
+
+def register_fast_path(name: str) -> types.FunctionType:
+    """Returns a decorator which registers a function of a list of Scenarios to their Trajectories in FAST_PATHS as name."""
+
+    def register(fast_path: types.FunctionType) -> types.FunctionType:
+        FAST_PATHS[name] = fast_path
+        return fast_path
+
+    return register
+
+
+def random_rider(rng: np.random.Generator) -> R.Rider:
+    initial_state = RS.RiderState(
+        distance=0.0,
+        velocity=rng.uniform(0.0, 12.0),
+        force=rng.uniform(0.0, 400.0),
+        an_energy=rng.uniform(5000.0, 60000.0),
+    )
+
+    return R.Rider(
+        initial_state,
+        weight=rng.uniform(50.0, 110.0),
+        bike_weight=rng.uniform(6.0, 12.0),
+        cross_area=rng.uniform(0.3, 0.6),
+        drag_coef=rng.uniform(0.5, 1.0),
+        max_force=rng.uniform(400.0, 1500.0),
+        max_jerk=rng.uniform(0.5, 2.0),
+        avg_velocity=rng.uniform(5.0, 10.0),
+        avg_velocity_on_flat=rng.uniform(6.0, 11.0),
+    )
+
+
+def random_course(rng: np.random.Generator) -> C.Course:
+    """Returns a QuadraticHill or a PointwiseCourse with evenly or unevenly spaced points, both with climbs and descents."""
+
+    course_length = rng.uniform(20.0, 400.0)
+
+    if rng.random() < 0.5:
+        return C.QuadraticHill(course_length=course_length, end_percentage=rng.uniform(-10.0, 15.0))
+
+    points = int(rng.integers(3, 40))
+    if rng.random() < 0.5:
+        distances = np.linspace(0.0, course_length, points)
+    else:
+        distances = np.concatenate(([0.0], np.sort(rng.uniform(0.0, course_length, points - 2)), [course_length]))
+
+    slopes = rng.uniform(-0.12, 0.12, points - 1)
+    elevations = np.concatenate(([0.0], np.cumsum(slopes * np.diff(distances))))
+
+    return C.PointwiseCourse(np.stack([distances, elevations], axis=1), smoothing_window=int(rng.choice([1, 3, 5])))
+
+
+def compiled_copy(course: C.Course) -> C.Course:
+    """Returns a compiled copy of course if it is an IdealCourse, which leaves course itself exact, otherwise course itself."""
+
+    if not isinstance(course, C.IdealCourse):
+        return course
+
+    compiled = copy.deepcopy(course)
+    compiled.compile()
+
+    return compiled
+
+
+def random_reward_spec(rng: np.random.Generator) -> list[tuple[type, dict]]:
+    """Returns a reward spec with the policies of Main.py with random parameters, in a random order."""
+
+    spec = [
+        (RP.EvenMilestones, {"base_reward": rng.uniform(0.5, 5.0), "spacing": rng.uniform(2.0, 20.0)}),
+        (RP.CompletionReward, {"completion_reward": rng.uniform(0.0, 10.0)}),
+        (RP.UnderMinForceViolation, {"min_force": rng.uniform(-300.0, 50.0)}),
+        (RP.TimeViolation, {"cutoff_time": rng.uniform(5.0, 60.0)}),
+        (RP.ForceBoundsPenalty, {"scaling": rng.uniform(0.0, 100.0)}),
+        (RP.UnderZeroEnergyPenalty, {"scaling": rng.uniform(0.0, 5.0)}),
+        (RP.FinalTimeReward, {"expected_time": rng.uniform(10.0, 200.0)}),
+        (RP.UnderMinEnergyViolation, {"min_energy": rng.uniform(-5000.0, 0.0)}),
+        (RP.GoingBackwardsViolation, {}),
+    ]
+
+    if rng.random() < 0.5:
+        spec.append((RP.RiderAbilitiesViolation, {}))
+
+    # the order decides which severe penalty is reported when several are triggered at once
+    return [spec[i] for i in rng.permutation(len(spec))]
+
+
+def random_actions(rng: np.random.Generator, steps: int) -> np.ndarray:
+    """Returns steps actions, each held for a random number of steps so that the force ramps as well as jitters."""
+
+    actions = np.empty(steps, dtype=np.int64)
+    step = 0
+
+    while step < steps:
+        hold = int(rng.integers(1, 20))
+        actions[step : step + hold] = rng.integers(-11, 10)
+        step += hold
+
+    return actions
+
+
+def random_scenarios(count: int, seed: int = 0, steps: int = STEPS, compile_courses: bool = False) -> list[Scenario]:
+    """
+    Returns count random scenarios of at most steps actions each. The same seed always gives the same scenarios.
+    About four scenarios share each course and eight each reward spec, so the batched fast paths see shared and distinct ones.
+    If compile_courses is True the fast paths get compiled copies of the IdealCourses, see compiled_copy.
+    """
+
+    rng = np.random.default_rng(seed)
+
+    reference_courses = [random_course(rng) for _ in range(-(-count // 4))]
+    courses = [compiled_copy(course) for course in reference_courses] if compile_courses else reference_courses
+    reward_specs = [random_reward_spec(rng) for _ in range(-(-count // 8))]
+
+    scenarios = []
+
+    for _ in range(count):
+        course = rng.integers(len(courses))
+        scenarios.append(
+            Scenario(
+                random_rider(rng),
+                courses[course],
+                random_actions(rng, int(rng.integers(1, steps + 1))),
+                reward_specs[rng.integers(len(reward_specs))],
+                reference_course=reference_courses[course],
+            )
+        )
+
+    return scenarios
+
+
+def _apply_action(system: RCS.RiderCourseSystem, action: int) -> None:
+    """Sets the force of the next step from action like ExperienceReplay.build and steps the system forward with the reference integrator."""
+
+    rider = system.rider
+    min_force_change = (rider.BIKE_WEIGHT + rider.WEIGHT) * rider.MAX_JERK * system.DT * 1.0 / 10.0
+    rider.state.force = rider.last_state.force + min_force_change * action
+    system.euler_step_forward()
+
+
+def _state(system: RCS.RiderCourseSystem) -> tuple:
+    rs = system.rider.state
+    return (rs.distance, rs.velocity, rs.force, rs.an_energy, system.time)
+
+
+def _observation(system: RCS.RiderCourseSystem) -> np.ndarray:
+    return system.model_format_curr_state().cpu().numpy()
+
+
+def _scalar_reward(system: RCS.RiderCourseSystem, reward_bundle: RP.RewardBundle) -> tuple[float, str]:
+    """
+    Returns the reward of the current state from RewardBundle.reward and the reason the episode ends, "none" if it goes on.
+    A severe mistake gets SEVERE_MISTAKE_PENALTY, like in build, and its reason is the first penalty in the bundle which was triggered.
+    """
+
+    try:
+        reward = reward_bundle.reward()
+    except RP.SevereMistakeError:
+        for policy in reward_bundle.bundle:
+            if isinstance(policy, RP.SeverePenalty) and policy.penalty_conditions():
+                return reward_bundle.SEVERE_MISTAKE_PENALTY, type(policy).__name__
+
+    if system.rider.state.distance >= system.course.COURSE_LENGTH:
+        return reward, "finished"
+
+    return reward, "none"
+
+
+def reference_path(scenarios: list[Scenario]) -> list[Trajectory]:
+    """Runs each scenario one step at a time with euler_step_forward, model_format_curr_state and RewardBundle.reward, on its reference_course."""
+
+    trajectories = []
+
+    for scenario in scenarios:
+        system = scenario.make_system(reference=True)
+        reward_bundle = scenario.make_reward_bundle(system)
+
+        states, observations, rewards = [], [_observation(system)], []
+        reason = "none"
+
+        for action in scenario.actions:
+            _apply_action(system, action)
+            reward, reason = _scalar_reward(system, reward_bundle)
+
+            states.append(_state(system))
+            observations.append(_observation(system))
+            rewards.append(reward)
+
+            if reason != "none":
+                break
+
+        trajectories.append(Trajectory(states, observations, rewards, reason))
+
+    return trajectories
+
+
+@register_fast_path("BatchedRiderCourseSystem")
+def batched_system_path(scenarios: list[Scenario]) -> list[Trajectory]:
+    """
+    Runs the scenarios which share a reward spec together in one BatchedRiderCourseSystem with step_with_rewards,
+    which scores them with a CompiledRewardBundle.
+    """
+
+    trajectories = [None] * len(scenarios)
+
+    groups = {}
+    for index, scenario in enumerate(scenarios):
+        groups.setdefault(id(scenario.reward_spec), []).append(index)
+
+    for indices in groups.values():
+        group = [scenarios[i] for i in indices]
+        batched = BRCS.BatchedRiderCourseSystem([s.rider for s in group], [s.course for s in group], dt=DT, auto_reset=False)
+        reward_bundle = RP.CompiledRewardBundle(group[0].make_reward_bundle(group[0].make_system()))
+
+        lengths = np.array([s.actions.shape[0] for s in group])
+        actions = np.zeros((len(group), lengths.max()))
+        for row, scenario in enumerate(group):
+            actions[row, : lengths[row]] = scenario.actions
+
+        states = [[] for _ in group]
+        observations = [[row] for row in batched.observations()]
+        rewards = [[] for _ in group]
+        reasons = ["none"] * len(group)
+        running = np.ones(len(group), dtype=bool)
+
+        for step in range(actions.shape[1]):
+            running &= step < lengths
+
+            if not running.any():
+                break
+
+            # the environments which are done are still stepped and can blow up, their values are never read
+            with np.errstate(all="ignore"):
+                step_observations, step_rewards, dones, reason_codes = batched.step_with_rewards(actions[:, step], reward_bundle)
+
+            for row in np.flatnonzero(running):
+                states[row].append((batched.distance[row], batched.velocity[row], batched.force[row], batched.an_energy[row], batched.time[row]))
+                observations[row].append(step_observations[row])
+                rewards[row].append(step_rewards[row])
+
+                if dones[row]:
+                    reasons[row] = reward_bundle.REASONS[reason_codes[row]] if reason_codes[row] > 0 else "finished"
+                    running[row] = False
+
+        for row, index in enumerate(indices):
+            trajectories[index] = Trajectory(states[row], observations[row], rewards[row], reasons[row])
+
+    return trajectories
+
+
+@register_fast_path("ObservationEncoder")
+def observation_encoder_path(scenarios: list[Scenario]) -> list[Trajectory]:
+    """Runs the reference path but writes the observations with an ObservationEncoder, starting small so that it has to grow."""
+
+    trajectories = []
+
+    for scenario in scenarios:
+        system = scenario.make_system()
+        reward_bundle = scenario.make_reward_bundle(system)
+        encoder = OE.ObservationEncoder(system, capacity=4)
+        encoder.reset()
+
+        states, rewards = [], []
+        reason = "none"
+
+        for action in scenario.actions:
+            _apply_action(system, action)
+            reward, reason = _scalar_reward(system, reward_bundle)
+            encoder.encode()
+
+            states.append(_state(system))
+            rewards.append(reward)
+
+            if reason != "none":
+                break
+
+        trajectories.append(Trajectory(states, encoder.observations[: encoder.length], rewards, reason))
+
+    return trajectories
+
+
+@register_fast_path("CompiledRewardBundle")
+def compiled_reward_bundle_path(scenarios: list[Scenario]) -> list[Trajectory]:
+    """
+    Runs the reference physics until the rider finishes or the actions run out, then scores the whole trajectory
+    in one call of a CompiledRewardBundle on RewardStates.from_trajectory and cuts it at the first severe mistake.
+    """
+
+    trajectories = []
+
+    for scenario in scenarios:
+        system = scenario.make_system()
+        reward_bundle = RP.CompiledRewardBundle(scenario.make_reward_bundle(system))
+        start_distance = system.rider.state.distance
+
+        states, observations = [], [_observation(system)]
+
+        for action in scenario.actions:
+            _apply_action(system, action)
+
+            # past a severe mistake the rider can blow up, the reference has stopped before then
+            if not np.isfinite(_state(system)).all():
+                break
+
+            states.append(_state(system))
+            observations.append(_observation(system))
+
+            if system.rider.state.distance >= system.course.COURSE_LENGTH:
+                break
+
+        columns = np.array(states).T
+        reward_states = RP.RewardStates.from_trajectory(
+            start_distance,
+            distances=columns[0],
+            forces=columns[2],
+            an_energies=columns[3],
+            times=columns[4],
+            max_force=system.rider.MAX_FORCE,
+            course_length=system.course.COURSE_LENGTH,
+        )
+        rewards, terminated, reason_codes = reward_bundle(reward_states)
+
+        steps = len(states)
+        if terminated.any():
+            steps = int(np.argmax(terminated)) + 1
+            reason = reward_bundle.REASONS[reason_codes[steps - 1]]
+        elif columns[0, -1] >= system.course.COURSE_LENGTH:
+            reason = "finished"
+        else:
+            reason = "none"
+
+        trajectories.append(Trajectory(states[:steps], observations[: steps + 1], rewards[:steps], reason))
+
+    return trajectories
+
+
+def _first_mismatch(reference: np.ndarray, candidate: np.ndarray, rtol: float, atol: float) -> int | None:
+    """Returns the index of the first row of candidate which is not within rtol and atol of reference, None if they all are."""
+
+    close = np.isclose(candidate, reference, rtol=rtol, atol=atol, equal_nan=True)
+    if close.ndim > 1:
+        close = close.all(axis=tuple(range(1, close.ndim)))
+
+    if close.all():
+        return None
+
+    return int(np.argmin(close))
+
+
+def compare(reference: Trajectory, candidate: Trajectory, rtol: float = RTOL, atol: float = ATOL) -> list[str]:
+    """
+    Returns a description of every way candidate differs from reference, an empty list if they agree.
+    The states, observations and rewards must be within rtol and atol, the number of steps and the reason must be the same.
+    Only the steps that both trajectories took are compared value by value.
+    """
+
+    mismatches = []
+
+    steps = min(reference.rewards.shape[0], candidate.rewards.shape[0])
+
+    if candidate.rewards.shape[0] != reference.rewards.shape[0]:
+        mismatches.append(f"ended after {candidate.rewards.shape[0]} steps instead of {reference.rewards.shape[0]}")
+
+    if candidate.reason != reference.reason:
+        mismatches.append(f"ended with {candidate.reason} instead of {reference.reason}")
+
+    for column, field in enumerate(STATE_FIELDS):
+        step = _first_mismatch(reference.states[:steps, column], candidate.states[:steps, column], rtol, atol)
+        if step is not None:
+            mismatches.append(
+                f"{field} after step {step + 1} is {float(candidate.states[step, column])} instead of {float(reference.states[step, column])}"
+            )
+
+    row = _first_mismatch(reference.observations[: steps + 1], candidate.observations[: steps + 1], rtol, atol)
+    if row is not None:
+        column = int(np.argmin(np.isclose(candidate.observations[row], reference.observations[row], rtol=rtol, atol=atol, equal_nan=True)))
+        mismatches.append(
+            f"observation {column} after step {row} is {float(candidate.observations[row, column])} "
+            f"instead of {float(reference.observations[row, column])}"
+        )
+
+    step = _first_mismatch(reference.rewards[:steps], candidate.rewards[:steps], rtol, atol)
+    if step is not None:
+        mismatches.append(f"reward of step {step + 1} is {float(candidate.rewards[step])} instead of {float(reference.rewards[step])}")
+
+    return mismatches
+
+
+def check(
+    scenarios: list[Scenario],
+    fast_paths: list[str] | None = None,
+    rtol: float = RTOL,
+    atol: float = ATOL,
+    reference: list[Trajectory] | None = None,
+) -> dict[str, list[str]]:
+    """
+    Runs the reference path and each of fast_paths (every registered one if None) on scenarios and returns the mismatches of each
+    fast path, prefixed with the index of the scenario. A reference already run on scenarios can be passed in to skip running it again.
+    Each scenario is compared with atol widened by its course_error.
+    """
+
+    if fast_paths is None:
+        fast_paths = list(FAST_PATHS)
+
+    # the severe penalties print a message whenever they are checked, and riders that make them can overflow
+    with contextlib.redirect_stdout(io.StringIO()), np.errstate(all="ignore"):
+        if reference is None:
+            reference = reference_path(scenarios)
+
+        results = {}
+
+        for name in fast_paths:
+            candidates = FAST_PATHS[name](scenarios)
+
+            results[name] = [
+                f"scenario {index}: {mismatch}"
+                for index, (scenario, expected, candidate) in enumerate(zip(scenarios, reference, candidates))
+                for mismatch in compare(expected, candidate, rtol, atol + scenario.course_error)
+            ]
+
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Checks the fast paths of the simulation against the reference scalar path.")
+    parser.add_argument("--scenarios", type=int, default=SCENARIOS, help="the number of random scenarios")
+    parser.add_argument("--steps", type=int, default=STEPS, help="the most actions in a scenario")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--fast-path", action="append", choices=list(FAST_PATHS), help="a fast path to check, every one if not given")
+    parser.add_argument("--compile-courses", action="store_true", help="run the fast paths on compiled copies of the QuadraticHill courses")
+    parser.add_argument("--rtol", type=float, default=RTOL)
+    parser.add_argument("--atol", type=float, default=ATOL)
+    parser.add_argument("--show", type=int, default=10, help="the most mismatches printed per fast path")
+    args = parser.parse_args()
+
+    scenarios = random_scenarios(args.scenarios, args.seed, args.steps, args.compile_courses)
+
+    with contextlib.redirect_stdout(io.StringIO()), np.errstate(all="ignore"):
+        reference = reference_path(scenarios)
+
+    reasons = collections.Counter(trajectory.reason for trajectory in reference)
+    print(f"{len(scenarios)} scenarios, reference episodes ended with: " + ", ".join(f"{reason} {count}" for reason, count in reasons.most_common()))
+
+    results = check(scenarios, args.fast_path, args.rtol, args.atol, reference=reference)
+    failed = []
+
+    for name, mismatches in results.items():
+        if not mismatches:
+            print(f"{name:<28}agrees")
+            continue
+
+        failed.append(name)
+        print(f"{name:<28}{len(mismatches)} mismatch(es)")
+        for mismatch in mismatches[: args.show]:
+            print(f"    {mismatch}")
+
+    if failed:
+        print(f"\n{len(failed)} fast path(s) disagree with the reference: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,8 @@
 import torch
 import Class_NeuralNetwork as NN
 import Class_RiderState as RS
+import numpy as np
+import copy
 import random
 
 
@@ -15,6 +17,7 @@ def modified_print(model_format_state: torch.tensor, collapse_future_slopes: boo
 def epsilon_greedy_action(Q_network: NN.NeuralNetwork, model_state: torch.tensor, epsilon: float) -> int:
     """
     Returns an action selected by the epsilon greedy policy and the output of Q_network from model_state as the input. Smaller epsilon means smaller chance for a random action.
+    Q_network can also be a NumpyPolicy with model_state a NumPy array.
 
     Preconditions:
     - 0.0 <= epsilon <= 1.0
@@ -24,7 +27,7 @@ def epsilon_greedy_action(Q_network: NN.NeuralNetwork, model_state: torch.tensor
 
     if roll > epsilon:
         output = Q_network(model_state)
-        return torch.argmax(output).item() - 11
+        return int(output.argmax()) - 11
     else:
         return random.randrange(-10, 10, 1)
 
@@ -54,54 +57,118 @@ def random_sublist_plus_last(lst: list[any], size: int) -> list[any]:
     return sublst
 
 
+def Q_learning_targets(
+    Q_network: NN.NeuralNetwork,
+    T_network: NN.NeuralNetwork,
+    batch: list[torch.tensor],
+    gamma: float,
+    double_dqn: bool = False,
+    next_Q_values: torch.Tensor | None = None,
+) -> tuple[torch.tensor, torch.tensor]:
+    """
+    Returns (chosen Q values, target Q values) of the batch for a Q_learning model, each of shape (batch size,).
+    The chosen Q values are the Q_network outputs at the actions taken and carry gradients, the targets do not.
+
+    If the batch has a fifth tensor of dones, transitions which ended the episode are not bootstrapped from their result state.
+    If it has a sixth tensor of discounts (n-step returns, see ExperienceReplay.episode_tensors), the bootstrapped values are
+    scaled by them on top of gamma.
+    If double_dqn is True, the next action is chosen by Q_network and evaluated by T_network (Double DQN),
+    otherwise the max of T_network is used.
+    next_Q_values can be the precomputed T_network outputs at the result states (e.g. from ReplayBuffer.cached_target_Q_values),
+    in which case T_network is not run.
+    """
+
+    start_states = batch[0]
+    actions = batch[1]
+    rewards = batch[2]
+    result_states = batch[3]
+
+    # i need to change how i define the actions because i just minus 11 then add 11 later
+    action_indices = (actions + 11).to(torch.int64).unsqueeze(dim=1)
+
+    chosen_Q_network_Q_values = Q_network(start_states).gather(1, action_indices).squeeze(dim=1)
+
+    with torch.no_grad():
+        all_training_network_Q_values = T_network(result_states) if next_Q_values is None else next_Q_values
+
+        if double_dqn:
+            next_action_indices = Q_network(result_states).argmax(dim=1, keepdim=True)
+            chosen_training_network_Q_values = all_training_network_Q_values.gather(1, next_action_indices).squeeze(dim=1)
+        else:
+            chosen_training_network_Q_values = all_training_network_Q_values.max(dim=1).values
+
+        if len(batch) > 4:
+            chosen_training_network_Q_values = chosen_training_network_Q_values.masked_fill(batch[4], 0.0)
+
+        if len(batch) > 5:
+            chosen_training_network_Q_values = chosen_training_network_Q_values * batch[5]
+
+        # rewards can be stored in a wider dtype than the network works in
+        target_Q_values = (rewards + gamma * chosen_training_network_Q_values).to(chosen_Q_network_Q_values.dtype)
+
+    return chosen_Q_network_Q_values, target_Q_values
+
+
 def Q_learning_loss(
     Q_network: NN.NeuralNetwork,
     T_network: NN.NeuralNetwork,
     batch: list[torch.tensor],
     loss_function: torch.nn.modules.loss,
     gamma: float,
+    double_dqn: bool = False,
+    next_Q_values: torch.Tensor | None = None,
+    weights: torch.Tensor | None = None,
 ) -> torch.tensor:
     """
-    Returns the loss of the batch according to the loss calculation steps for a Q_learning model. Uses loss_function as the final loss function.
+    Returns the loss of the batch according to the loss calculation steps for a Q_learning model. Uses loss_function as the final loss function,
+    e.g. torch.nn.MSELoss() or torch.nn.HuberLoss() for the Huber variant.
+    See Q_learning_targets for the batch format, double_dqn and next_Q_values.
+    If weights are given (e.g. importance sampling weights from prioritized replay) the loss of each data point is weighted by them.
     the tensors in batch should already be on the gpu.
     """
 
-    device = "cuda" if torch.cuda.is_available() else "cpu"
+    chosen_Q_network_Q_values, target_Q_values = Q_learning_targets(Q_network, T_network, batch, gamma, double_dqn, next_Q_values)
 
-    batch_size = batch[0].size(dim=0)
+    if weights is not None:
+        return weighted_loss(elementwise(loss_function), chosen_Q_network_Q_values, target_Q_values, weights)
 
-    start_states = batch[0]
-    actions = batch[1]
-    rewards = batch[2]
-    result_states = batch[3]
+    return loss_function(chosen_Q_network_Q_values, target_Q_values)
 
-    all_Q_network_Q_values = Q_network(start_states)
 
-    # i need to change how i define the actions because i just minus 11 then add 11 later
-    action_indices = actions + 11
+def elementwise(loss_function: torch.nn.modules.loss) -> torch.nn.modules.loss:
+    """
+    Returns a copy of loss_function which does not reduce, so it returns the loss of each element. loss_function is left as it is.
+    Build it once and keep it rather than once per batch, e.g. in Trainer.__init__.
 
-    chosen_Q_network_Q_values = []
-    # choosing the q values that correspond to the action indices
-    for data_point in range(batch_size):
-        action_index = action_indices[data_point].item()
-        Q_value = all_Q_network_Q_values[data_point][action_index]
-        chosen_Q_network_Q_values.append(Q_value)
+    Preconditions:
+    - loss_function is a torch loss module, so it has a reduction attribute
+    """
 
-    chosen_Q_network_Q_values = torch.stack(chosen_Q_network_Q_values).to(device)
+    elementwise_loss_function = copy.copy(loss_function)
+    elementwise_loss_function.reduction = "none"
 
-    all_training_network_Q_values = T_network(result_states)
+    return elementwise_loss_function
 
-    chosen_training_network_Q_values = []
-    # choosing only the max q values
-    for data_point in range(batch_size):
-        Q_value = torch.max(all_training_network_Q_values[data_point])
-        chosen_training_network_Q_values.append(Q_value)
 
-    chosen_training_network_Q_values = torch.stack(chosen_training_network_Q_values).to(device)
+def weighted_loss(
+    elementwise_loss_function: torch.nn.modules.loss,
+    input: torch.tensor,
+    target: torch.tensor,
+    weights: torch.tensor,
+) -> torch.tensor:
+    """
+    Returns the mean of the loss of each element weighted by weights.
 
-    target_Q_values = rewards + gamma * chosen_training_network_Q_values
+    Preconditions:
+    - elementwise_loss_function does not reduce, e.g. it was made by elementwise
+    """
 
-    return loss_function(chosen_Q_network_Q_values, target_Q_values)
+    return (weights * elementwise_loss_function(input, target)).mean()
+
+
+def numpy_dtype(dtype: torch.dtype) -> np.dtype:
+    """Returns the NumPy dtype matching the torch dtype, e.g. np.float32 for torch.float32."""
+    return torch.empty(0, dtype=dtype).numpy().dtype
 
 
 def m_per_s(velocity: float) -> float:
@@ -5,10 +5,17 @@ import Class_RiderCourseSystem as RCS
 import Class_NeuralNetwork as NN
 import Helper_Functions as HF
 import Class_ExperienceReplay as ER
+import Class_ReplayBuffer as RB
+import Class_CompactReplayBuffer as CR
+import Classes_PrioritizedReplay as PR
+import Class_RolloutWorkers as RW
+import Class_RolloutThread as RT
+import Class_Trainer as T
+import Class_PlotService as PS
+import Class_Metrics as M
 import Classes_Rewards_Penalties as RP
 import copy
 import torch
-import matplotlib.pyplot as plt
 import numpy as np
 import time
 
@@ -16,7 +23,38 @@ device = "cuda" if torch.cuda.is_available() else "cpu"
 
 START_EPSILON = 0.8
 EPOCHS = 10000
-EPOCHS_BETWEEN_T_NET_UPDATES = 100
+GAMMA = 0.1
+N_STEP = 1  # data points each stored return looks ahead before bootstrapping
+LAMBDA = 1.0  # below 1 mixes the 1 to N_STEP step returns like a truncated lambda-return
+GRADIENT_STEPS_BETWEEN_T_NET_UPDATES = 100
+SOFT_TARGET_UPDATES = False  # True moves the target network a fraction TAU towards the Q network after every gradient step instead
+TAU = 0.005
+REPLAY_CAPACITY = 100000
+PRIORITIZED_REPLAY = False  # sample transitions by the size of their TD errors instead of uniformly
+PRIORITY_ALPHA = 0.6
+COMPACT_REPLAY = False  # store only the physical part of each state and rebuild the observations of sampled batches (uniform replay only)
+START_BETA = 0.4  # annealed to 1.0 over the epochs
+BATCH_SIZE = 30
+LEARNING_STARTS = 1000  # transitions in the replay buffer before any gradient steps are taken
+UPDATES_PER_STEP = 0.25  # gradient steps per environment step
+UPDATE_EVERY = 4  # environment steps between updates when they are interleaved with the rollout
+INTERLEAVE_UPDATES = True
+CACHE_TARGETS = True  # reuse the target network outputs of sampled transitions until the target network changes
+DOUBLE_DQN = False
+HUBER_LOSS = False
+DTYPE = torch.float32  # of the observations, replay buffer and network. The physics is always integrated in float64
+LAYER_WIDTHS = [17, 18, 19, 20, 21, 21]  # input, hidden layers, output
+ACTIVATION = "relu"
+COMPILE_BACKEND = None  # None trains through the network as is, "compile" (torch.compile) or "trace" (TorchScript)
+ACTION_REPEAT = 1  # physics steps each chosen action is held for
+INFERENCE_BACKEND = "numpy"  # what picks the actions during rollouts, "torch" or "numpy"
+NUM_ROLLOUT_WORKERS = 0  # 0 builds the episodes in this process, otherwise they are built by this many worker processes
+ROLLOUT_THREAD = False  # True builds the episodes in a background thread of this process instead, while this thread trains
+MAX_POLICY_STALENESS = 1  # publishes the rollout thread's policy can fall behind before it refreshes
+EPOCHS_BETWEEN_WEIGHT_PUBLISHES = 10
+PLOT_MODE = "live"  # plotted by a background process, "live" in a window or "png" into PLOT_DIRECTORY. None plots nothing and never imports matplotlib
+PLOT_DIRECTORY = "plots"
+METRICS_PATH = None  # e.g. "metrics.csv" or "metrics.jsonl" to keep the phase timings and throughputs printed every 100 epochs
 # EPSILON_CHANGE_EPOCH_1 = 3700
 # EPSILON_CHANGE_EPOCH_2 = 4700
 
@@ -38,26 +76,16 @@ rider = R.Rider(
 
 course = C.QuadraticHill(course_length=500.0, end_percentage=11.0)
 
-system = RCS.RiderCourseSystem(rider, course)
+system = RCS.RiderCourseSystem(rider, course, dtype=DTYPE)
 
 
 # Setting up the neural networks:
 
-Q_network = NN.NeuralNetwork(
-    input_size=17,
-    hidden1_size=18,
-    hidden2_size=19,
-    hidden3_size=20,
-    hidden4_size=21,
-    output_size=21,
-)
+Q_network = NN.MLP(LAYER_WIDTHS, activation=ACTIVATION, dtype=DTYPE)
 
-Q_network.to(torch.float64)
 Q_network.to(device)
 
-T_network = copy.deepcopy(Q_network)
-
-loss_function = torch.nn.MSELoss()
+loss_function = torch.nn.HuberLoss() if HUBER_LOSS else torch.nn.MSELoss()
 
 optimizer = torch.optim.SGD(Q_network.parameters(), lr=0.001)
 
@@ -81,55 +109,139 @@ reward_bundle = RP.RewardBundle(
 
 # Creating the experience replay
 
-experience_replay = ER.ExperienceReplay(system, Q_network, reward_bundle, epsilon=START_EPSILON)
-
-losses = []
+# times the phases of the rollout and of the gradient steps, the trainer shares the one of the experience replay
+metrics = M.Metrics(METRICS_PATH)
+
+if PRIORITIZED_REPLAY:
+    replay_buffer = PR.PrioritizedReplayBuffer(REPLAY_CAPACITY, dtype=DTYPE, alpha=PRIORITY_ALPHA, beta=START_BETA)
+elif COMPACT_REPLAY:
+    replay_buffer = CR.CompactReplayBuffer(REPLAY_CAPACITY, system, dtype=DTYPE)
+else:
+    replay_buffer = RB.ReplayBuffer(REPLAY_CAPACITY, dtype=DTYPE)
+
+experience_replay = ER.ExperienceReplay(
+    system,
+    Q_network,
+    reward_bundle,
+    epsilon=START_EPSILON,
+    replay_buffer=replay_buffer,
+    inference_backend=INFERENCE_BACKEND,
+    action_repeat=ACTION_REPEAT,
+    n_step=N_STEP,
+    gamma=GAMMA,
+    lam=LAMBDA,
+    metrics=metrics,
+)
 
-start_time = time.time()
+trainer = T.Trainer(
+    experience_replay,
+    Q_network,
+    optimizer,
+    loss_function,
+    gamma=GAMMA,
+    batch_size=BATCH_SIZE,
+    learning_starts=LEARNING_STARTS,
+    updates_per_step=UPDATES_PER_STEP,
+    update_every=UPDATE_EVERY,
+    interleave=INTERLEAVE_UPDATES,
+    t_net_update_every=GRADIENT_STEPS_BETWEEN_T_NET_UPDATES,
+    double_dqn=DOUBLE_DQN,
+    cache_targets=CACHE_TARGETS,
+    soft_updates=SOFT_TARGET_UPDATES,
+    tau=TAU,
+    Q_forward=Q_network.compiled(COMPILE_BACKEND, batch_size=BATCH_SIZE) if COMPILE_BACKEND is not None else None,
+)
 
-for epoch in range(EPOCHS):
 
-    experience_replay.build()
+def make_worker_experience_replay(network: NN.NeuralNetwork) -> ER.ExperienceReplay:
+    """Gives each rollout worker, or the rollout thread, its own copy of the system and reward bundle. The changes to reward4.CUTOFF_TIME below are sent with set_cutoff_time."""
+    worker_system, worker_reward_bundle = copy.deepcopy((system, reward_bundle))
+    return ER.ExperienceReplay(
+        worker_system,
+        network,
+        worker_reward_bundle,
+        epsilon=START_EPSILON,
+        inference_backend=INFERENCE_BACKEND,
+        action_repeat=ACTION_REPEAT,
+        n_step=N_STEP,
+        gamma=GAMMA,
+        lam=LAMBDA,
+    )
 
-    # getting a batch from the expertience replay and making sure the batch size is valid.
-    batch_size = 30
 
-    if len(experience_replay.experience_library) < batch_size:
-        batch_size = len(experience_replay.experience_library)
+# forked before the rollout thread or workers start, so the plotting process never inherits a running thread's locks
+plotter = PS.PlotService(PLOT_MODE, PLOT_DIRECTORY) if PLOT_MODE is not None else None
 
-    batch = experience_replay.random_batch_plus_last(batch_size=batch_size)
+# the episodes are built in the background by rollout_pool, either worker processes or one thread of this process
+BACKGROUND_ROLLOUTS = ROLLOUT_THREAD or NUM_ROLLOUT_WORKERS > 0
 
-    loss = HF.Q_learning_loss(Q_network, T_network, batch, loss_function, gamma=0.1)
+if ROLLOUT_THREAD:
+    rollout_pool = RT.RolloutThread(make_worker_experience_replay, Q_network, max_staleness=MAX_POLICY_STALENESS, epsilon=START_EPSILON)
+    rollout_pool.start()
+elif NUM_ROLLOUT_WORKERS > 0:
+    rollout_pool = RW.RolloutWorkerPool(make_worker_experience_replay, Q_network, NUM_ROLLOUT_WORKERS, epsilon=START_EPSILON, dtype=DTYPE)
+    rollout_pool.start()
 
-    optimizer.zero_grad()
+losses = []
 
-    loss.backward()
+start_time = time.time()
 
-    optimizer.step()
+for epoch in range(EPOCHS):
 
-    if epoch % EPOCHS_BETWEEN_T_NET_UPDATES == 0:
-        T_network = copy.deepcopy(Q_network)
+    # an epoch is one episode, or everything the background rollouts have finished since the last epoch.
+    # the trainer takes the gradient steps which the new environment steps earned, on batches from the replay buffer.
+    if BACKGROUND_ROLLOUTS:
+        added = rollout_pool.collect(replay_buffer, block=True)
+        metrics.count("transitions", added)
+        metrics.count("env_steps", rollout_pool.last_env_steps)
+        trainer.record_steps(added)
+    else:
+        trainer.train_episode()
 
     # Changing the epsilon greedy value as the training progresses:
     experience_replay.EPSILON = START_EPSILON * (1.0 - epoch / EPOCHS)
 
+    if PRIORITIZED_REPLAY:
+        replay_buffer.BETA = START_BETA + (1.0 - START_BETA) * epoch / EPOCHS
+
+    if BACKGROUND_ROLLOUTS:
+        rollout_pool.set_epsilon(experience_replay.EPSILON)
+        rollout_pool.set_cutoff_time(reward4.CUTOFF_TIME)
+        if epoch % EPOCHS_BETWEEN_WEIGHT_PUBLISHES == 0:
+            rollout_pool.publish(Q_network)
+
     # printing stuff:
     # print(loss.item())
 
     # losses.append(loss.item())
 
-    if epoch % EPOCHS_BETWEEN_T_NET_UPDATES == 0:
-        print(f"Epoch: {epoch}. Current Loss: {loss.item()} Updating training network.")
-        losses.append(loss.item())
+    if epoch % 100 == 0:
+        # the only point where the loss is brought back from the device
+        loss = trainer.last_loss.item() if trainer.last_loss is not None else None
+        if loss is not None:
+            print(f"Epoch: {epoch}. Gradient steps: {trainer.gradient_steps}. Current Loss: {loss}")
+            losses.append(loss)
         reward4.CUTOFF_TIME += 50
 
-    if epoch % 100 == 0:
-        plt.close()
-        experience_replay.plot()
+        if plotter is not None:
+            if BACKGROUND_ROLLOUTS:
+                # the workers' episodes are not kept, so build one here to have something to plot
+                experience_replay.build()
+            with metrics.time("plotting"):
+                plotter.plot_rollout(epoch, *experience_replay.trajectory())
+
+        row = metrics.row(epoch=epoch, loss=loss)
+        print(
+            f"    {row['env_steps_per_second']:.0f} steps/s, {row['transitions_per_second']:.0f} transitions/s, "
+            f"{row['gradient_steps_per_second']:.0f} gradient steps/s"
+        )
 
 print(f"Time taken: {time.time()-start_time} seconds")
 
+if BACKGROUND_ROLLOUTS:
+    rollout_pool.close()
+
+metrics.close()
 
-fig, ax = plt.subplots()
-ax.plot(np.array(losses))
-plt.show()
+if plotter is not None:
+    plotter.close(losses=np.array(losses))
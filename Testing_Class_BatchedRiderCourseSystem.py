@@ -0,0 +1,90 @@
+from Class_BatchedRiderCourseSystem import *
+from Class_RiderCourseSystem import *
+from Class_Rider import *
+from Classes_Courses import *
+from Class_RiderState import *
+import copy
+import random
+
+
+def make_rider(weight: float, initial_velocity: float) -> Rider:
+    initial_state = RiderState(distance=0.0, velocity=initial_velocity, force=100.0, an_energy=50000.0)
+
+    return Rider(
+        initial_state,
+        weight=weight,
+        bike_weight=7.0,
+        cross_area=0.4,
+        drag_coef=0.7,
+        max_force=1000.0,
+        max_jerk=1.0,
+        avg_velocity=7.0,
+        avg_velocity_on_flat=7.5,
+    )
+
+
+def test_BatchedRiderCourseSystem_step() -> None:
+    """Testing BatchedRiderCourseSystem.step against RiderCourseSystem.euler_step_forward for riders on different courses."""
+
+    riders = [make_rider(70.0, 6.0), make_rider(87.0, 7.0), make_rider(95.0, 8.0)]
+    hill = QuadraticHill(course_length=300.0, end_percentage=11.0)
+    courses = [hill, QuadraticHill(course_length=500.0, end_percentage=4.0), hill]
+
+    batched = BatchedRiderCourseSystem(riders, courses, auto_reset=False)
+    systems = [RiderCourseSystem(copy.deepcopy(r), c) for r, c in zip(riders, courses)]
+
+    random.seed(0)
+    passed = True
+
+    for step in range(50):
+        actions = np.array([random.randrange(-10, 10) for _ in systems], dtype=float)
+
+        for system, action in zip(systems, actions):
+            weight = system.rider.BIKE_WEIGHT + system.rider.WEIGHT
+            min_force_change = weight * system.rider.MAX_JERK * system.DT * 1.0 / 10.0
+            system.rider.state.force = system.rider.last_state.force + min_force_change * action
+            system.euler_step_forward()
+
+        observations, dones = batched.step(actions)
+
+        for i, system in enumerate(systems):
+            passed = passed and np.allclose(observations[i], system.model_format_curr_state().numpy(), rtol=1e-12, atol=1e-12)
+            passed = passed and abs(batched.an_energy[i] - system.rider.state.an_energy) < 1e-9
+
+    try:
+        assert passed
+        assert not dones.any()
+    except AssertionError:
+        print("test_BatchedRiderCourseSystem_step -- FAIL! --")
+    else:
+        print("test_BatchedRiderCourseSystem_step -- pass")
+
+
+test_BatchedRiderCourseSystem_step()
+
+
+def test_BatchedRiderCourseSystem_auto_reset() -> None:
+    """Testing that BatchedRiderCourseSystem.step resets only the environments which finished their course."""
+
+    riders = [make_rider(80.0, 10.0), make_rider(80.0, 10.0)]
+    courses = [QuadraticHill(course_length=4.5, end_percentage=1.0), QuadraticHill(course_length=500.0, end_percentage=1.0)]
+
+    batched = BatchedRiderCourseSystem(riders, courses)
+
+    for step in range(5):
+        observations, dones = batched.step(np.zeros(2))
+
+    try:
+        assert list(dones) == [True, False]
+        assert batched.distance[0] == 0.0
+        assert batched.time[0] == 0.0
+        assert batched.distance[1] > 0.0
+        assert batched.final_observations[0, 0] >= 1.0
+        assert observations[0, 0] == -1.0
+    except AssertionError:
+        print("test_BatchedRiderCourseSystem_auto_reset -- FAIL! --")
+    else:
+        print("test_BatchedRiderCourseSystem_auto_reset -- pass")
+
+
+test_BatchedRiderCourseSystem_auto_reset()
@@ -0,0 +1,63 @@
+from Class_CompactReplayBuffer import *
+from Class_ExperienceReplay import *
+from Class_Rider import *
+from Classes_Courses import *
+from Classes_Rewards_Penalties import *
+from Class_RiderState import *
+import contextlib
+import io
+import random
+
+
+def test_CompactReplayBuffer_gather() -> None:
+    """Testing that a CompactReplayBuffer gives back the same transitions as a ReplayBuffer, in a fraction of the memory."""
+
+    random.seed(0)
+
+    initial_state = RiderState(distance=0.0, velocity=7.0, force=100.0, an_energy=50000.0)
+
+    rider = Rider(
+        initial_state,
+        weight=87.0,
+        bike_weight=7.0,
+        cross_area=0.4,
+        drag_coef=0.7,
+        max_force=1000.0,
+        max_jerk=1.0,
+        avg_velocity=7.0,
+        avg_velocity_on_flat=7.5,
+    )
+
+    system = RCS.RiderCourseSystem(rider, QuadraticHill(course_length=100.0, end_percentage=5.0))
+    reward_bundle = RewardBundle(
+        [EvenMilestones(system, base_reward=3.0, spacing=10.0), CompletionReward(system, completion_reward=5.0), TimeViolation(system, cutoff_time=50.0)],
+        severe_mistake_penalty=-100.0,
+    )
+
+    Q_network = NN.NeuralNetwork(17, 18, 19, 20, 21, 21).to(torch.float64)
+    experience_replay = ExperienceReplay(system, Q_network, reward_bundle, epsilon=1.0)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        experience_replay.build()
+
+    full = RB.ReplayBuffer(1000, device="cpu")
+    compact = CompactReplayBuffer(1000, system, device="cpu")
+
+    full.add_batch(*experience_replay.episode_tensors())
+    compact.add_batch(*experience_replay.episode_tensors())
+
+    indices = torch.randint(0, len(full), (64,))
+
+    try:
+        assert len(compact) == len(full)
+        for full_tensor, compact_tensor in zip(full.gather(indices), compact.gather(indices)):
+            assert torch.allclose(full_tensor.to(torch.float64), compact_tensor.to(torch.float64), atol=1e-5)
+        assert compact.gather(indices)[0].dtype == torch.float64
+        assert full.nbytes() / compact.nbytes() > 5.0
+    except AssertionError:
+        print("test_CompactReplayBuffer_gather -- FAIL! --")
+    else:
+        print("test_CompactReplayBuffer_gather -- pass")
+
+
+test_CompactReplayBuffer_gather()
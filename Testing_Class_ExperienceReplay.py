@@ -0,0 +1,211 @@
+from Class_ExperienceReplay import *
+from Class_RiderCourseSystem import *
+from Class_Rider import *
+from Classes_Courses import *
+from Classes_Rewards_Penalties import *
+from Class_RiderState import *
+import contextlib
+import io
+import math
+import random
+
+
+def make_experience_replay(action_repeat: int = 1, **kwargs) -> ExperienceReplay:
+    """Returns an experience replay on a short course which picks random actions."""
+
+    initial_state = RiderState(distance=0.0, velocity=7.0, force=100.0, an_energy=50000.0)
+
+    rider = Rider(
+        initial_state,
+        weight=87.0,
+        bike_weight=7.0,
+        cross_area=0.4,
+        drag_coef=0.7,
+        max_force=1000.0,
+        max_jerk=1.0,
+        avg_velocity=7.0,
+        avg_velocity_on_flat=7.5,
+    )
+
+    system = RiderCourseSystem(rider, QuadraticHill(course_length=100.0, end_percentage=5.0))
+    reward_bundle = RewardBundle(
+        [EvenMilestones(system, base_reward=3.0, spacing=10.0), CompletionReward(system, completion_reward=5.0), TimeViolation(system, cutoff_time=50.0)],
+        severe_mistake_penalty=-100.0,
+    )
+
+    Q_network = NN.NeuralNetwork(17, 18, 19, 20, 21, 21).to(torch.float64)
+
+    return ExperienceReplay(system, Q_network, reward_bundle, epsilon=1.0, action_repeat=action_repeat, **kwargs)
+
+
+def test_ExperienceReplay_action_repeat() -> None:
+    """Testing that with action_repeat each data point covers that many steps and the force ramps by the action every step."""
+
+    random.seed(0)
+
+    experience_replay = make_experience_replay(action_repeat=4)
+    system = experience_replay.system
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        experience_replay.build()
+
+    library = experience_replay.experience_library
+    min_force_change = (system.rider.BIKE_WEIGHT + system.rider.WEIGHT) * system.rider.MAX_JERK * system.DT / 10.0
+
+    try:
+        assert library[-1].done
+        assert abs(system.time - system.DT * 4 * len(library)) < 4 * system.DT
+        for data_point in library[:-1]:
+            force_change = (data_point.result_state[2] - data_point.start_state[2]).item() * system.rider.MAX_FORCE
+            assert abs(force_change - 4 * min_force_change * data_point.action) < 1e-6
+    except AssertionError:
+        print("test_ExperienceReplay_action_repeat -- FAIL! --")
+    else:
+        print("test_ExperienceReplay_action_repeat -- pass")
+
+
+test_ExperienceReplay_action_repeat()
+
+
+def test_ExperienceReplay_action_repeat_rewards() -> None:
+    """Testing that holding action 0 for 5 steps gives the same episode and total reward as choosing it every step."""
+
+    # always choosing action 0 (output index 11)
+    Q_values = np.zeros(21)
+    Q_values[11] = 1.0
+
+    repeated = make_experience_replay(action_repeat=5)
+    single = make_experience_replay(action_repeat=1)
+
+    for experience_replay in (repeated, single):
+        experience_replay.EPSILON = 0.0
+        experience_replay.policy = lambda model_state: Q_values
+        with contextlib.redirect_stdout(io.StringIO()):
+            experience_replay.build()
+
+    repeated_total = sum(data_point.reward for data_point in repeated.experience_library)
+    single_total = sum(data_point.reward for data_point in single.experience_library)
+
+    try:
+        assert abs(repeated_total - single_total) < 1e-9
+        assert repeated.system.time == single.system.time
+        assert len(repeated.experience_library) == math.ceil(len(single.experience_library) / 5)
+        assert torch.equal(repeated.experience_library[-1].result_state, single.experience_library[-1].result_state)
+    except AssertionError:
+        print("test_ExperienceReplay_action_repeat_rewards -- FAIL! --")
+    else:
+        print("test_ExperienceReplay_action_repeat_rewards -- pass")
+
+
+test_ExperienceReplay_action_repeat_rewards()
+
+
+def test_ExperienceReplay_n_step() -> None:
+    """Testing the vectorized lambda-returns of episode_tensors against the definition, one data point at a time."""
+
+    random.seed(0)
+
+    n, gamma, lam = 4, 0.9, 0.5
+    experience_replay = make_experience_replay(n_step=n, gamma=gamma, lam=lam)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        experience_replay.build()
+
+    library = experience_replay.experience_library
+    count = len(library)
+    states = experience_replay.encoder.states
+
+    with torch.no_grad():
+        values = experience_replay.Q_network(states).max(dim=1).values
+
+    # flushed in two parts, like the replay buffer would get them during the episode
+    middle = count - n
+    parts = [experience_replay.episode_tensors(start=0, end=middle), experience_replay.episode_tensors(start=middle)]
+    returns, bootstrap_states, dones, discounts = (torch.cat([part[i] for part in parts]) for i in (2, 3, 4, 5))
+
+    try:
+        assert library[-1].done
+        for t in range(count):
+            steps = min(n, count - t)
+            expected = sum((gamma * lam) ** j * library[t + j].reward for j in range(steps))
+            expected += sum(gamma * (1 - lam) * (gamma * lam) ** j * values[t + j + 1].item() for j in range(steps - 1))
+            assert abs(returns[t].item() - expected) < 1e-9
+            assert torch.equal(bootstrap_states[t], states[t + steps])
+            assert dones[t].item() == (t + n >= count)
+            assert discounts[t].item() == (0.0 if t + n >= count else (gamma * lam) ** (n - 1))
+
+        # one step returns are the rewards and result states themselves
+        one_step = make_experience_replay(n_step=1)
+        random.seed(0)
+        with contextlib.redirect_stdout(io.StringIO()):
+            one_step.build()
+        tensors = one_step.episode_tensors()
+        assert torch.equal(tensors[2], torch.tensor([data_point.reward for data_point in one_step.experience_library], dtype=torch.float64))
+        assert torch.equal(tensors[3], torch.stack([data_point.result_state for data_point in one_step.experience_library]))
+        assert torch.equal(tensors[5], (~tensors[4]).to(torch.float64))
+    except AssertionError:
+        print("test_ExperienceReplay_n_step -- FAIL! --")
+    else:
+        print("test_ExperienceReplay_n_step -- pass")
+
+
+test_ExperienceReplay_n_step()
+
+
+def test_ExperienceReplay_trajectory() -> None:
+    """Testing that trajectory gives the same physical values as undoing the model format of each data point."""
+
+    random.seed(0)
+
+    experience_replay = make_experience_replay()
+    with contextlib.redirect_stdout(io.StringIO()):
+        experience_replay.build()
+
+    r = experience_replay.system.rider
+    c = experience_replay.system.course
+    distances, forces, energies = experience_replay.trajectory()
+
+    try:
+        assert distances.shape == forces.shape == energies.shape == (len(experience_replay.experience_library),)
+        for i, data_point in enumerate(experience_replay.experience_library):
+            assert abs(distances[i] - (data_point.start_state[0].item() * 0.5 * c.COURSE_LENGTH + 0.5 * c.COURSE_LENGTH)) < 1e-9
+            assert abs(forces[i] - (data_point.result_state[2].item() * r.MAX_FORCE + r.AVG_FORCE)) < 1e-9
+            assert abs(energies[i] - (data_point.start_state[3].item() * 0.5 * r.ENERGY_BUDGET + 0.5 * r.ENERGY_BUDGET)) < 1e-6
+    except AssertionError:
+        print("test_ExperienceReplay_trajectory -- FAIL! --")
+    else:
+        print("test_ExperienceReplay_trajectory -- pass")
+
+
+test_ExperienceReplay_trajectory()
+
+
+def test_ExperienceReplay_plot() -> None:
+    """Testing that plot draws the rollout of the last build, under the non-interactive Agg backend."""
+
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    random.seed(0)
+
+    experience_replay = make_experience_replay()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        experience_replay.build()
+
+    try:
+        experience_replay.plot()
+        distances = plt.gcf().axes[0].lines[0].get_xdata()
+        assert len(plt.get_fignums()) == 1
+        assert len(distances) == len(experience_replay.experience_library)
+    except (AssertionError, NameError):
+        print("test_ExperienceReplay_plot -- FAIL! --")
+    else:
+        print("test_ExperienceReplay_plot -- pass")
+    finally:
+        plt.close("all")
+
+
+test_ExperienceReplay_plot()
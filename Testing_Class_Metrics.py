@@ -0,0 +1,53 @@
+from Class_Metrics import *
+import os
+import tempfile
+
+
+def test_Metrics_row() -> None:
+    """Testing that a row holds the phase times and counts of its interval only, and that the rows are written to CSV and JSON lines."""
+
+    directory = tempfile.mkdtemp()
+    csv_path = os.path.join(directory, "metrics.csv")
+    jsonl_path = os.path.join(directory, "metrics.jsonl")
+
+    rows = {}
+    for path in (csv_path, jsonl_path):
+        metrics = Metrics(path)
+
+        with metrics.time("physics"):
+            time.sleep(0.01)
+        metrics.count("env_steps", 3)
+        first = metrics.row(epoch=0)
+
+        metrics.count("gradient_steps")
+        second = metrics.row(epoch=1)
+        metrics.close()
+
+        rows[path] = (first, second)
+
+    disabled = Metrics(enabled=False)
+    with disabled.time("physics"):
+        time.sleep(0.01)
+    disabled.count("env_steps")
+
+    first, second = rows[csv_path]
+
+    try:
+        assert first["physics_seconds"] >= 0.01
+        assert abs(first["env_steps_per_second"] - 3 / first["seconds"]) < 1e-9
+        assert first["other_seconds"] >= 0.0
+        assert abs(sum([first[f"{phase}_seconds"] for phase in Metrics.PHASES]) + first["other_seconds"] - first["seconds"]) < 1e-9
+        assert second["physics_seconds"] == 0.0 and second["env_steps"] == 0 and second["gradient_steps"] == 1
+        with open(csv_path) as file:
+            lines = file.read().splitlines()
+        assert lines[0].startswith("epoch,seconds,env_steps,") and len(lines) == 3
+        with open(jsonl_path) as file:
+            assert [json.loads(line)["epoch"] for line in file] == [0, 1]
+        assert disabled.row()["physics_seconds"] == 0.0 and disabled.counters["env_steps"] == 0
+    except AssertionError:
+        print("test_Metrics_row -- FAIL! --")
+    else:
+        print("test_Metrics_row -- pass")
+
+
+test_Metrics_row()
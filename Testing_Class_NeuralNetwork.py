@@ -0,0 +1,75 @@
+from Class_NeuralNetwork import *
+import os
+import tempfile
+
+
+def test_NeuralNetwork_state_dict() -> None:
+    """Testing that NeuralNetwork is an MLP with the same layers, so the state dicts of the two are interchangeable."""
+
+    torch.manual_seed(0)
+
+    network = NeuralNetwork(17, 18, 19, 20, 21, 21).to(torch.float64)
+    mlp = MLP([17, 18, 19, 20, 21, 21], activation="relu", dtype=torch.float64)
+    mlp.load_state_dict(network.state_dict())
+
+    states = torch.randn(10, 17, dtype=torch.float64)
+
+    try:
+        assert list(network.state_dict().keys()) == [f"layer_{i}.{name}" for i in range(1, 6) for name in ("weight", "bias")]
+        assert torch.equal(network(states), mlp(states))
+        assert mlp.layer_1.weight.dtype == torch.float64
+    except AssertionError:
+        print("test_NeuralNetwork_state_dict -- FAIL! --")
+    else:
+        print("test_NeuralNetwork_state_dict -- pass")
+
+
+test_NeuralNetwork_state_dict()
+
+
+def test_MLP_compiled_trace() -> None:
+    """Testing that a traced forward pass gives the same outputs and trains the parameters of the network it came from."""
+
+    torch.manual_seed(1)
+
+    mlp = MLP([17, 32, 21], activation="tanh")
+    traced = mlp.compiled("trace", batch_size=8)
+
+    states = torch.randn(5, 17, dtype=torch.float64)
+    traced(states).sum().backward()
+
+    try:
+        assert torch.allclose(traced(states), mlp(states))
+        assert mlp.layer_1.weight.grad is not None
+    except AssertionError:
+        print("test_MLP_compiled_trace -- FAIL! --")
+    else:
+        print("test_MLP_compiled_trace -- pass")
+
+
+test_MLP_compiled_trace()
+
+
+def test_MLP_export_frozen() -> None:
+    """Testing that the frozen export saves, loads and gives the same outputs, for one state and for a batch."""
+
+    torch.manual_seed(2)
+
+    mlp = MLP([17, 24, 24, 21], activation="leaky_relu")
+    path = os.path.join(tempfile.mkdtemp(), "Q_network.pt")
+    mlp.export_frozen(path)
+    loaded = torch.jit.load(path)
+
+    states = torch.randn(6, 17, dtype=torch.float64)
+
+    try:
+        assert mlp.training
+        assert torch.allclose(loaded(states), mlp(states))
+        assert torch.allclose(loaded(states[0]), mlp(states[0]))
+    except AssertionError:
+        print("test_MLP_export_frozen -- FAIL! --")
+    else:
+        print("test_MLP_export_frozen -- pass")
+
+
+test_MLP_export_frozen()
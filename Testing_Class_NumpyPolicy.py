@@ -0,0 +1,83 @@
+from Class_NumpyPolicy import *
+
+
+def test_NumpyPolicy_forward() -> None:
+    """Testing NumpyPolicy against the forward pass of the NeuralNetwork it mirrors."""
+
+    torch.manual_seed(0)
+
+    Q_network = NN.NeuralNetwork(17, 18, 19, 20, 21, 21).to(torch.float64)
+    policy = NumpyPolicy(Q_network)
+
+    states = torch.randn(100, 17, dtype=torch.float64)
+
+    try:
+        for state in states:
+            expected = Q_network(state).detach().numpy()
+            assert np.allclose(policy(state.numpy()), expected, rtol=1e-12, atol=1e-12)
+            assert np.argmax(policy(state)) == torch.argmax(Q_network(state)).item()
+    except AssertionError:
+        print("test_NumpyPolicy_forward -- FAIL! --")
+    else:
+        print("test_NumpyPolicy_forward -- pass")
+
+
+test_NumpyPolicy_forward()
+
+
+def test_NumpyPolicy_resync() -> None:
+    """Testing that NumpyPolicy picks up weights changed by an optimizer step and by copy_."""
+
+    torch.manual_seed(1)
+
+    Q_network = NN.NeuralNetwork(17, 18, 19, 20, 21, 21).to(torch.float64)
+    other_network = NN.NeuralNetwork(17, 18, 19, 20, 21, 21).to(torch.float64)
+    policy = NumpyPolicy(Q_network)
+    optimizer = torch.optim.SGD(Q_network.parameters(), lr=0.1)
+
+    state = torch.randn(17, dtype=torch.float64)
+    before = policy(state).copy()
+
+    Q_network(state).sum().backward()
+    optimizer.step()
+    after_step = policy(state).copy()
+    expected_after_step = Q_network(state).detach().numpy()
+
+    with torch.no_grad():
+        for parameter, other in zip(Q_network.parameters(), other_network.parameters()):
+            parameter.copy_(other)
+    after_copy = policy(state).copy()
+
+    try:
+        assert not np.allclose(before, after_step)
+        assert np.allclose(after_step, expected_after_step, rtol=1e-12, atol=1e-12)
+        assert np.allclose(after_copy, other_network(state).detach().numpy(), rtol=1e-12, atol=1e-12)
+    except AssertionError:
+        print("test_NumpyPolicy_resync -- FAIL! --")
+    else:
+        print("test_NumpyPolicy_resync -- pass")
+
+
+test_NumpyPolicy_resync()
+
+
+def test_NumpyPolicy_activations() -> None:
+    """Testing NumpyPolicy on MLPs with each of the activations."""
+
+    torch.manual_seed(2)
+
+    states = torch.randn(20, 17, dtype=torch.float64)
+
+    try:
+        for activation in NN.ACTIVATIONS:
+            Q_network = NN.MLP([17, 30, 30, 21], activation=activation)
+            policy = NumpyPolicy(Q_network)
+            for state in states:
+                assert np.allclose(policy(state), Q_network(state).detach().numpy(), rtol=1e-12, atol=1e-12)
+    except AssertionError:
+        print("test_NumpyPolicy_activations -- FAIL! --")
+    else:
+        print("test_NumpyPolicy_activations -- pass")
+
+
+test_NumpyPolicy_activations()
@@ -0,0 +1,90 @@
+from Class_ObservationEncoder import *
+from Class_RiderCourseSystem import *
+from Class_Rider import *
+from Classes_Courses import *
+from Class_RiderState import *
+
+
+def test_ObservationEncoder_encode() -> None:
+    """Testing ObservationEncoder.encode against RiderCourseSystem.model_format_curr_state, including past the first allocation."""
+
+    initial_state = RiderState(distance=0.0, velocity=7.0, force=100.0, an_energy=50000.0)
+
+    rider = Rider(
+        initial_state,
+        weight=87.0,
+        bike_weight=7.0,
+        cross_area=0.4,
+        drag_coef=0.7,
+        max_force=1000.0,
+        max_jerk=1.0,
+        avg_velocity=7.0,
+        avg_velocity_on_flat=7.5,
+    )
+
+    system = RiderCourseSystem(rider, QuadraticHill(course_length=500.0, end_percentage=11.0))
+    encoder = ObservationEncoder(system, capacity=4)
+
+    system.reset()
+    encoder.reset()
+    expected = [system.model_format_curr_state()]
+
+    for step in range(10):
+        system.rider.state.force += 5.0
+        system.euler_step_forward()
+        encoder.encode()
+        expected.append(system.model_format_curr_state())
+
+    try:
+        assert encoder.length == 11
+        assert encoder.observations.shape[0] == 16
+        assert torch.equal(encoder.states[:11], torch.stack(expected))
+    except AssertionError:
+        print("test_ObservationEncoder_encode -- FAIL! --")
+    else:
+        print("test_ObservationEncoder_encode -- pass")
+
+
+test_ObservationEncoder_encode()
+
+
+def test_ObservationEncoder_float32() -> None:
+    """Testing that a float32 system gives float32 observations which are the float64 ones rounded."""
+
+    initial_state = RiderState(distance=0.0, velocity=7.0, force=100.0, an_energy=50000.0)
+
+    rider = Rider(
+        initial_state,
+        weight=87.0,
+        bike_weight=7.0,
+        cross_area=0.4,
+        drag_coef=0.7,
+        max_force=1000.0,
+        max_jerk=1.0,
+        avg_velocity=7.0,
+        avg_velocity_on_flat=7.5,
+    )
+
+    system = RiderCourseSystem(rider, QuadraticHill(course_length=500.0, end_percentage=11.0), dtype=torch.float32)
+    encoder = ObservationEncoder(system)
+
+    system.reset()
+    encoder.reset()
+    expected = [system.model_format_curr_state()]
+
+    for step in range(10):
+        system.euler_step_forward()
+        encoder.encode()
+        expected.append(system.model_format_curr_state())
+
+    try:
+        assert encoder.observations.dtype == np.float32
+        assert expected[0].dtype == torch.float32
+        assert torch.equal(encoder.states[:11], torch.stack(expected).cpu())
+    except AssertionError:
+        print("test_ObservationEncoder_float32 -- FAIL! --")
+    else:
+        print("test_ObservationEncoder_float32 -- pass")
+
+
+test_ObservationEncoder_float32()
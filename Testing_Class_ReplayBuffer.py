@@ -0,0 +1,108 @@
+from Class_ReplayBuffer import *
+
+
+def make_transitions(first: int, count: int) -> list[torch.tensor]:
+    """Returns count transitions whose start states, actions and rewards are all numbered from first."""
+
+    numbers = torch.arange(first, first + count, dtype=torch.float64)
+
+    return [
+        numbers[:, None].repeat(1, 17),
+        numbers.to(torch.int64),
+        numbers,
+        numbers[:, None].repeat(1, 17) + 1.0,
+        numbers == first + count - 1,
+    ]
+
+
+def test_ReplayBuffer_add_batch() -> None:
+    """Testing ReplayBuffer.add_batch to make sure the oldest transitions are overwritten first."""
+
+    buffer = ReplayBuffer(capacity=10, device="cpu")
+
+    buffer.add_batch(*make_transitions(0, 6))
+    buffer.add_batch(*make_transitions(6, 6))
+
+    try:
+        assert len(buffer) == 10
+        assert buffer.position == 2
+        assert buffer.rewards.tolist() == [10.0, 11.0, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0, 8.0, 9.0]
+        assert buffer.dones.tolist() == [False, True, False, False, False, True, False, False, False, False]
+        assert torch.equal(buffer.result_states[0], torch.full((17,), 11.0, dtype=torch.float64))
+    except AssertionError:
+        print("test_ReplayBuffer_add_batch -- FAIL! --")
+    else:
+        print("test_ReplayBuffer_add_batch -- pass")
+
+
+test_ReplayBuffer_add_batch()
+
+
+def test_ReplayBuffer_sample() -> None:
+    """Testing ReplayBuffer.sample to make sure each sampled index refers to the same transition in every tensor."""
+
+    buffer = ReplayBuffer(capacity=100, device="cpu")
+    buffer.add_batch(*make_transitions(0, 40))
+
+    start_states, actions, rewards, result_states, dones, discounts = buffer.sample(64)
+
+    try:
+        assert start_states.shape == (64, 17)
+        assert torch.equal(actions.to(torch.float64), rewards)
+        assert torch.equal(start_states[:, 0], rewards)
+        assert torch.equal(result_states[:, 0], rewards + 1.0)
+        assert torch.equal(dones, rewards == 39.0)
+        assert rewards.max().item() < 40.0
+    except AssertionError:
+        print("test_ReplayBuffer_sample -- FAIL! --")
+    else:
+        print("test_ReplayBuffer_sample -- pass")
+
+
+test_ReplayBuffer_sample()
+
+
+def test_ReplayBuffer_cached_target_Q_values() -> None:
+    """Testing that cached target values are only recomputed for new transitions or a new target version."""
+
+    torch.manual_seed(0)
+
+    T_network = NN.NeuralNetwork(17, 18, 19, 20, 21, 21).to(torch.float64)
+    evaluated = []
+
+    def counting_T_network(states: torch.tensor) -> torch.tensor:
+        evaluated.append(states.size(dim=0))
+        return T_network(states)
+
+    buffer = ReplayBuffer(capacity=10, device="cpu")
+    buffer.add_batch(*make_transitions(0, 8))
+
+    indices = torch.tensor([0, 1, 2, 2])
+    expected = T_network(buffer.result_states[indices])
+    first = buffer.cached_target_Q_values(indices, counting_T_network, version=0)
+    evaluated.clear()
+    again = buffer.cached_target_Q_values(indices, counting_T_network, version=0)
+    cached_again = list(evaluated)
+
+    buffer.add_batch(*make_transitions(8, 3))  # overwrites slot 0
+    buffer.cached_target_Q_values(indices, counting_T_network, version=0)
+    after_add = evaluated[len(cached_again) :]
+
+    evaluated.clear()
+    buffer.refresh_target_Q_values(counting_T_network, version=1, chunk_size=4)
+
+    try:
+        assert torch.allclose(first, expected)
+        assert torch.equal(first, again)
+        assert cached_again == []
+        assert after_add == [1]
+        assert evaluated == [4, 4, 2]
+        assert buffer.target_versions.tolist() == [1] * 10
+        assert torch.allclose(buffer.target_Q_values, T_network(buffer.result_states))
+    except AssertionError:
+        print("test_ReplayBuffer_cached_target_Q_values -- FAIL! --")
+    else:
+        print("test_ReplayBuffer_cached_target_Q_values -- pass")
+
+
+test_ReplayBuffer_cached_target_Q_values()
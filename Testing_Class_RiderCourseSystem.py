@@ -16,6 +16,9 @@ def test_euler_step_forward():
         cross_area=0.4,
         drag_coef=0.7,
         max_force=1000.0,
+        max_jerk=1.0,
+        avg_velocity=7.0,
+        avg_velocity_on_flat=7.5,
     )
 
     course = QuadraticHill(course_length=1000.0, end_percentage=14.0)
@@ -39,3 +42,49 @@ def test_euler_step_forward():
 
 
 test_euler_step_forward()
+
+
+def test_step_forward_integrators():
+    """Testing RiderCourseSystem.step_forward with each integrator against a tight tolerance rk45 solution at a large time step."""
+
+    def final_state(integrator: str, dt: float, tolerance: float = 1e-6) -> RiderState:
+        initial_state = RiderState(distance=0.0, velocity=7.0, force=250.0, an_energy=50000.0)
+
+        rider = Rider(
+            initial_state,
+            weight=87.0,
+            bike_weight=7.0,
+            cross_area=0.4,
+            drag_coef=0.7,
+            max_force=1000.0,
+            max_jerk=1.0,
+            avg_velocity=7.0,
+            avg_velocity_on_flat=7.5,
+        )
+
+        system = RiderCourseSystem(rider, QuadraticHill(course_length=500.0, end_percentage=11.0), dt=dt, integrator=integrator, tolerance=tolerance)
+
+        for step in range(round(20.0 / dt)):
+            system.step_forward()
+
+        return system.rider.state
+
+    reference = final_state("rk45", 0.1, tolerance=1e-11)
+    euler = final_state("euler", 1.0)
+    rk4 = final_state("rk4", 1.0)
+    rk45 = final_state("rk45", 1.0)
+    semi_implicit = final_state("semi_implicit_euler", 0.01)
+
+    try:
+        assert abs(rk4.distance - reference.distance) < 1e-3
+        assert abs(rk45.distance - reference.distance) < 1e-3
+        assert abs(rk45.an_energy - reference.an_energy) < 1.0
+        assert abs(euler.distance - reference.distance) > 1.0
+        assert abs(semi_implicit.distance - reference.distance) < 0.5
+    except AssertionError:
+        print("test_step_forward_integrators -- FAIL! --")
+    else:
+        print("test_step_forward_integrators -- pass")
+
+
+test_step_forward_integrators()
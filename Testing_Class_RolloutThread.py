@@ -0,0 +1,87 @@
+from Class_RolloutThread import *
+from Class_ExperienceReplay import *
+from Class_ReplayBuffer import *
+from Class_RiderCourseSystem import *
+from Class_Rider import *
+from Classes_Courses import *
+from Classes_Rewards_Penalties import *
+from Class_RiderState import *
+import contextlib
+import io
+import time
+
+
+def test_RolloutThread_collect() -> None:
+    """Testing that the actor's batches arrive in order, that it waits for the learner once MAX_PENDING batches are waiting, and that it picks up published weights and cutoff times."""
+
+    initial_state = RiderState(distance=0.0, velocity=7.0, force=100.0, an_energy=50000.0)
+
+    rider = Rider(
+        initial_state,
+        weight=87.0,
+        bike_weight=7.0,
+        cross_area=0.4,
+        drag_coef=0.7,
+        max_force=1000.0,
+        max_jerk=1.0,
+        avg_velocity=7.0,
+        avg_velocity_on_flat=7.5,
+    )
+
+    system = RiderCourseSystem(rider, QuadraticHill(course_length=5000.0, end_percentage=11.0))
+    reward_bundle = RewardBundle(
+        [EvenMilestones(system, base_reward=3.0, spacing=10.0), CompletionReward(system, completion_reward=5.0), TimeViolation(system, cutoff_time=10.0)],
+        severe_mistake_penalty=-100.0,
+    )
+    Q_network = NN.NeuralNetwork(17, 18, 19, 20, 21, 21).to(torch.float64)
+
+    def make_experience_replay(network: NN.NeuralNetwork) -> ExperienceReplay:
+        actor_system, actor_reward_bundle = copy.deepcopy((system, reward_bundle))
+        return ExperienceReplay(actor_system, network, actor_reward_bundle, epsilon=0.5, inference_backend="numpy")
+
+    actor = RolloutThread(make_experience_replay, Q_network, max_pending=3, flush_every=7, epsilon=0.5)
+    replay_buffer = ReplayBuffer(10000, device="cpu")
+
+    # the first episode ends after about 100 steps with the cutoff time of 10 seconds the bundle was built with, and after 200 with this one.
+    # The course is too long to finish in 20 seconds, so it always ends on the cutoff
+    actor.set_cutoff_time(20.0)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        actor.start()
+        # the actor fills the queue and then has to wait for the learner, however long that takes on this machine
+        deadline = time.monotonic() + 30.0
+        while not actor._pending.full() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        pending = actor._pending.qsize()
+
+        with torch.no_grad():
+            Q_network.layer_1.weight.add_(1.0)
+        actor.publish(Q_network)
+
+        added = 0
+        env_steps = 0
+        while added < 500:
+            added += actor.collect(replay_buffer, block=True)
+            env_steps += actor.last_env_steps
+        actor.close()
+
+    starts = replay_buffer.start_states[:added]
+    results = replay_buffer.result_states[:added]
+    dones = replay_buffer.dones[:added]
+
+    try:
+        assert pending == 3
+        assert len(replay_buffer) == added
+        assert env_steps == added  # one physics step per transition, and every step is flushed with its transition
+        assert dones.any()
+        assert 190 <= int(torch.argmax(dones.to(torch.int64))) <= 201
+        assert torch.equal(results[:-1][~dones[:-1]], starts[1:][~dones[:-1]])
+        assert actor.version == 1
+        assert torch.equal(actor.experience_replay.Q_network.layer_1.weight, Q_network.layer_1.weight)
+    except AssertionError:
+        print("test_RolloutThread_collect -- FAIL! --")
+    else:
+        print("test_RolloutThread_collect -- pass")
+
+
+test_RolloutThread_collect()
@@ -0,0 +1,79 @@
+from Class_RolloutWorkers import *
+from Class_ExperienceReplay import *
+from Class_ReplayBuffer import *
+from Class_RiderCourseSystem import *
+from Class_Rider import *
+from Classes_Courses import *
+from Classes_Rewards_Penalties import *
+from Class_RiderState import *
+import contextlib
+import io
+
+
+def test_RolloutWorkerPool_collect() -> None:
+    """
+    Testing that the chunks of a worker's episodes arrive in order, so each result state is the start state of the next transition,
+    and that the workers pick up a new cutoff time.
+    """
+
+    initial_state = RiderState(distance=0.0, velocity=7.0, force=100.0, an_energy=50000.0)
+
+    rider = Rider(
+        initial_state,
+        weight=87.0,
+        bike_weight=7.0,
+        cross_area=0.4,
+        drag_coef=0.7,
+        max_force=1000.0,
+        max_jerk=1.0,
+        avg_velocity=7.0,
+        avg_velocity_on_flat=7.5,
+    )
+
+    system = RiderCourseSystem(rider, QuadraticHill(course_length=5000.0, end_percentage=11.0))
+    reward_bundle = RewardBundle(
+        [EvenMilestones(system, base_reward=3.0, spacing=10.0), CompletionReward(system, completion_reward=5.0), TimeViolation(system, cutoff_time=10.0)],
+        severe_mistake_penalty=-100.0,
+    )
+    Q_network = NN.NeuralNetwork(17, 18, 19, 20, 21, 21).to(torch.float64)
+
+    def make_experience_replay(network: NN.NeuralNetwork) -> ExperienceReplay:
+        worker_system, worker_reward_bundle = copy.deepcopy((system, reward_bundle))
+        return ExperienceReplay(worker_system, network, worker_reward_bundle, epsilon=0.5)
+
+    pool = RolloutWorkerPool(make_experience_replay, Q_network, num_workers=1, chunk_size=7, slots_per_worker=2)
+    replay_buffer = ReplayBuffer(10000, device="cpu")
+
+    # the first episode ends after about 100 steps with the cutoff time of 10 seconds the bundle was built with, and after 200 with this one.
+    # The course is too long to finish in 20 seconds, so it always ends on the cutoff
+    pool.set_cutoff_time(20.0)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        pool.start()
+        added = 0
+        env_steps = 0
+        while added < 500:
+            added += pool.collect(replay_buffer, block=True)
+            env_steps += pool.last_env_steps
+        pool.publish(Q_network)
+        pool.close()
+
+    starts = replay_buffer.start_states[:added]
+    results = replay_buffer.result_states[:added]
+    dones = replay_buffer.dones[:added]
+
+    try:
+        assert len(replay_buffer) == added
+        # the physics steps of an episode arrive with its first chunk, so the last episode may be counted ahead of its transitions
+        assert added <= env_steps < added + 250
+        assert dones.any()
+        assert 190 <= int(torch.argmax(dones.to(torch.int64))) <= 201
+        assert torch.equal(results[:-1][~dones[:-1]], starts[1:][~dones[:-1]])
+        assert pool.version == 1
+    except AssertionError:
+        print("test_RolloutWorkerPool_collect -- FAIL! --")
+    else:
+        print("test_RolloutWorkerPool_collect -- pass")
+
+
+test_RolloutWorkerPool_collect()
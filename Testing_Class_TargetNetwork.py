@@ -0,0 +1,63 @@
+from Class_TargetNetwork import *
+
+
+def test_TargetNetwork_sync() -> None:
+    """Testing that sync copies the weights in place, without new tensors, and counts the version."""
+
+    torch.manual_seed(0)
+
+    Q_network = NN.NeuralNetwork(17, 18, 19, 20, 21, 21).to(torch.float64)
+    target = TargetNetwork(Q_network)
+    held = target.network.layer_1.weight
+
+    with torch.no_grad():
+        for parameter in Q_network.parameters():
+            parameter.add_(1.0)
+
+    states = torch.randn(4, 17, dtype=torch.float64)
+    before = target(states)
+    target.sync()
+
+    try:
+        assert not torch.allclose(before, Q_network(states))
+        assert torch.equal(target(states), Q_network(states))
+        assert target.network.layer_1.weight is held
+        assert target.version == 1
+        assert not target(states).requires_grad
+    except AssertionError:
+        print("test_TargetNetwork_sync -- FAIL! --")
+    else:
+        print("test_TargetNetwork_sync -- pass")
+
+
+test_TargetNetwork_sync()
+
+
+def test_TargetNetwork_soft_update() -> None:
+    """Testing soft_update against target + tau * (Q - target) on every parameter."""
+
+    torch.manual_seed(1)
+
+    Q_network = NN.NeuralNetwork(17, 18, 19, 20, 21, 21).to(torch.float64)
+    target = TargetNetwork(Q_network, tau=0.1)
+    old_parameters = [parameter.clone() for parameter in Q_network.parameters()]
+
+    with torch.no_grad():
+        for parameter in Q_network.parameters():
+            parameter.copy_(torch.randn_like(parameter))
+
+    expected = [old + 0.1 * (new - old) for old, new in zip(old_parameters, Q_network.parameters())]
+    target.soft_update()
+    target.soft_update(tau=0.0)
+
+    try:
+        for parameter, value in zip(target.network.parameters(), expected):
+            assert torch.allclose(parameter, value, rtol=1e-14, atol=1e-14)
+        assert target.version == 2
+    except AssertionError:
+        print("test_TargetNetwork_soft_update -- FAIL! --")
+    else:
+        print("test_TargetNetwork_soft_update -- pass")
+
+
+test_TargetNetwork_soft_update()
@@ -0,0 +1,161 @@
+from Class_Trainer import *
+from Class_ExperienceReplay import *
+from Class_ReplayBuffer import *
+from Class_RiderCourseSystem import *
+from Class_Rider import *
+from Classes_Courses import *
+from Classes_Rewards_Penalties import *
+from Class_RiderState import *
+import contextlib
+import io
+import random
+
+
+def make_trainer(replay_buffer: ReplayBuffer | None = None, **kwargs) -> Trainer:
+    """Returns a trainer on a short course with replay_buffer, by default a plain one on the CPU."""
+
+    initial_state = RiderState(distance=0.0, velocity=7.0, force=100.0, an_energy=50000.0)
+
+    rider = Rider(
+        initial_state,
+        weight=87.0,
+        bike_weight=7.0,
+        cross_area=0.4,
+        drag_coef=0.7,
+        max_force=1000.0,
+        max_jerk=1.0,
+        avg_velocity=7.0,
+        avg_velocity_on_flat=7.5,
+    )
+
+    system = RiderCourseSystem(rider, QuadraticHill(course_length=100.0, end_percentage=5.0))
+    reward_bundle = RewardBundle(
+        [EvenMilestones(system, base_reward=3.0, spacing=10.0), CompletionReward(system, completion_reward=5.0), TimeViolation(system, cutoff_time=50.0)],
+        severe_mistake_penalty=-100.0,
+    )
+
+    Q_network = NN.NeuralNetwork(17, 18, 19, 20, 21, 21).to(torch.float64)
+    experience_replay = ExperienceReplay(system, Q_network, reward_bundle, epsilon=0.5, replay_buffer=replay_buffer if replay_buffer is not None else ReplayBuffer(10000, device="cpu"))
+    optimizer = torch.optim.SGD(Q_network.parameters(), lr=0.001)
+
+    return Trainer(experience_replay, Q_network, optimizer, torch.nn.MSELoss(), **kwargs)
+
+
+def test_Trainer_updates_per_step() -> None:
+    """Testing that the number of gradient steps follows UPDATES_PER_STEP once LEARNING_STARTS transitions have been collected."""
+
+    torch.manual_seed(0)
+
+    trainer = make_trainer(learning_starts=10, updates_per_step=0.5, update_every=4, interleave=False)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        steps = trainer.train_episode()
+        steps += trainer.train_episode()
+
+    try:
+        assert trainer.env_steps == steps == len(trainer.replay_buffer)
+        assert trainer.gradient_steps == int(0.5 * steps)
+        assert trainer.last_loss is not None and not trainer.last_loss.requires_grad
+    except AssertionError:
+        print("test_Trainer_updates_per_step -- FAIL! --")
+    else:
+        print("test_Trainer_updates_per_step -- pass")
+
+
+test_Trainer_updates_per_step()
+
+
+def test_Trainer_interleave() -> None:
+    """Testing that interleaved updates start in the middle of the first episode, on the transitions flushed so far."""
+
+    torch.manual_seed(0)
+
+    trainer = make_trainer(learning_starts=20, updates_per_step=1.0, update_every=4, interleave=True)
+
+    buffer_sizes = []
+    update = trainer.update
+
+    def recording_update() -> torch.tensor:
+        buffer_sizes.append(len(trainer.replay_buffer))
+        return update()
+
+    trainer.update = recording_update
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        steps = trainer.train_episode()
+
+    try:
+        assert len(trainer.replay_buffer) == steps
+        assert buffer_sizes[0] == 20
+        assert buffer_sizes[0] < steps
+        # the steps recorded while the buffer held 4, 8, 12 and 16 transitions earned nothing
+        assert trainer.gradient_steps == steps - 16
+    except AssertionError:
+        print("test_Trainer_interleave -- FAIL! --")
+    else:
+        print("test_Trainer_interleave -- pass")
+
+
+test_Trainer_interleave()
+
+
+def test_Trainer_cache_targets() -> None:
+    """Testing that training with cached target values takes exactly the same steps as recomputing them, lazily or in bulk."""
+
+    networks = []
+
+    for cache_targets, refresh_targets_on_sync in ((False, False), (True, False), (True, True)):
+        torch.manual_seed(0)
+        random.seed(0)
+
+        trainer = make_trainer(
+            learning_starts=10,
+            updates_per_step=2.0,
+            interleave=True,
+            t_net_update_every=7,
+            cache_targets=cache_targets,
+            refresh_targets_on_sync=refresh_targets_on_sync,
+        )
+        with contextlib.redirect_stdout(io.StringIO()):
+            trainer.train_episode()
+
+        networks.append(trainer.Q_network)
+
+    try:
+        assert trainer.target_version > 1
+        for network in networks[1:]:
+            for parameter, expected in zip(network.parameters(), networks[0].parameters()):
+                assert torch.allclose(parameter, expected, rtol=1e-10, atol=1e-12)
+    except AssertionError:
+        print("test_Trainer_cache_targets -- FAIL! --")
+    else:
+        print("test_Trainer_cache_targets -- pass")
+
+
+test_Trainer_cache_targets()
+
+
+def test_Trainer_prioritized() -> None:
+    """Testing that with a PrioritizedReplayBuffer the loss is weighted with a non-reducing copy of loss_function made once, and the priorities are updated."""
+
+    torch.manual_seed(0)
+
+    trainer = make_trainer(PR.PrioritizedReplayBuffer(10000, device="cpu"), learning_starts=10, interleave=False)
+    elementwise_loss_function = trainer._elementwise_loss_function
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        trainer.train_episode()
+
+    try:
+        assert trainer.gradient_steps > 0
+        assert trainer._elementwise_loss_function is elementwise_loss_function
+        assert elementwise_loss_function.reduction == "none" and trainer.loss_function.reduction == "mean"
+        assert trainer.replay_buffer.max_priority > 1.0
+        assert make_trainer()._elementwise_loss_function is None
+    except AssertionError:
+        print("test_Trainer_prioritized -- FAIL! --")
+    else:
+        print("test_Trainer_prioritized -- pass")
+
+
+test_Trainer_prioritized()
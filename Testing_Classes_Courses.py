@@ -1,4 +1,6 @@
 from Classes_Courses import *
+import numpy as np
+import math
 
 """
 Template:
@@ -143,4 +145,86 @@ def test_QuadraticHill_dist_vs_slope() -> None:
     else:
         print("test_QuadraticHill_dist_vs_slope -- pass")
 
-test_QuadraticHill_dist_vs_slope()
\ No newline at end of file
+test_QuadraticHill_dist_vs_slope()
+
+
+def test_PointwiseCourse_lookup() -> None:
+    '''Testing PointwiseCourse.elevation and PointwiseCourse.slope on evenly and unevenly spaced points.'''
+
+    even = PointwiseCourse([[100.0, 0.0], [110.0, 1.0], [120.0, 1.0], [130.0, 0.0]])
+    uneven = PointwiseCourse([[0.0, 0.0], [10.0, 1.0], [15.0, 1.0], [35.0, 0.0]])
+
+    try:
+        assert even.COURSE_LENGTH == 30.0
+        assert even.SPACING == 10.0
+        assert even.elevation(5.0) == 0.5
+        assert even.slope(15.0) == 0.0
+        assert even.slope(25.0) == -0.1
+        assert even.slope(-5.0) == 0.1
+        assert even.slope(50.0) == -0.1
+        assert uneven.SPACING is None
+        assert uneven.slope(12.0) == 0.0
+        assert uneven.slope(25.0) == -0.05
+        assert uneven.elevation(25.0) == 0.5
+    except (AssertionError):
+        print("test_PointwiseCourse_lookup -- FAIL! --")
+    else:
+        print("test_PointwiseCourse_lookup -- pass")
+
+test_PointwiseCourse_lookup()
+
+
+
+def test_PointwiseCourse_many() -> None:
+    '''Testing that PointwiseCourse.elevation_many and PointwiseCourse.slope_many agree with the scalar lookups.'''
+
+    rng = np.random.default_rng(0)
+    distances = np.cumsum(rng.uniform(0.5, 3.0, 1000))
+    course = PointwiseCourse(np.column_stack((distances, rng.normal(0.0, 5.0, 1000))), smoothing_window=5)
+    queries = rng.uniform(-10.0, course.COURSE_LENGTH + 10.0, 200)
+
+    try:
+        assert np.array_equal(course.slope_many(queries), [course.slope(d) for d in queries])
+        assert np.allclose(course.elevation_many(queries), [course.elevation(d) for d in queries])
+        assert course.elevations.shape == (1000,)
+    except (AssertionError):
+        print("test_PointwiseCourse_many -- FAIL! --")
+    else:
+        print("test_PointwiseCourse_many -- pass")
+
+test_PointwiseCourse_many()
+
+
+
+def test_IdealCourse_compile() -> None:
+    '''Testing IdealCourse.compile to make sure the grid lookups stay within the error bound, for vectorized and plain functions.'''
+
+    def elefunc(x: float) -> float:
+        return 3.0 * math.sin(x / 40.0)
+
+    def slopefunc(x: float) -> float:
+        return 3.0 / 40.0 * math.cos(x / 40.0)
+
+    wavy = IdealCourse(500.0, elefunc, slopefunc)
+    hill = QuadraticHill(500.0, 11.0)
+    queries = np.linspace(0.0, 600.0, 1001)
+
+    exact_slopes = hill.slope_many(queries)
+    wavy_error = wavy.compile(max_error=1e-7)
+    hill.compile(max_error=1e-7)
+
+    try:
+        assert np.array_equal(exact_slopes, [hill.slope(d) for d in queries])
+        assert wavy_error <= 1e-7
+        assert np.max(np.abs(wavy.slope_many(queries) - [slopefunc(d) for d in queries])) <= 1e-6
+        assert np.max(np.abs(wavy.elevation_many(queries) - [elefunc(d) for d in queries])) <= 1e-6
+        assert np.max(np.abs(hill.slope_many(queries) - exact_slopes)) <= 1e-6
+        assert hill.slope_many(queries[:, None] + np.zeros(3)).shape == (1001, 3)
+        # the lookahead from a rider who finished 50m past the end of the course is still on the grid
+        assert abs(hill.slope_many(np.array([650.0]))[0] - hill.slope(650.0)) <= 1e-6
+    except (AssertionError):
+        print("test_IdealCourse_compile -- FAIL! --")
+    else:
+        print("test_IdealCourse_compile -- pass")
+
+test_IdealCourse_compile()
@@ -0,0 +1,105 @@
+from Classes_PrioritizedReplay import *
+
+
+def make_transitions(first: int, count: int) -> list[torch.tensor]:
+    """Returns count transitions whose start states, actions and rewards are all numbered from first."""
+
+    numbers = torch.arange(first, first + count, dtype=torch.float64)
+
+    return [numbers[:, None].repeat(1, 17), numbers.to(torch.int64), numbers, numbers[:, None].repeat(1, 17) + 1.0, numbers < 0]
+
+
+def test_SumTree_find() -> None:
+    """Testing SumTree.find against a search of the cumulative sums of the leaves, after batch updates with a repeated index."""
+
+    np.random.seed(0)
+
+    tree = SumTree(13)
+    values = np.random.uniform(0.0, 5.0, 13)
+    tree.update(np.arange(13), values)
+    tree.update(np.array([3, 7, 3]), np.array([0.0, 2.5, 9.0]))
+    values[3] = 9.0
+    values[7] = 2.5
+
+    prefix_sums = np.random.uniform(0.0, values.sum(), 1000)
+    expected = np.searchsorted(np.cumsum(values), prefix_sums, side="right")
+
+    try:
+        assert tree.LEAVES == 16
+        assert abs(tree.total - values.sum()) < 1e-9
+        assert np.array_equal(tree.find(prefix_sums), expected)
+    except AssertionError:
+        print("test_SumTree_find -- FAIL! --")
+    else:
+        print("test_SumTree_find -- pass")
+
+
+test_SumTree_find()
+
+
+def test_PrioritizedReplayBuffer_sample() -> None:
+    """Testing that transitions are sampled in proportion to priority ** ALPHA, and the importance sampling weights."""
+
+    torch.manual_seed(0)
+
+    buffer = PrioritizedReplayBuffer(capacity=8, device="cpu", alpha=0.5, beta=1.0, priority_epsilon=0.0)
+    buffer.add_batch(*make_transitions(0, 4))
+    buffer.update_priorities(torch.arange(4), torch.tensor([1.0, -4.0, 9.0, 16.0]))
+
+    # priorities ** 0.5 are 1, 2, 3, 4
+    counts = torch.zeros(8)
+    for i in range(200):
+        counts += torch.bincount(buffer.sample_indices(50), minlength=8)
+
+    weights = buffer.importance_weights(torch.arange(4))
+
+    buffer.add_batch(*make_transitions(4, 1))
+
+    try:
+        assert torch.allclose(counts[:4] / counts.sum(), torch.tensor([0.1, 0.2, 0.3, 0.4]), atol=0.01)
+        assert counts[4:].sum() == 0
+        assert torch.allclose(weights, torch.tensor([1.0, 0.5, 1.0 / 3.0, 0.25], dtype=torch.float64))
+        assert buffer.max_priority == 16.0
+        assert buffer.priorities.leaves()[4] == 4.0
+    except AssertionError:
+        print("test_PrioritizedReplayBuffer_sample -- FAIL! --")
+    else:
+        print("test_PrioritizedReplayBuffer_sample -- pass")
+
+
+test_PrioritizedReplayBuffer_sample()
+
+
+def test_PrioritizedReplayBuffer_importance_weights() -> None:
+    """Testing the importance sampling weights against a brute force computation over the filled slots, after the buffer wraps around and priority updates with repeated indices."""
+
+    torch.manual_seed(0)
+    np.random.seed(0)
+
+    buffer = PrioritizedReplayBuffer(capacity=13, device="cpu", alpha=0.6, beta=0.4)
+    buffer.add_batch(*make_transitions(0, 9))
+
+    matches = []
+    for i in range(20):
+        indices = torch.from_numpy(np.random.randint(0, buffer.size, 6))
+        buffer.update_priorities(indices, torch.from_numpy(np.random.uniform(-3.0, 3.0, 6)))
+        if i == 10:
+            buffer.add_batch(*make_transitions(9, 7))
+
+        probabilities = buffer.priorities.leaves()[: buffer.size] / buffer.priorities.leaves()[: buffer.size].sum()
+        expected = (buffer.size * probabilities) ** -buffer.BETA
+        expected /= expected.max()
+
+        matches.append(np.allclose(buffer.importance_weights(torch.arange(buffer.size)).numpy(), expected))
+
+    try:
+        assert buffer.size == 13
+        assert all(matches)
+        assert buffer.min_priorities.minimum == buffer.priorities.leaves()[:13].min()
+    except AssertionError:
+        print("test_PrioritizedReplayBuffer_importance_weights -- FAIL! --")
+    else:
+        print("test_PrioritizedReplayBuffer_importance_weights -- pass")
+
+
+test_PrioritizedReplayBuffer_importance_weights()
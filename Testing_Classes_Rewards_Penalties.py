@@ -0,0 +1,128 @@
+from Classes_Rewards_Penalties import *
+from Class_RiderCourseSystem import *
+from Class_Rider import *
+from Classes_Courses import *
+from Class_RiderState import *
+import contextlib
+import io
+import random
+
+
+def make_system_and_bundle() -> tuple[RiderCourseSystem, RewardBundle]:
+    """Returns a system and the reward bundle used in Main.py."""
+
+    initial_state = RiderState(distance=0.0, velocity=7.0, force=100.0, an_energy=50000.0)
+
+    rider = Rider(
+        initial_state,
+        weight=87.0,
+        bike_weight=7.0,
+        cross_area=0.4,
+        drag_coef=0.7,
+        max_force=1000.0,
+        max_jerk=1.0,
+        avg_velocity=7.0,
+        avg_velocity_on_flat=7.5,
+    )
+
+    system = RiderCourseSystem(rider, QuadraticHill(course_length=500.0, end_percentage=11.0))
+
+    reward_bundle = RewardBundle(
+        [
+            EvenMilestones(system, base_reward=3.0, spacing=10.0),
+            CompletionReward(system, completion_reward=5.0),
+            UnderMinForceViolation(system, min_force=-100.0),
+            TimeViolation(system, cutoff_time=500.0),
+            ForceBoundsPenalty(system, scaling=50.0),
+            UnderZeroEnergyPenalty(system, scaling=2.0),
+            FinalTimeReward(system, expected_time=200.0),
+            UnderMinEnergyViolation(system, min_energy=-2000.0),
+            GoingBackwardsViolation(system),
+        ],
+        severe_mistake_penalty=-100.0,
+    )
+
+    return system, reward_bundle
+
+
+def test_CompiledRewardBundle() -> None:
+    """Testing CompiledRewardBundle on a batch of random states against RewardBundle.reward one state at a time."""
+
+    system, reward_bundle = make_system_and_bundle()
+    compiled = CompiledRewardBundle(reward_bundle)
+
+    random.seed(0)
+    states = []
+    expected_rewards = []
+    expected_reasons = []
+
+    for i in range(500):
+        last_distance = random.uniform(0.0, 520.0)
+        distance = last_distance + random.uniform(-0.5, 15.0)
+        force = random.uniform(-150.0, 1100.0)
+        an_energy = random.uniform(-3000.0, 1000.0)
+        time = random.uniform(0.0, 550.0)
+
+        system.rider.last_state = RiderState(distance=last_distance)
+        system.rider.state = RiderState(distance=distance, velocity=7.0, force=force, an_energy=an_energy)
+        system.time = time
+        states.append((distance, last_distance, force, an_energy, time))
+
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                expected_rewards.append(reward_bundle.reward())
+            expected_reasons.append("none")
+        except SevereMistakeError:
+            expected_rewards.append(reward_bundle.SEVERE_MISTAKE_PENALTY)
+            expected_reasons.append(None)
+
+    columns = np.array(states).T
+    reward, terminated, reason_code = compiled(RewardStates(*columns, max_force=1000.0, course_length=500.0))
+
+    single_reward, single_terminated, single_reason_code = compiled(RewardStates.from_system(system))
+
+    try:
+        assert np.allclose(reward, expected_rewards, rtol=1e-12, atol=1e-9)
+        assert list(terminated) == [reason is None for reason in expected_reasons]
+        assert all((compiled.REASONS[code] == "none") == (reason == "none") for code, reason in zip(reason_code, expected_reasons))
+        assert single_reward.shape == ()
+        assert single_reward == reward[-1] and single_reason_code == reason_code[-1]
+    except AssertionError:
+        print("test_CompiledRewardBundle -- FAIL! --")
+    else:
+        print("test_CompiledRewardBundle -- pass")
+
+
+test_CompiledRewardBundle()
+
+
+def test_CompiledRewardBundle_reason_order() -> None:
+    """Testing that the reason code is the first severe penalty in the bundle which is triggered."""
+
+    system, reward_bundle = make_system_and_bundle()
+    compiled = CompiledRewardBundle(reward_bundle)
+
+    # under the min force and going backwards, UnderMinForceViolation comes first in the bundle
+    states = RewardStates(
+        distance=[10.0, 10.0],
+        last_distance=[11.0, 11.0],
+        force=[-200.0, 100.0],
+        an_energy=[100.0, 100.0],
+        time=[1.0, 1.0],
+        max_force=1000.0,
+        course_length=500.0,
+    )
+
+    reward, terminated, reason_code = compiled(states)
+
+    try:
+        assert list(terminated) == [True, True]
+        assert [compiled.REASONS[code] for code in reason_code] == ["UnderMinForceViolation", "GoingBackwardsViolation"]
+        assert list(reward) == [-100.0, -100.0]
+    except AssertionError:
+        print("test_CompiledRewardBundle_reason_order -- FAIL! --")
+    else:
+        print("test_CompiledRewardBundle_reason_order -- pass")
+
+
+test_CompiledRewardBundle_reason_order()
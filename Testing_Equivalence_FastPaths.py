@@ -0,0 +1,113 @@
+from Equivalence_FastPaths import *
+
+
+def test_fast_paths_agree() -> None:
+    """Testing that every registered fast path agrees with the reference path on random scenarios which end in every way."""
+
+    scenarios = random_scenarios(40, seed=1, steps=200)
+
+    with contextlib.redirect_stdout(io.StringIO()), np.errstate(all="ignore"):
+        reference = reference_path(scenarios)
+
+    results = check(scenarios, reference=reference)
+    reasons = {trajectory.reason for trajectory in reference}
+
+    try:
+        assert set(results) == {"BatchedRiderCourseSystem", "ObservationEncoder", "CompiledRewardBundle"}
+        assert all(mismatches == [] for mismatches in results.values())
+        assert {"none", "finished", "UnderMinForceViolation"} <= reasons
+        assert all(trajectory.observations.shape[0] == trajectory.rewards.shape[0] + 1 for trajectory in reference)
+    except AssertionError:
+        print("test_fast_paths_agree -- FAIL! --")
+    else:
+        print("test_fast_paths_agree -- pass")
+
+
+test_fast_paths_agree()
+
+
+def test_check_finds_mismatches() -> None:
+    """Testing that check reports a fast path whose physics is slightly off and one which leaves out a severe penalty."""
+
+    @register_fast_path("test_heavier_drag")
+    def heavier_drag_path(scenarios: list[Scenario]) -> list[Trajectory]:
+        scenarios = [Scenario(copy.deepcopy(s.rider), s.course, s.actions, s.reward_spec) for s in scenarios]
+        for scenario in scenarios:
+            scenario.rider.DRAG_COEF *= 1.0 + 1e-6
+        return reference_path(scenarios)
+
+    @register_fast_path("test_no_min_force_violation")
+    def no_min_force_violation_path(scenarios: list[Scenario]) -> list[Trajectory]:
+        specs = {}
+        for s in scenarios:
+            specs.setdefault(id(s.reward_spec), [(policy, kwargs) for policy, kwargs in s.reward_spec if policy is not RP.UnderMinForceViolation])
+        return reference_path([Scenario(s.rider, s.course, s.actions, specs[id(s.reward_spec)]) for s in scenarios])
+
+    scenarios = random_scenarios(40, seed=1, steps=200)
+    results = check(scenarios, ["test_heavier_drag", "test_no_min_force_violation"])
+
+    del FAST_PATHS["test_heavier_drag"]
+    del FAST_PATHS["test_no_min_force_violation"]
+
+    try:
+        assert any("velocity after step" in mismatch for mismatch in results["test_heavier_drag"])
+        assert any("instead of UnderMinForceViolation" in mismatch for mismatch in results["test_no_min_force_violation"])
+    except AssertionError:
+        print("test_check_finds_mismatches -- FAIL! --")
+    else:
+        print("test_check_finds_mismatches -- pass")
+
+
+test_check_finds_mismatches()
+
+
+def test_compare() -> None:
+    """Testing compare on hand made trajectories which differ within and beyond the tolerances."""
+
+    observations = np.zeros((3, 17))
+    reference = Trajectory([[1.0, 2.0, 3.0, 4.0, 0.1], [2.0, 2.0, 3.0, 4.0, 0.2]], observations, [1.0, -100.0], "TimeViolation")
+
+    close = Trajectory(reference.states + 1e-12, observations, [1.0, -100.0], "TimeViolation")
+    shorter = Trajectory(reference.states[:1], observations[:2], [1.5], "finished")
+
+    try:
+        assert compare(reference, close) == []
+        assert compare(reference, shorter) == [
+            "ended after 1 steps instead of 2",
+            "ended with finished instead of TimeViolation",
+            "reward of step 1 is 1.5 instead of 1.0",
+        ]
+    except AssertionError:
+        print("test_compare -- FAIL! --")
+    else:
+        print("test_compare -- pass")
+
+
+test_compare()
+
+
+def test_check_compiled_courses() -> None:
+    """Testing that compiled courses agree with the exact ones the reference keeps, and that an error in a compiled grid is found."""
+
+    scenarios = random_scenarios(100, seed=0, compile_courses=True)
+    compiled = {id(s.course): s.course for s in scenarios if s.course is not s.reference_course}
+    agreement = check(scenarios, ["ObservationEncoder"])
+
+    for course in compiled.values():
+        course._slope_grid = course._slope_grid + 1e-4
+
+    results = check(scenarios, ["ObservationEncoder"])
+
+    try:
+        assert len(compiled) > 0
+        assert agreement["ObservationEncoder"] == []
+        assert all(s.reference_course.compile_error is None for s in scenarios if isinstance(s.reference_course, C.IdealCourse))
+        assert all(s.course_error == 0.0 for s in scenarios if s.course is s.reference_course)
+        assert any("observation 4 " in mismatch for mismatch in results["ObservationEncoder"])
+    except AssertionError:
+        print("test_check_compiled_courses -- FAIL! --")
+    else:
+        print("test_check_compiled_courses -- pass")
+
+
+test_check_compiled_courses()
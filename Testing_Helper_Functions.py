@@ -0,0 +1,101 @@
+from Helper_Functions import *
+
+
+def make_batch(batch_size: int) -> list[torch.tensor]:
+    """Returns a random batch in the format of ExperienceReplay.random_batch_plus_last."""
+
+    return [
+        torch.randn(batch_size, 17, dtype=torch.float64),
+        torch.randint(-11, 10, (batch_size,)),
+        torch.randn(batch_size, dtype=torch.float64),
+        torch.randn(batch_size, 17, dtype=torch.float64),
+        torch.rand(batch_size) < 0.2,
+    ]
+
+
+def test_Q_learning_loss() -> None:
+    """Testing Q_learning_loss against the target computed one data point at a time."""
+
+    torch.manual_seed(0)
+
+    Q_network = NN.NeuralNetwork(17, 18, 19, 20, 21, 21).to(torch.float64)
+    T_network = NN.NeuralNetwork(17, 18, 19, 20, 21, 21).to(torch.float64)
+    batch = make_batch(50)
+
+    expected = 0.0
+    for i in range(50):
+        Q_value = Q_network(batch[0][i])[batch[1][i].item() + 11]
+        next_Q_value = 0.0 if batch[4][i].item() else torch.max(T_network(batch[3][i])).item()
+        expected += (Q_value.item() - (batch[2][i].item() + 0.1 * next_Q_value)) ** 2
+    expected /= 50
+
+    loss = Q_learning_loss(Q_network, T_network, batch, torch.nn.MSELoss(), gamma=0.1)
+    loss.backward()
+
+    try:
+        assert abs(loss.item() - expected) < 1e-12
+        assert Q_network.layer_1.weight.grad is not None
+        assert T_network.layer_1.weight.grad is None
+    except AssertionError:
+        print("test_Q_learning_loss -- FAIL! --")
+    else:
+        print("test_Q_learning_loss -- pass")
+
+
+test_Q_learning_loss()
+
+
+def test_Q_learning_targets_double_dqn() -> None:
+    """Testing Q_learning_targets with double_dqn to make sure T_network is evaluated at the action chosen by Q_network."""
+
+    torch.manual_seed(1)
+
+    Q_network = NN.NeuralNetwork(17, 18, 19, 20, 21, 21).to(torch.float64)
+    T_network = NN.NeuralNetwork(17, 18, 19, 20, 21, 21).to(torch.float64)
+    batch = make_batch(20)[:4]
+
+    chosen, target = Q_learning_targets(Q_network, T_network, batch, gamma=0.5, double_dqn=True)
+
+    next_actions = torch.argmax(Q_network(batch[3]), dim=1)
+    expected = batch[2] + 0.5 * T_network(batch[3])[torch.arange(20), next_actions]
+
+    try:
+        assert chosen.shape == (20,)
+        assert torch.allclose(target, expected)
+        assert not target.requires_grad
+    except AssertionError:
+        print("test_Q_learning_targets_double_dqn -- FAIL! --")
+    else:
+        print("test_Q_learning_targets_double_dqn -- pass")
+
+
+test_Q_learning_targets_double_dqn()
+
+
+def test_Q_learning_loss_weights() -> None:
+    """Testing Q_learning_loss with weights against the weighted mean of the Huber loss of each data point."""
+
+    torch.manual_seed(2)
+
+    Q_network = NN.NeuralNetwork(17, 18, 19, 20, 21, 21).to(torch.float64)
+    T_network = NN.NeuralNetwork(17, 18, 19, 20, 21, 21).to(torch.float64)
+    batch = make_batch(40)
+    weights = torch.rand(40, dtype=torch.float64)
+    loss_function = torch.nn.HuberLoss(delta=0.5)
+
+    chosen, target = Q_learning_targets(Q_network, T_network, batch, gamma=0.3)
+    expected = (weights * torch.nn.functional.huber_loss(chosen, target, reduction="none", delta=0.5)).mean()
+
+    loss = Q_learning_loss(Q_network, T_network, batch, loss_function, gamma=0.3, weights=weights)
+
+    try:
+        assert torch.allclose(loss, expected)
+        assert loss_function.reduction == "mean"
+        assert torch.allclose(Q_learning_loss(Q_network, T_network, batch, loss_function, gamma=0.3, weights=torch.ones(40)), loss_function(chosen, target))
+    except AssertionError:
+        print("test_Q_learning_loss_weights -- FAIL! --")
+    else:
+        print("test_Q_learning_loss_weights -- pass")
+
+
+test_Q_learning_loss_weights()